@@ -0,0 +1,58 @@
+"""
+Import-time benchmark of corrclim.
+
+Runs `import corrclim.climatic_corrector` in fresh interpreters and checks that it stays under
+the time budget and that no heavy backend is imported eagerly.
+
+Usage: python benchmarks/import_time.py [--budget-ms 300] [--repeat 5]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "statsmodels", "sklearn", "scipy", "pygam", "patsy", "loguru"]
+
+SNIPPET = f"""
+import json, sys, time
+start = time.perf_counter()
+import corrclim.climatic_corrector
+elapsed = time.perf_counter() - start
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed_ms": elapsed * 1000, "loaded": loaded}}))
+"""
+
+
+def measure(repeat):
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", SNIPPET], check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    best = min(result["elapsed_ms"] for result in results)
+    loaded = sorted({module for result in results for module in result["loaded"]})
+
+    print(f"import corrclim.climatic_corrector: best of {args.repeat} = {best:.1f} ms")
+    if loaded:
+        print(f"Heavy modules imported eagerly: {', '.join(loaded)}")
+
+    if best > args.budget_ms or loaded:
+        print(f"FAILED (budget: {args.budget_ms:.0f} ms)")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import importlib
+
+
+class LazyImport:
+    """
+    Proxy to a module, or to an attribute of a module, imported on first attribute access.
+
+    It keeps `import corrclim...` cheap: heavy dependencies are only imported when an object
+    actually uses them.
+    """
+
+    def __init__(self, module, attribute=None):
+        object.__setattr__(self, "_module", module)
+        object.__setattr__(self, "_attribute", attribute)
+        object.__setattr__(self, "_target", None)
+
+    def _load(self):
+        target = object.__getattribute__(self, "_target")
+        if target is None:
+            target = importlib.import_module(object.__getattribute__(self, "_module"))
+            attribute = object.__getattribute__(self, "_attribute")
+            if attribute is not None:
+                target = getattr(target, attribute)
+            object.__setattr__(self, "_target", target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        module = object.__getattribute__(self, "_module")
+        attribute = object.__getattribute__(self, "_attribute")
+        return f"<lazy import {module}{'.' + attribute if attribute else ''}>"
+
+
+def lazy_import(module, attribute=None):
+    """
+    Return a proxy importing `module` (and getting `attribute` from it) on first use.
+
+    :param module: (str) Module name, e.g. "pandas".
+    :param attribute: (str) Optional attribute of the module, e.g. "logger" for loguru.
+    """
+    return LazyImport(module, attribute)
@@ -0,0 +1,247 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+logger = lazy_import("loguru", "logger")
+
+
+def get_blocks(X, block="day"):
+    """
+    Block index of each row: rows of the same local day (or Monday-starting week) share a block.
+
+    :param X: (TimeseriesDT) Timeseries.
+    :param block: (str) "day" or "week".
+    """
+    calendar = X.get_calendar()
+    day_number = calendar.days[calendar.day]
+    if block == "day":
+        return day_number
+    if block == "week":
+        # 1970-01-01 is a Thursday
+        return (day_number + 3) // 7
+    raise ValueError("Unsupported bootstrap block, use 'day' or 'week'.")
+
+
+def block_bootstrap_weights(blocks, n_replicates, rng):
+    """
+    Row weights of block bootstrap replicates: blocks are drawn with replacement, and each row
+    weighs the number of times its block was drawn.
+
+    :param blocks: (array n) Block of each row.
+    :param n_replicates: (int) Number of replicates.
+    :param rng: (numpy.random.Generator) Random generator.
+    :return: (array n_replicates x n) Row weights.
+    """
+    _, row_block = np.unique(blocks, return_inverse=True)
+    n_blocks = row_block.max() + 1
+    draws = rng.multinomial(n_blocks, np.full(n_blocks, 1 / n_blocks), size=n_replicates)
+    return draws[:, row_block.ravel()].astype(float)
+
+
+class P2Quantiles:
+    """
+    Streaming estimates of quantiles of many series at once, with the P² algorithm (Jain and
+    Chlamtac, 1985): five markers per series and quantile, whatever the number of observations.
+    """
+
+    def __init__(self, probabilities, n):
+        """
+        :param probabilities: (list of float) Probabilities of the quantiles, in (0, 1).
+        :param n: (int) Number of series, e.g. the length of a timeseries.
+        """
+        self.probabilities = np.asarray(probabilities, dtype=float)
+        if np.any((self.probabilities <= 0) | (self.probabilities >= 1)):
+            raise ValueError("Quantile probabilities must be in (0, 1).")
+
+        k = len(self.probabilities)
+        p = self.probabilities[:, None]
+        # Desired marker positions after five observations, and their increment per observation
+        self.increments = np.hstack([np.zeros((k, 1)), p / 2, p, (1 + p) / 2, np.ones((k, 1))])
+        self.start = np.hstack(
+            [np.ones((k, 1)), 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5 * np.ones((k, 1))]
+        )
+
+        self.count = np.zeros(n, dtype=np.int64)
+        self.heights = np.full((n, k, 5), np.nan)
+        self.positions = np.zeros((n, k, 5))
+        self.desired = np.zeros((n, k, 5))
+
+    def update(self, x):
+        """
+        Add one observation per series.
+
+        :param x: (array n, or r x n for r observations per series) NaN values are ignored.
+        """
+        x = np.asarray(x, dtype=float)
+        for row in np.atleast_2d(x):
+            valid = ~np.isnan(row)
+            starting = valid & (self.count < 5)
+            if np.any(starting):
+                self._add_first(np.flatnonzero(starting), row[starting])
+            running = valid & ~starting
+            if np.any(running):
+                self._add(np.flatnonzero(running), row[running])
+            self.count[valid] += 1
+
+    def _add_first(self, series, x):
+        # The first five observations are kept sorted as the markers
+        slot = self.count[series]
+        self.heights[series, :, slot] = x[:, None]
+        full = series[slot == 4]
+        if len(full):
+            self.heights[full] = np.sort(self.heights[full], axis=-1)
+            self.positions[full] = np.arange(1.0, 6.0)
+            self.desired[full] = self.start
+
+    def _add(self, series, x):
+        q, n = self.heights[series], self.positions[series]
+        x = x[:, None]
+
+        # Cell of the observation, extreme markers being extended if needed
+        cell = np.minimum(np.sum(x[..., None] >= q[..., 1:4], axis=-1), 3)
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        n += np.arange(5) > cell[..., None]
+        desired = self.desired[series] + self.increments
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for i in (1, 2, 3):
+                d = desired[..., i] - n[..., i]
+                move = ((d >= 1) & (n[..., i + 1] - n[..., i] > 1)) | (
+                    (d <= -1) & (n[..., i - 1] - n[..., i] < -1)
+                )
+                if not np.any(move):
+                    continue
+                s = np.sign(d)
+                parabolic = q[..., i] + s / (n[..., i + 1] - n[..., i - 1]) * (
+                    (n[..., i] - n[..., i - 1] + s)
+                    * (q[..., i + 1] - q[..., i])
+                    / (n[..., i + 1] - n[..., i])
+                    + (n[..., i + 1] - n[..., i] - s)
+                    * (q[..., i] - q[..., i - 1])
+                    / (n[..., i] - n[..., i - 1])
+                )
+                neighbour = np.where(s > 0, i + 1, i - 1)[..., None]
+                q_neighbour = np.take_along_axis(q, neighbour, axis=-1)[..., 0]
+                n_neighbour = np.take_along_axis(n, neighbour, axis=-1)[..., 0]
+                linear = q[..., i] + s * (q_neighbour - q[..., i]) / (n_neighbour - n[..., i])
+                inside = (q[..., i - 1] < parabolic) & (parabolic < q[..., i + 1])
+                q[..., i] = np.where(move, np.where(inside, parabolic, linear), q[..., i])
+                n[..., i] += np.where(move, s, 0)
+
+        self.heights[series], self.positions[series], self.desired[series] = q, n, desired
+
+    def quantiles(self):
+        """
+        Current quantile estimates, exact while fewer than five observations were added.
+
+        :return: (array n x k)
+        """
+        estimates = self.heights[..., 2].copy()
+        few = np.flatnonzero((self.count > 0) & (self.count < 5))
+        for c in np.unique(self.count[few]):
+            series = few[self.count[few] == c]
+            estimates[series] = np.quantile(
+                self.heights[series, 0, :c], self.probabilities, axis=-1
+            ).T
+        estimates[self.count == 0] = np.nan
+        return estimates
+
+
+_WORKER = {}
+
+
+def _init_worker(model, X_fit, X_observed, X_target):
+    _WORKER.update(model=model, X_fit=X_fit, X_observed=X_observed, X_target=X_target)
+
+
+def _fit_predict_replicate(row_weights):
+    return fit_predict_replicate(row_weights, **_WORKER)
+
+
+def fit_predict_replicate(row_weights, model, X_fit, X_observed, X_target):
+    """
+    Refit a copy of a model on the rows of a bootstrap replicate (each row repeated as many times
+    as its weight) and predict on the observed and target features.
+
+    :return: Tuple (prediction on observed, prediction on target).
+    """
+    model = copy.deepcopy(model)
+    rows = np.repeat(np.arange(len(row_weights)), row_weights.astype(np.int64))
+    X_replicate = X_fit._with_timeseries(X_fit.timeseries.iloc[rows].reset_index(drop=True))
+    model.model = model.fit_fun(model.model, X_replicate)
+    return (
+        np.asarray(model.predict_fun(model.model, X_observed), dtype=float),
+        np.asarray(model.predict_fun(model.model, X_target), dtype=float),
+    )
+
+
+def bootstrap_predictions(
+    model,
+    X_fit,
+    X_observed,
+    X_target,
+    n_replicates,
+    block="day",
+    batch_size=32,
+    n_jobs=None,
+    seed=0,
+):
+    """
+    Predictions of a model refitted on block bootstrap replicates of its training rows.
+
+    Models implementing `fit_replicates` and `predict_replicates` fit a whole batch of
+    replicates at once from weighted sufficient statistics. Other models are refitted one
+    replicate at a time in a process pool. Only one batch of replicates is held in memory.
+
+    :param model: (TimeseriesModel) Fitted model.
+    :param X_fit: (TimeseriesDT) Training features, from `model.get_features(..., True)`.
+    :param X_observed: (TimeseriesDT) Features on the observed weather.
+    :param X_target: (TimeseriesDT) Features on the target weather.
+    :param n_replicates: (int) Number of bootstrap replicates.
+    :param block: (str) Resampled blocks, "day" or "week".
+    :param batch_size: (int) Number of replicates per batch.
+    :param n_jobs: (int) Number of processes for models refitted one replicate at a time,
+        defaults to the number of CPUs. 1 refits in the current process.
+    :param seed: Seed of the replicates: the same seed gives the same replicates.
+    :return: Generator of (prediction on observed, prediction on target), arrays
+        batch x n.
+    """
+    rng = np.random.default_rng(seed)
+    blocks = get_blocks(X_fit, block)
+    batches = [
+        min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)
+    ]
+
+    if hasattr(model, "fit_replicates"):
+        for size in batches:
+            keys, params = model.fit_replicates(X_fit, block_bootstrap_weights(blocks, size, rng))
+            yield (
+                model.predict_replicates(keys, params, X_observed),
+                model.predict_replicates(keys, params, X_target),
+            )
+        return
+
+    n_jobs = n_jobs or os.cpu_count()
+    if n_jobs == 1:
+        for size in batches:
+            results = [
+                fit_predict_replicate(weights, model, X_fit, X_observed, X_target)
+                for weights in block_bootstrap_weights(blocks, size, rng)
+            ]
+            yield tuple(np.stack(predictions) for predictions in zip(*results))
+        return
+
+    logger.info(f"Refitting {n_replicates} bootstrap replicates on {n_jobs} processes")
+    with ProcessPoolExecutor(
+        n_jobs, initializer=_init_worker, initargs=(model, X_fit, X_observed, X_target)
+    ) as pool:
+        for size in batches:
+            results = list(
+                pool.map(_fit_predict_replicate, block_bootstrap_weights(blocks, size, rng))
+            )
+            yield tuple(np.stack(predictions) for predictions in zip(*results))
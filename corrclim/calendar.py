@@ -0,0 +1,233 @@
+import hashlib
+import threading
+import weakref
+
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+NS_PER_DAY = 86_400 * 10**9
+
+# Fixed French public holidays (month, day)
+FIXED_HOLIDAYS = [(1, 1), (5, 1), (5, 8), (7, 14), (8, 15), (11, 1), (11, 11), (12, 25)]
+# Movable French public holidays, in days after Easter Sunday: Easter Monday, Ascension,
+# Whit Monday
+EASTER_HOLIDAYS = [1, 39, 50]
+
+_CACHE = weakref.WeakValueDictionary()
+_CACHE_LOCK = threading.Lock()
+
+
+def easter_sunday(years):
+    """
+    Gregorian Easter Sunday of each year (anonymous Gregorian algorithm), as datetime64[D].
+    """
+    y = np.asarray(years, dtype=np.int64)
+    a = y % 19
+    b, c = y // 100, y % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    ell = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * ell) // 451
+    month = (h + ell - 7 * m + 114) // 31
+    day = (h + ell - 7 * m + 114) % 31 + 1
+    return _to_dates(y, month, day)
+
+
+def _to_dates(years, months, days):
+    return (
+        (np.asarray(years) - 1970).astype("datetime64[Y]")
+        + (np.asarray(months) - 1).astype("timedelta64[M]")
+    ).astype("datetime64[D]") + (np.asarray(days) - 1).astype("timedelta64[D]")
+
+
+def group_offsets(codes):
+    """
+    Groups of rows by code, from a single stable sort of the codes.
+
+    :param codes: (array) Code of each row, without missing values.
+    :return: (labels, order, offsets): rows of group labels[g] are order[offsets[g]:offsets[g + 1]],
+        in their original order.
+    """
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]][: len(codes)])
+    return sorted_codes[starts], order, np.r_[starts, len(codes)].astype(np.int64)
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+class CalendarIndex:
+    """
+    Calendar features of a time axis, stored as compact integer arrays.
+
+    Features are computed once per distinct day then broadcast to the rows, and the index is
+    shared by reference by every TimeseriesDT with the same time axis (see `get_calendar_index`).
+    Group-by operations use precomputed group offsets instead of re-hashing keys.
+    """
+
+    def __init__(self, wall_time, step=None):
+        """
+        :param wall_time: (array of int64) Local wall-clock timestamps in nanoseconds.
+        :param step: (int) Time step in nanoseconds of the series the timestamps belong to. If
+            None, the smallest gap between the timestamps, which is only meaningful for series of
+            several timestamps.
+        """
+        wall_time = np.asarray(wall_time, dtype=np.int64)
+        self.n = len(wall_time)
+
+        day_number = wall_time // NS_PER_DAY
+        days, row_day = np.unique(day_number, return_inverse=True)
+        row_day = row_day.ravel()
+        self.time_of_day = _read_only(wall_time - day_number * NS_PER_DAY)
+
+        if step is None:
+            steps = np.unique(np.diff(np.unique(wall_time)))
+            step = int(steps.min()) if len(steps) else NS_PER_DAY
+        if step <= 0:
+            raise ValueError("The time step must be positive")
+        self.step = int(step)
+        self.steps_per_day = max(NS_PER_DAY // self.step, 1)
+
+        day_dates = days.astype("datetime64[D]")
+        day_index = pd.DatetimeIndex(day_dates)
+        years = day_index.year.to_numpy()
+        month = day_index.month.to_numpy()
+        day_of_year = day_index.dayofyear.to_numpy()
+        weekday = day_index.weekday.to_numpy()
+        days_in_year = np.where(day_index.is_leap_year, 366, 365)
+
+        holiday = self._is_holiday(day_dates)
+
+        # A bridge day is a working day between two days off (weekend or holiday)
+        neighbours = np.concatenate([day_dates - 1, day_dates + 1])
+        neighbour_weekday = (neighbours.astype(np.int64) - 4) % 7  # 1970-01-01 is a Thursday
+        neighbour_off = (neighbour_weekday >= 5) | self._is_holiday(neighbours)
+        before_off, after_off = np.split(neighbour_off, 2)
+        bridge = (weekday < 5) & ~holiday & before_off & after_off
+
+        self.days = _read_only(days.astype(np.int64))  # Local day numbers since 1970-01-01
+        self.day = _read_only(row_day.astype(np.int32))
+        self.hour = _read_only((self.time_of_day // (3600 * 10**9)).astype(np.int8))
+        self.step_of_day = _read_only((self.time_of_day // self.step).astype(np.int32))
+        self.weekday = _read_only(weekday.astype(np.int8)[row_day])
+        self.week = _read_only(day_index.isocalendar().week.to_numpy(dtype=np.int8)[row_day])
+        self.month = _read_only(month.astype(np.int8)[row_day])
+        self.year = _read_only(years.astype(np.int16)[row_day])
+        self.jour_ferie = _read_only(holiday.astype(np.int8)[row_day])
+        self.ponts = _read_only(bridge.astype(np.int8)[row_day])
+        self.posan = _read_only(((day_of_year - 1) / days_in_year).astype(np.float32)[row_day])
+
+        self._instants = {}
+        self._groups = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _is_holiday(dates):
+        years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        month = (dates.astype("datetime64[M]").astype(np.int64) % 12) + 1
+        day_of_month = (dates - dates.astype("datetime64[M]")).astype(np.int64) + 1
+        holiday = np.zeros(len(dates), dtype=bool)
+        for fixed_month, fixed_day in FIXED_HOLIDAYS:
+            holiday |= (month == fixed_month) & (day_of_month == fixed_day)
+        easter = easter_sunday(np.unique(years))
+        for offset in EASTER_HOLIDAYS:
+            holiday |= np.isin(dates, easter + np.timedelta64(offset, "D"))
+        return holiday
+
+    def get_instant(self, granularity="day"):
+        """
+        Instant codes: position of each row within its day ("day") or week ("week").
+        """
+        with self._lock:
+            if granularity not in self._instants:
+                if granularity == "day":
+                    instant = self.step_of_day
+                elif granularity == "week":
+                    instant = self.weekday.astype(np.int32) * self.steps_per_day + self.step_of_day
+                else:
+                    raise ValueError("Unsupported instant granularity, use 'day' or 'week'.")
+                self._instants[granularity] = _read_only(instant.astype(np.int32))
+            return self._instants[granularity]
+
+    def get_codes(self, key):
+        """
+        Integer codes of a calendar key: "hour", "wday", "week", "month", "year", "day",
+        "instant_day" or "instant_week".
+        """
+        keys = {
+            "hour": self.hour,
+            "wday": self.weekday,
+            "week": self.week,
+            "month": self.month,
+            "year": self.year,
+            "day": self.day,
+        }
+        if key in keys:
+            return keys[key]
+        if key.startswith("instant_"):
+            return self.get_instant(key[len("instant_") :])
+        raise ValueError("Unsupported granularity")
+
+    def get_groups(self, key):
+        """
+        Precomputed groups of a calendar key.
+
+        :return: (labels, order, offsets): rows of group labels[g] are
+            order[offsets[g]:offsets[g + 1]].
+        """
+        with self._lock:
+            if key not in self._groups:
+                self._groups[key] = tuple(
+                    _read_only(array) for array in group_offsets(self.get_codes(key))
+                )
+            return self._groups[key]
+
+    def get_features(self):
+        """
+        Calendar columns used by the models.
+        """
+        return {
+            "jour_semaine": self.weekday,
+            "jour_ferie": self.jour_ferie,
+            "ponts": self.ponts,
+            "posan": self.posan,
+        }
+
+
+def get_calendar_index(time, step=None):
+    """
+    Return the calendar index of a time column, shared with every other time column holding the
+    same timestamps.
+
+    :param time: (Series) Time column of a TimeseriesDT.
+    :param step: (int) Time step in nanoseconds of the series, see `CalendarIndex`.
+    """
+    index = pd.DatetimeIndex(time)
+    tz = str(index.tz) if index.tz is not None else None
+    if tz is not None:
+        index = index.tz_localize(None)
+    wall_time = index.as_unit("ns").asi8
+
+    step = int(step) if step is not None else None
+    key = (
+        tz,
+        step,
+        len(wall_time),
+        hashlib.blake2b(wall_time.tobytes(), digest_size=16).hexdigest(),
+    )
+    with _CACHE_LOCK:
+        calendar = _CACHE.get(key)
+        if calendar is None:
+            calendar = CalendarIndex(wall_time, step)
+            _CACHE[key] = calendar
+    return calendar
@@ -1,12 +1,20 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
 
-from loguru import logger
+import numpy as np
 
+from corrclim import serialization
+from corrclim._lazy import lazy_import
+from corrclim.bootstrap import P2Quantiles, bootstrap_predictions
 from corrclim.operator import Operator, OperatorAdditive
+from corrclim.prefetch import ScenarioPrefetcher, read_scenario
 from corrclim.timeseries_dt import TimeseriesDT
 from corrclim.timeseries_model.timeseries_model import TimeseriesModel
 from corrclim.timeseries_std_model import TimeseriesStdModel
 
+logger = lazy_import("loguru", "logger")
+
 
 @dataclass
 class ClimaticCorrector:
@@ -35,17 +43,23 @@ class ClimaticCorrector:
         weather_observed = TimeseriesDT(weather_observed)
 
         if isinstance(self.operator, OperatorAdditive) and self.timeseries_std_model:
-            self.timeseries_std_model.fit(timeseries, weather_observed, fold_varname)
+            # The cross-validation of the expectation model also fits it on all the data
+            shared = (
+                self.timeseries_std_model.conditional_expectation_model is self.timeseries_model
+            )
+            self.timeseries_std_model.fit(
+                timeseries, weather_observed, fold_varname, fit_expectation=shared
+            )
+            if shared:
+                return
         self.timeseries_model.fit(timeseries, weather_observed)
 
     def apply(self, timeseries, weather_observed, weather_target):
         logger.info("Applying the Climate Correction...")
 
-        timeseries = TimeseriesDT(timeseries, is_output=True)
-        weather_observed = TimeseriesDT(weather_observed)
-        weather_target = TimeseriesDT(weather_target)
-
-        weather_target, weather_observed = timeseries.align(weather_target, weather_observed)
+        timeseries, weather_observed, weather_target = self._align_inputs(
+            timeseries, weather_observed, weather_target
+        )
 
         logger.info("Prediction on the target:")
         y_pred_target = self.timeseries_model.predict(weather_target)
@@ -75,6 +89,214 @@ class ClimaticCorrector:
         logger.info("Climate correction ended.")
         return y_climate_corrected
 
+    def apply_batch(self, requests):
+        """
+        Apply the climate correction to several independent requests at once.
+
+        The features of each request are computed separately, then the models are evaluated once
+        on the rows of all requests, which amortizes their per-call overhead over small requests.
+        The results are identical to calling `apply` on each request.
+
+        :param requests: (list) Tuples (timeseries, weather_observed, weather_target).
+        :return: (list of TimeseriesDT) The climate-corrected timeseries, in the requests order.
+        """
+        use_std_model = isinstance(self.operator, OperatorAdditive) and self.timeseries_std_model
+        aligned = [self._align_inputs(*request) for request in requests]
+        weathers = [weather for _, observed, target in aligned for weather in (target, observed)]
+
+        y_pred = self.timeseries_model.predict_batch(weathers)
+        if use_std_model:
+            y_std = self.timeseries_std_model.predict_batch(weathers)
+
+        corrected = []
+        for i, (timeseries, _, _) in enumerate(aligned):
+            predictions = {"y_pred_target": y_pred[2 * i], "y_pred_observed": y_pred[2 * i + 1]}
+            if use_std_model:
+                predictions["y_std_target"] = y_std[2 * i]
+                predictions["y_std_observed"] = y_std[2 * i + 1]
+            corrected.append(self.operator.apply(timeseries=timeseries, **predictions))
+        return corrected
+
+    def apply_stream(self, chunks):
+        """
+        Apply the climate correction to a stream of chunks, e.g. a near-real-time feed.
+
+        Each chunk is corrected as soon as it is received. The state needed across chunk
+        boundaries (smoothers, rows of shifted variables) is carried from one chunk to the next,
+        so that the corrected chunks are identical to `apply` on the concatenated data, while
+        memory stays bounded by the chunk size.
+
+        :param chunks: Iterable of aligned (timeseries, weather_observed, weather_target) chunks,
+            in time order.
+        :return: Generator of climate-corrected chunks (TimeseriesDT).
+        """
+        use_std_model = isinstance(self.operator, OperatorAdditive) and self.timeseries_std_model
+        states = {"target": None, "observed": None, "std_target": None, "std_observed": None}
+
+        for timeseries, weather_observed, weather_target in chunks:
+            timeseries, weather_observed, weather_target = self._align_inputs(
+                timeseries, weather_observed, weather_target
+            )
+
+            y_pred_target, states["target"] = self.timeseries_model.predict_chunk(
+                weather_target, states["target"]
+            )
+            y_pred_observed, states["observed"] = self.timeseries_model.predict_chunk(
+                weather_observed, states["observed"]
+            )
+
+            if use_std_model:
+                y_std_target, states["std_target"] = self.timeseries_std_model.predict_chunk(
+                    weather_target, states["std_target"]
+                )
+                y_std_observed, states["std_observed"] = self.timeseries_std_model.predict_chunk(
+                    weather_observed, states["std_observed"]
+                )
+                yield self.operator.apply(
+                    timeseries=timeseries,
+                    y_pred_observed=y_pred_observed,
+                    y_pred_target=y_pred_target,
+                    y_std_observed=y_std_observed,
+                    y_std_target=y_std_target,
+                )
+            else:
+                yield self.operator.apply(
+                    timeseries=timeseries,
+                    y_pred_observed=y_pred_observed,
+                    y_pred_target=y_pred_target,
+                )
+
+    def apply_scenarios(
+        self,
+        timeseries,
+        weather_observed,
+        scenarios,
+        loader=read_scenario,
+        n_prefetch=2,
+        max_bytes=2 * 1024**3,
+    ):
+        """
+        Apply the climate correction for many target weather scenarios.
+
+        The next scenarios are read (and their time normalized) in background threads while the
+        current one is being predicted, within a memory budget. Predictions on the observed
+        weather do not depend on the scenario and are computed once.
+
+        :param timeseries: Observed timeseries to correct.
+        :param weather_observed: Observed weather.
+        :param scenarios: Iterable of target weather scenarios (Parquet/CSV paths or data).
+        :param loader: Function reading a scenario into a TimeseriesDT.
+        :param n_prefetch: (int) Maximum number of scenarios loaded ahead.
+        :param max_bytes: (int) Memory budget of the scenarios loaded ahead.
+        :return: Generator of (scenario, climate-corrected TimeseriesDT), in the scenarios order.
+        """
+        use_std_model = isinstance(self.operator, OperatorAdditive) and self.timeseries_std_model
+
+        timeseries = TimeseriesDT(timeseries, is_output=True)
+        (weather_observed,) = timeseries.align(TimeseriesDT(weather_observed))
+
+        y_pred_observed = self.timeseries_model.predict(weather_observed)
+        if use_std_model:
+            y_std_observed = self.timeseries_std_model.predict(weather_observed)
+
+        prefetcher = ScenarioPrefetcher(scenarios, loader, n_prefetch, max_bytes)
+        for scenario, weather_target in prefetcher:
+            logger.info(f"Applying the Climate Correction on scenario {scenario}...")
+            (weather_target,) = timeseries.align(weather_target)
+            y_pred_target = self.timeseries_model.predict(weather_target)
+
+            if use_std_model:
+                yield (
+                    scenario,
+                    self.operator.apply(
+                        timeseries=timeseries,
+                        y_pred_observed=y_pred_observed,
+                        y_pred_target=y_pred_target,
+                        y_std_observed=y_std_observed,
+                        y_std_target=self.timeseries_std_model.predict(weather_target),
+                    ),
+                )
+            else:
+                yield (
+                    scenario,
+                    self.operator.apply(
+                        timeseries=timeseries,
+                        y_pred_observed=y_pred_observed,
+                        y_pred_target=y_pred_target,
+                    ),
+                )
+
+    def bootstrap(
+        self,
+        timeseries,
+        weather_observed,
+        weather_target,
+        n_replicates=200,
+        quantiles=(0.05, 0.5, 0.95),
+        block="day",
+        batch_size=32,
+        n_jobs=None,
+        seed=0,
+    ):
+        """
+        Apply the climate correction with bootstrap uncertainty bands.
+
+        The conditional expectation model is refitted on block bootstrap replicates of the
+        observed data (whole days or weeks are resampled, to respect autocorrelation), and the
+        quantiles of the corrected values over the replicates are estimated with a streaming
+        sketch, so that memory does not grow with the number of replicates. The standard
+        deviation model, if any, is not resampled.
+
+        :param timeseries: Observed timeseries, the one the corrector was fitted on.
+        :param weather_observed: Observed weather.
+        :param weather_target: Target weather.
+        :param n_replicates: (int) Number of bootstrap replicates.
+        :param quantiles: (list of float) Probabilities of the band quantiles.
+        :param block: (str) Resampled blocks, "day" or "week".
+        :param batch_size: (int) Number of replicates fitted (or held in memory) at once.
+        :param n_jobs: (int) Number of processes refitting models without batched fits.
+        :param seed: Seed of the replicates.
+        :return: (TimeseriesDT) The climate-corrected timeseries, with one column
+            "y_climate_corrected_q<percent>" per quantile.
+        """
+        use_std_model = isinstance(self.operator, OperatorAdditive) and self.timeseries_std_model
+        model = self.timeseries_model
+        corrected = self.apply(timeseries, weather_observed, weather_target)
+
+        timeseries, weather_observed, weather_target = self._align_inputs(
+            timeseries, weather_observed, weather_target
+        )
+        X_fit = TimeseriesDT(timeseries)
+        X_fit.merge(weather_observed)
+        X_fit = model.get_features(X_fit, is_fitting=True)
+        X_observed = model.get_features(TimeseriesDT(weather_observed))
+        X_target = model.get_features(TimeseriesDT(weather_target))
+
+        stds = {}
+        if use_std_model:
+            stds["y_std_observed"] = np.asarray(self.timeseries_std_model.predict(weather_observed))
+            stds["y_std_target"] = np.asarray(self.timeseries_std_model.predict(weather_target))
+
+        y = timeseries.timeseries["y"].to_numpy(dtype=float)
+        sketch = P2Quantiles(quantiles, len(y))
+        for y_pred_observed, y_pred_target in bootstrap_predictions(
+            model, X_fit, X_observed, X_target, n_replicates, block, batch_size, n_jobs, seed
+        ):
+            sketch.update(self.operator.correct(y, y_pred_observed, y_pred_target, **stds))
+
+        bands = sketch.quantiles()
+        for i, q in enumerate(sketch.probabilities):
+            corrected.assign(f"y_climate_corrected_q{100 * q:g}", bands[:, i])
+        return corrected
+
+    def _align_inputs(self, timeseries, weather_observed, weather_target):
+        timeseries = TimeseriesDT(timeseries, is_output=True)
+        weather_observed = TimeseriesDT(weather_observed)
+        weather_target = TimeseriesDT(weather_target)
+
+        weather_target, weather_observed = timeseries.align(weather_target, weather_observed)
+        return timeseries, weather_observed, weather_target
+
     def get_operator(self):
         return self.operator
 
@@ -86,3 +308,31 @@ class ClimaticCorrector:
 
         with open(path, "wb") as f:
             pickle.dump(self, f)
+
+    def save(self, path: str):
+        """
+        Save the fitted corrector in the compact model format: only the fitted state of its models
+        and operator is written, numeric payloads as memory-mappable NPY files.
+
+        :param path: (str) Directory where the corrector is written.
+        """
+        serialization.save_state(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode="r"):
+        corrector = serialization.load_state(path, mmap_mode)
+        if not isinstance(corrector, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return corrector
+
+    def get_state(self):
+        params = {
+            "timeseries_model": self.timeseries_model,
+            "timeseries_std_model": self.timeseries_std_model,
+            "operator": self.operator,
+        }
+        return params, {}
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        return cls(**params)
@@ -0,0 +1,205 @@
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def degree_days_bank(temperature, thresholds_heating=(), thresholds_cooling=()):
+    """
+    Heating and cooling degree days for many thresholds, in one vectorized pass.
+
+    :param temperature: (array n) Temperatures.
+    :param thresholds_heating: (array k) Heating thresholds: HDD = max(0, threshold - T).
+    :param thresholds_cooling: (array m) Cooling thresholds: CDD = max(0, T - threshold).
+    :return: (dict) Column name ("HDD_15", "CDD_18", ...) -> array n.
+    """
+    temperature = np.asarray(temperature, dtype=float)[:, None]
+    thresholds_heating = np.asarray(thresholds_heating, dtype=float)
+    thresholds_cooling = np.asarray(thresholds_cooling, dtype=float)
+
+    hdd = np.maximum(0, thresholds_heating[None, :] - temperature)
+    cdd = np.maximum(0, temperature - thresholds_cooling[None, :])
+
+    bank = {f"HDD_{threshold:g}": hdd[:, i] for i, threshold in enumerate(thresholds_heating)}
+    bank.update({f"CDD_{threshold:g}": cdd[:, i] for i, threshold in enumerate(thresholds_cooling)})
+    return bank
+
+
+class _SortedMoments:
+    """
+    Prefix sums of 1, T, T^2, y and T*y over temperatures sorted once, so that the moments of
+    degree days for any threshold are computed in constant time.
+    """
+
+    def __init__(self, temperature, y):
+        temperature = np.asarray(temperature, dtype=float)
+        y = np.asarray(y, dtype=float)
+        valid = ~(np.isnan(temperature) | np.isnan(y))
+        order = np.argsort(temperature[valid], kind="stable")
+        self.T = temperature[valid][order]
+        self.y = y[valid][order]
+        self.n = len(self.T)
+        if self.n < 3:
+            raise ValueError("Not enough observations to search degree days thresholds.")
+
+        def prefix(values):
+            return np.r_[0.0, np.cumsum(values)]
+
+        self.count = np.arange(self.n + 1, dtype=float)
+        self.sum_T = prefix(self.T)
+        self.sum_T2 = prefix(self.T**2)
+        self.sum_y = prefix(self.y)
+        self.sum_Ty = prefix(self.T * self.y)
+        self.total_y = self.sum_y[-1]
+        self.total_y2 = np.sum(self.y**2)
+
+    def range_sums(self, start, end):
+        def diff(prefix):
+            return prefix[end] - prefix[start]
+
+        return (
+            diff(self.count),
+            diff(self.sum_T),
+            diff(self.sum_T2),
+            diff(self.sum_y),
+            diff(self.sum_Ty),
+        )
+
+    def heating(self, thresholds):
+        """
+        Moments (S_x, S_xx, S_xy) of HDD = max(0, threshold - T), for each threshold.
+        """
+        end = np.searchsorted(self.T, thresholds, side="left")
+        count, s1, s2, sy, sty = self.range_sums(np.zeros_like(end), end)
+        return (
+            count * thresholds - s1,
+            count * thresholds**2 - 2 * thresholds * s1 + s2,
+            thresholds * sy - sty,
+        )
+
+    def cooling(self, thresholds):
+        """
+        Moments (S_x, S_xx, S_xy) of CDD = max(0, T - threshold), for each threshold.
+        """
+        start = np.searchsorted(self.T, thresholds, side="right")
+        count, s1, s2, sy, sty = self.range_sums(start, np.full_like(start, self.n))
+        return (
+            s1 - count * thresholds,
+            s2 - 2 * thresholds * s1 + count * thresholds**2,
+            sty - thresholds * sy,
+        )
+
+    def cross(self, thresholds_heating, thresholds_cooling):
+        """
+        Sum of HDD * CDD, non-zero only where the cooling threshold is below the heating one.
+        """
+        start = np.searchsorted(self.T, thresholds_cooling, side="right")
+        end = np.maximum(np.searchsorted(self.T, thresholds_heating, side="left"), start)
+        count, s1, s2, _, _ = self.range_sums(start, end)
+        return (
+            -s2
+            + (thresholds_heating + thresholds_cooling) * s1
+            - thresholds_heating * thresholds_cooling * count
+        )
+
+
+def search_threshold(temperature, y, thresholds, kind="heating"):
+    """
+    Fit y ~ a + b * DD(threshold) for every candidate threshold.
+
+    Temperatures are sorted once; the fit of each candidate is then computed in constant time
+    from prefix sums, without building the degree days.
+
+    :param temperature: (array n) Temperatures.
+    :param y: (array n) Response, e.g. the consumption.
+    :param thresholds: (array k) Candidate thresholds.
+    :param kind: (str) "heating" (HDD) or "cooling" (CDD).
+    :return: (DataFrame) One row per threshold: threshold, intercept, slope, sse, r2.
+    """
+    if kind not in ("heating", "cooling"):
+        raise ValueError("kind should be either 'heating' or 'cooling'")
+    moments = _SortedMoments(temperature, y)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    s_x, s_xx, s_xy = getattr(moments, kind)(thresholds)
+    n, s_y = moments.n, moments.total_y
+    sxx = s_xx - s_x**2 / n
+    sxy = s_xy - s_x * s_y / n
+    syy = moments.total_y2 - s_y**2 / n
+
+    has_variance = sxx > 1e-12 * np.maximum(s_xx, 1)
+    slope = np.where(has_variance, sxy / np.where(has_variance, sxx, 1), 0.0)
+    sse = syy - slope * sxy
+
+    return pd.DataFrame(
+        {
+            "threshold": thresholds,
+            "intercept": (s_y - slope * s_x) / n,
+            "slope": slope,
+            "sse": sse,
+            "r2": 1 - sse / syy if syy > 0 else np.nan,
+        }
+    )
+
+
+def search_thresholds_pair(temperature, y, thresholds_heating, thresholds_cooling):
+    """
+    Fit y ~ a + b * HDD(threshold_heating) + c * CDD(threshold_cooling) for every pair of
+    candidate thresholds, from prefix sums over temperatures sorted once.
+
+    :param temperature: (array n) Temperatures.
+    :param y: (array n) Response.
+    :param thresholds_heating: (array k) Candidate heating thresholds.
+    :param thresholds_cooling: (array m) Candidate cooling thresholds.
+    :return: (DataFrame) One row per pair: threshold_heating, threshold_cooling, intercept,
+        slope_heating, slope_cooling, sse, r2.
+    """
+    moments = _SortedMoments(temperature, y)
+    th, tc = np.meshgrid(
+        np.asarray(thresholds_heating, dtype=float),
+        np.asarray(thresholds_cooling, dtype=float),
+        indexing="ij",
+    )
+    th, tc = th.ravel(), tc.ravel()
+
+    h, hh, hy = moments.heating(th)
+    c, cc, cy = moments.cooling(tc)
+    hc = moments.cross(th, tc)
+    n, s_y = moments.n, moments.total_y
+
+    # Centered normal equations of the two slopes
+    a11 = hh - h**2 / n
+    a22 = cc - c**2 / n
+    a12 = hc - h * c / n
+    b1 = hy - h * s_y / n
+    b2 = cy - c * s_y / n
+    syy = moments.total_y2 - s_y**2 / n
+
+    det = a11 * a22 - a12**2
+    solvable = np.abs(det) > 1e-12 * np.maximum(a11 * a22, 1)
+    safe_det = np.where(solvable, det, 1)
+    safe_a11 = np.where(a11 > 0, a11, 1)
+    safe_a22 = np.where(a22 > 0, a22, 1)
+    # Degenerate pairs (no heating or no cooling rows) fall back to a single slope
+    slope_heating = np.where(
+        solvable, (a22 * b1 - a12 * b2) / safe_det, np.where(a11 > 0, b1 / safe_a11, 0)
+    )
+    slope_cooling = np.where(
+        solvable,
+        (a11 * b2 - a12 * b1) / safe_det,
+        np.where((a11 <= 0) & (a22 > 0), b2 / safe_a22, 0),
+    )
+    sse = syy - slope_heating * b1 - slope_cooling * b2
+
+    return pd.DataFrame(
+        {
+            "threshold_heating": th,
+            "threshold_cooling": tc,
+            "intercept": (s_y - slope_heating * h - slope_cooling * c) / n,
+            "slope_heating": slope_heating,
+            "slope_cooling": slope_cooling,
+            "sse": sse,
+            "r2": 1 - sse / syy if syy > 0 else np.nan,
+        }
+    )
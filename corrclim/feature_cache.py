@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from corrclim import serialization
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+logger = lazy_import("loguru", "logger")
+
+META_FILE = "meta.json"
+CACHE_VERSION = 1
+
+
+def hash_frame(data):
+    """
+    Content hash of a DataFrame: column names, dtypes and values.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(len(data)).encode())
+    for name in data.columns:
+        column = data[name]
+        digest.update(f"{name}:{column.dtype}".encode())
+        if pd.api.types.is_datetime64_any_dtype(column):
+            values = pd.DatetimeIndex(column).as_unit("ns").asi8
+        elif pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            values = column.to_numpy()
+        else:
+            values = pd.util.hash_pandas_object(column, index=False).to_numpy()
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def hash_transformation(transformation, **params):
+    """
+    Hash of a transformation and its parameters.
+
+    :param transformation: Name of the transformation, or an object implementing `get_state`
+        (e.g. a fitted smoother), whose class and state are hashed.
+    :param params: Other parameters (thresholds, lags, ...), JSON-serializable.
+    """
+    arrays = {}
+    if hasattr(transformation, "get_state"):
+        description, arrays = serialization.encode_state(transformation)
+    else:
+        description = str(transformation)
+    description = {"transformation": description, "params": params}
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps(description, sort_keys=True, default=str).encode())
+    for key in sorted(arrays):
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Persistent cache of derived feature frames (smoothed variables, degree days, calendar or
+    shifted columns), addressed by the content of the input data and the transformation.
+
+    Each entry is a directory of one NPY file per column plus a metadata file. It is written in
+    a temporary directory then renamed, so readers (possibly in other processes) only ever see
+    complete entries, and columns are memory-mapped when read. Entries are evicted in least
+    recently used order once the cache exceeds its disk budget.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024**3, mmap_mode="r"):
+        """
+        :param root: (str) Cache directory, possibly shared by several processes.
+        :param max_bytes: (int) Disk budget of the cache.
+        :param mmap_mode: Memory-map mode used to read the columns, None to read them in memory.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        os.makedirs(root, exist_ok=True)
+
+    def make_key(self, data, transformation, **params):
+        """
+        Key of the features derived from `data` by `transformation` with `params`.
+        """
+        return hashlib.blake2b(
+            f"{hash_frame(data)}:{hash_transformation(transformation, **params)}".encode(),
+            digest_size=20,
+        ).hexdigest()
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.root, key, META_FILE))
+
+    def get(self, key):
+        """
+        Return the cached frame of `key`, or None if it is not in the cache.
+        """
+        path = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            columns = {
+                column["name"]: self._load_column(path, i, column)
+                for i, column in enumerate(meta["columns"])
+            }
+            # Mark the entry as recently used
+            os.utime(os.path.join(path, META_FILE))
+        except FileNotFoundError:
+            # Missing, or evicted by another process while being read
+            return None
+        return pd.DataFrame(columns, copy=False)
+
+    def put(self, key, data):
+        """
+        Store a frame under `key`, then evict old entries if the cache exceeds its budget.
+        """
+        path = os.path.join(self.root, key)
+        if key in self:
+            return
+
+        tmp_path = os.path.join(self.root, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        try:
+            columns = [
+                self._save_column(tmp_path, i, name, data[name]) for i, name in enumerate(data)
+            ]
+            with open(os.path.join(tmp_path, META_FILE), "w") as f:
+                json.dump({"version": CACHE_VERSION, "columns": columns}, f)
+            os.rename(tmp_path, path)
+        except Exception as error:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            # Renaming fails if another process published the same entry first
+            if not isinstance(error, OSError) or key not in self:
+                raise
+        self.evict()
+
+    def get_or_compute(self, data, transformation, compute, **params):
+        """
+        Return the features derived from `data`, computing and caching them on a miss.
+
+        :param data: (DataFrame) Input data of the transformation.
+        :param transformation: Name of the transformation or object implementing `get_state`.
+        :param compute: Function computing the features (DataFrame) from `data`.
+        :param params: Parameters of the transformation, part of the key.
+        """
+        key = self.make_key(data, transformation, **params)
+        features = self.get(key)
+        if features is None:
+            features = compute(data)
+            try:
+                self.put(key, features)
+            except ValueError as error:
+                # Features with columns that cannot be stored are computed on every call
+                logger.debug(f"Features not cached: {error}")
+        return features
+
+    def smooth(self, smoother, timeseries):
+        """
+        Smooth a timeseries with a fitted smoother, through the cache.
+        """
+        return self.get_or_compute(timeseries, smoother, smoother.smooth)
+
+    def entries(self):
+        """
+        Cached entries as a list of (key, size in bytes, last access time), oldest first.
+        """
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                size = sum(file.stat().st_size for file in os.scandir(entry.path))
+                accessed = os.stat(os.path.join(entry.path, META_FILE)).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((entry.name, size, accessed))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, max_bytes=None):
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= max_bytes:
+                break
+            self.remove(key)
+            total -= size
+            logger.debug(f"Feature cache entry {key} evicted ({size} bytes)")
+
+    def remove(self, key):
+        # Renaming first hides the entry at once; open memory maps stay valid after deletion
+        trash = os.path.join(self.root, f".trash-{key}-{uuid.uuid4().hex}")
+        try:
+            os.rename(os.path.join(self.root, key), trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def clear(self):
+        for key, _, _ in self.entries():
+            self.remove(key)
+
+    @staticmethod
+    def _save_column(path, i, name, column):
+        meta = {"name": name, "dtype": str(column.dtype)}
+        if pd.api.types.is_datetime64_any_dtype(column):
+            tz = getattr(column.dtype, "tz", None)
+            meta["tz"] = str(tz) if tz is not None else None
+            values = pd.DatetimeIndex(column).as_unit("ns").asi8
+        elif pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            values = column.to_numpy()
+        else:
+            raise ValueError(f"Column {name} of type {column.dtype} cannot be cached.")
+        np.save(os.path.join(path, f"{i}.npy"), np.ascontiguousarray(values), allow_pickle=False)
+        return meta
+
+    def _load_column(self, path, i, meta):
+        values = np.load(os.path.join(path, f"{i}.npy"), mmap_mode=self.mmap_mode)
+        if "tz" not in meta:
+            return values
+        if meta["tz"] is None:
+            time = pd.to_datetime(values, unit="ns")
+        else:
+            time = pd.to_datetime(values, unit="ns", utc=True).tz_convert(meta["tz"])
+        # Restore the resolution of the original column
+        dtype = pd.api.types.pandas_dtype(meta["dtype"])
+        return time.as_unit(getattr(dtype, "unit", None) or np.datetime_data(dtype)[0])
@@ -0,0 +1,60 @@
+import re
+
+SHIFTED_SUFFIX = "_shifted"
+
+
+class Formula:
+    """
+    Model formula of the form "y ~ x1 + s(x2) + x3".
+
+    Terms may wrap a variable in a function, e.g. a spline `s(temperature)`, and variables with
+    the "_shifted" suffix are lagged versions of a base variable.
+    """
+
+    def __init__(self, formula):
+        if isinstance(formula, Formula):
+            formula = formula.formula
+        if "~" not in formula:
+            raise ValueError(f"Invalid formula '{formula}': expected 'response ~ terms'.")
+
+        self.formula = formula
+        response, explanatory = formula.split("~", 1)
+        self.response = response.strip()
+        self.terms = [term.strip() for term in explanatory.split("+") if term.strip()]
+
+    def __str__(self):
+        return self.formula
+
+    def __repr__(self):
+        return f"Formula('{self.formula}')"
+
+    def get_response(self):
+        return self.response
+
+    def get_explanatory_variables(self):
+        return [_term_variable(term) for term in self.terms]
+
+    def get_all_variables(self):
+        return [self.response] + self.get_explanatory_variables()
+
+    def get_shifted_variables(self):
+        return [var for var in self.get_all_variables() if var.endswith(SHIFTED_SUFFIX)]
+
+    def get_all_variables_formula_base(self):
+        """
+        Variables of the formula, with the shifted ones replaced by their base variable.
+        """
+        variables = []
+        for var in self.get_all_variables():
+            var = var.removesuffix(SHIFTED_SUFFIX)
+            if var not in variables:
+                variables.append(var)
+        return variables
+
+
+def _term_variable(term):
+    # "s(temperature, n_splines=10)" -> "temperature"
+    match = re.fullmatch(r"\w+\((.*)\)", term)
+    if match:
+        term = match.group(1).split(",")[0]
+    return term.strip()
@@ -0,0 +1,89 @@
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def as_row_lag(n):
+    """
+    Check that a lag is a whole number of rows and return it as an int.
+    """
+    if not float(n).is_integer():
+        raise ValueError(f"Lag of {n} rows is not a whole number of time steps.")
+    return int(n)
+
+
+class LagFeatures:
+    """
+    Lagged (shifted) versions of variables, exposed as views over padded buffers.
+
+    Each variable is copied once into a buffer padded with NaN at both edges, wide enough for
+    every requested lag. The lagged columns are then offset views of this buffer, so adding
+    lags costs no extra copy. A positive lag shifts the values forward in time, as
+    `pandas.Series.shift`: the value at row i is the one of row i - lag.
+    """
+
+    def __init__(self, data, variables, lags):
+        """
+        :param data: (DataFrame) Rows on a regular time step.
+        :param variables: (list of str) Variables to lag.
+        :param lags: (int or list of int) Lags in rows.
+        """
+        lags = [as_row_lag(lag) for lag in np.atleast_1d(lags)]
+        missing = [var for var in variables if var not in data.columns]
+        if missing:
+            raise ValueError(f"Variables to shift not found in the dataset: {', '.join(missing)}")
+
+        self.variables = list(variables)
+        self.lags = lags
+        self.n = len(data)
+        self.before = max(max(lags), 0)
+        self.after = max(-min(lags), 0)
+
+        self._buffers = {}
+        for var in self.variables:
+            buffer = np.full(self.before + self.n + self.after, np.nan)
+            buffer[self.before : self.before + self.n] = data[var].to_numpy(dtype=float)
+            buffer.setflags(write=False)
+            self._buffers[var] = buffer
+
+    def get(self, variable, lag):
+        """
+        Lagged values of a variable, as a read-only view.
+        """
+        lag = as_row_lag(lag)
+        if lag not in self.lags:
+            raise ValueError(f"Lag {lag} was not requested, available lags: {self.lags}.")
+        start = self.before - lag
+        return self._buffers[variable][start : start + self.n]
+
+    def names(self, suffix="_shifted"):
+        """
+        Column names of the lagged variables: "<var><suffix>" for a single lag, else
+        "<var><suffix>_<lag>".
+        """
+        if len(self.lags) == 1:
+            return {(var, self.lags[0]): f"{var}{suffix}" for var in self.variables}
+        return {(var, lag): f"{var}{suffix}_{lag}" for var in self.variables for lag in self.lags}
+
+    def to_frame(self, suffix="_shifted", index=None):
+        """
+        Lagged variables as a DataFrame, built on the views without copying them.
+        """
+        columns = {name: self.get(var, lag) for (var, lag), name in self.names(suffix).items()}
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def join(self, data, suffix="_shifted"):
+        """
+        Add the lagged columns to `data`, returning a new DataFrame.
+
+        The new frame is assembled from the column arrays of `data` and the lag views as they
+        are, so that no value is copied whatever the pandas version (`pd.concat` copies every
+        column without Copy-on-Write): joining costs the same for any number of rows.
+        """
+        names = self.names(suffix)
+        lagged = set(names.values())
+        columns = {name: data[name].array for name in data.columns if name not in lagged}
+        columns.update({name: self.get(var, lag) for (var, lag), name in names.items()})
+        return pd.DataFrame(columns, index=data.index, copy=False)
@@ -1,16 +1,19 @@
-from abc import ABC, abstractmethod
-
 import numpy as np
-import pandas as pd
-from loguru import logger
 
+from corrclim._lazy import lazy_import
 from corrclim.timeseries_dt import TimeseriesDT
 
+pd = lazy_import("pandas")
+logger = lazy_import("loguru", "logger")
+
 
-# Abstract Base Operator
-class Operator(ABC):
+# Base Operator
+class Operator:
     """
     Base class for climate correction operators.
+
+    Operators implement either `correct`, the correction on arrays used by `apply_fun` and the
+    bootstrap, or their own `apply_fun`; the bootstrap then requires `correct` too.
     """
 
     def apply(
@@ -27,19 +30,51 @@ class Operator(ABC):
         :return: (TimeseriesDT) Climate-corrected timeseries.
         """
         logger.info(f"Applying {self.__class__.__name__} for climate correction.")
-        timeseries = TimeseriesDT(timeseries.get_timeseries())
+        timeseries = TimeseriesDT(timeseries)
+
+        # Predictions are matched with the timeseries by position
+        y_pred_observed, y_pred_target, y_std_observed, y_std_target = (
+            None if y is None else np.asarray(y, dtype=float)
+            for y in (y_pred_observed, y_pred_target, y_std_observed, y_std_target)
+        )
         return self.apply_fun(
             timeseries, y_pred_observed, y_pred_target, y_std_observed, y_std_target
         )
 
-    @abstractmethod
     def apply_fun(
         self, timeseries, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None
     ):
+        timeseries_df = timeseries.timeseries.copy(deep=False)
+        timeseries_df["y_climate_corrected"] = self.correct(
+            timeseries_df["y"].to_numpy(dtype=float),
+            y_pred_observed,
+            y_pred_target,
+            y_std_observed,
+            y_std_target,
+        )
+        return timeseries._with_timeseries(timeseries_df)
+
+    def correct(self, y, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None):
+        """
+        Operator-specific correction, on arrays. Predictions may have a leading replicate axis,
+        the corrected values are then broadcast to one row per replicate.
+
+        :param y: (array n) Observed values.
+        :return: (array) Climate-corrected values.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not implement the array correction `correct`."
+        )
+
+    def get_state(self):
         """
-        Abstract method to implement the operator-specific logic.
+        Operators are stateless: only their class is saved in the compact model format.
         """
-        pass
+        return {}, {}
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        return cls()
 
 
 # OperatorTarget: Returns y_pred_target as the result
@@ -47,42 +82,33 @@ class OperatorTarget(Operator):
     def apply_fun(
         self, timeseries, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None
     ):
-        return TimeseriesDT(pd.DataFrame({"y_climate_corrected": y_pred_target}))
+        corrected = pd.DataFrame(
+            {"time": timeseries.timeseries["time"], "y_climate_corrected": y_pred_target}
+        )
+        return timeseries._with_timeseries(corrected)
+
+    def correct(self, y, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None):
+        return np.asarray(y_pred_target, dtype=float)
 
 
 # OperatorAdditive: Adds delta (y_pred_target - y_pred_observed) to the timeseries
 class OperatorAdditive(Operator):
-    def apply_fun(
-        self, timeseries, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None
-    ):
-        timeseries_df = timeseries.get_timeseries()
+    def correct(self, y, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None):
         delta = y_pred_target - y_pred_observed
-        timeseries_df["y_climate_corrected"] = timeseries_df["y"] + delta
-        return TimeseriesDT(timeseries_df)
+        return y + delta
 
 
 # OperatorMultiplicative: Multiplies values by the ratio of predictions
 class OperatorMultiplicative(Operator):
-    def apply_fun(
-        self, timeseries, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None
-    ):
-        timeseries_df = timeseries.get_timeseries()
-        timeseries_df["y_climate_corrected"] = timeseries_df["y"] * (
-            y_pred_target / y_pred_observed
-        )
-        return TimeseriesDT(timeseries_df)
+    def correct(self, y, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None):
+        return y * (y_pred_target / y_pred_observed)
 
 
 # Operator2Moments: Preserves the first two distribution moments
 class Operator2Moments(Operator):
-    def apply_fun(self, timeseries, y_pred_observed, y_pred_target, y_std_observed, y_std_target):
-        timeseries_df = timeseries.get_timeseries()
-
+    def correct(self, y, y_pred_observed, y_pred_target, y_std_observed, y_std_target):
         # Handle cases where standard deviation is zero
         y_std_target = np.where(y_std_target == 0, 1, y_std_target)
         y_std_observed = np.where(y_std_observed == 0, 1, y_std_observed)
 
-        timeseries_df["y_climate_corrected"] = y_pred_target + (y_std_target / y_std_observed) * (
-            timeseries_df["y"] - y_pred_observed
-        )
-        return TimeseriesDT(timeseries_df)
+        return y_pred_target + (y_std_target / y_std_observed) * (y - y_pred_observed)
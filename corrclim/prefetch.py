@@ -0,0 +1,112 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from corrclim._lazy import lazy_import
+from corrclim.timeseries_dt import TimeseriesDT
+
+pd = lazy_import("pandas")
+logger = lazy_import("loguru", "logger")
+
+_EXHAUSTED = object()
+
+
+def read_scenario(source):
+    """
+    Read a weather scenario into a TimeseriesDT.
+
+    :param source: Path of a Parquet or CSV file, or data convertible to TimeseriesDT.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".parquet":
+            source = pd.read_parquet(path)
+        elif extension == ".csv":
+            source = pd.read_csv(path)
+        else:
+            raise ValueError(f"Unsupported scenario file format: {extension}")
+    return TimeseriesDT(source)
+
+
+def _memory_usage(timeseries):
+    return int(timeseries.timeseries.memory_usage(index=True, deep=True).sum())
+
+
+class ScenarioPrefetcher:
+    """
+    Iterator over weather scenarios, read and ingested into TimeseriesDT in background threads
+    while the previous scenarios are being processed.
+
+    At most `n_prefetch` scenarios are loaded ahead, and fewer if the loaded scenarios would
+    exceed `max_bytes` in memory: loads not yet finished are assumed as large as the largest
+    scenario seen so far, and a single one is loaded ahead until the size of a scenario is known.
+    At least one scenario is always loaded ahead, so that a scenario larger than the budget does
+    not stall the iteration.
+    """
+
+    def __init__(
+        self, sources, loader=read_scenario, n_prefetch=2, max_bytes=2 * 1024**3, n_workers=None
+    ):
+        """
+        :param sources: Iterable of scenarios (file paths or data), possibly lazy.
+        :param loader: Function reading a source into a TimeseriesDT.
+        :param n_prefetch: (int) Maximum number of scenarios loaded ahead.
+        :param max_bytes: (int) Memory budget of the scenarios loaded ahead.
+        :param n_workers: (int) Number of reading threads, defaults to `n_prefetch`.
+        """
+        if n_prefetch < 1:
+            raise ValueError("n_prefetch must be at least 1")
+        self.sources = sources
+        self.loader = loader
+        self.n_prefetch = n_prefetch
+        self.max_bytes = max_bytes
+        self.n_workers = n_workers or n_prefetch
+        self._largest = 0
+
+    def __iter__(self):
+        """
+        :return: Generator of (source, TimeseriesDT), in the order of the sources.
+        """
+        sources = iter(self.sources)
+        pending = deque()
+
+        with ThreadPoolExecutor(self.n_workers, thread_name_prefix="corrclim-prefetch") as pool:
+            try:
+                exhausted = self._fill(pool, sources, pending)
+                while pending:
+                    source, future = pending.popleft()
+                    timeseries, _ = future.result()
+                    # Load the next scenarios while this one is being processed
+                    if not exhausted:
+                        exhausted = self._fill(pool, sources, pending)
+                    yield source, timeseries
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def _load(self, source):
+        timeseries = self.loader(source)
+        size = _memory_usage(timeseries)
+        self._largest = max(self._largest, size)
+        return timeseries, size
+
+    def _reserved_bytes(self, pending):
+        return sum(
+            future.result()[1] if future.done() and not future.exception() else self._largest
+            for _, future in pending
+        )
+
+    def _fill(self, pool, sources, pending):
+        # Submit loads until the prefetch depth or the memory budget is reached
+        while len(pending) < self.n_prefetch:
+            if pending and (
+                self._largest == 0 or self._reserved_bytes(pending) + self._largest > self.max_bytes
+            ):
+                logger.debug("Scenario prefetching paused: memory budget reached")
+                return False
+            source = next(sources, _EXHAUSTED)
+            if source is _EXHAUSTED:
+                return True
+            pending.append((source, pool.submit(self._load, source)))
+        return False
@@ -0,0 +1,128 @@
+from corrclim.serialization import get_class_path, import_from_path
+
+
+class Registry:
+    """
+    Registry of named classes (models, smoothers or operators), imported lazily.
+
+    Classes are registered by their "module:qualname" path, so that a backend module and its
+    heavy dependencies are only imported when a class is requested. Third-party packages can
+    register their own classes through the `entry_point_group` entry points.
+    """
+
+    def __init__(self, kind, classes=None, entry_point_group=None):
+        """
+        :param kind: (str) Kind of registered classes, used in error messages.
+        :param classes: (dict) Mapping from names to "module:qualname" paths.
+        :param entry_point_group: (str) Entry points group to look plugins up in.
+        """
+        self.kind = kind
+        self.entry_point_group = entry_point_group
+        self._paths = dict(classes or {})
+        self._classes = {}
+        self._plugins_loaded = False
+
+    def register(self, name, target=None):
+        """
+        Register a class under `name`.
+
+        :param name: (str) Name of the class in the registry.
+        :param target: A class or a "module:qualname" path. If None, return a class decorator.
+        """
+        if target is None:
+
+            def decorator(cls):
+                self.register(name, cls)
+                return cls
+
+            return decorator
+
+        if isinstance(target, str):
+            self._paths[name] = target
+            self._classes.pop(name, None)
+        else:
+            self._paths[name] = get_class_path(target)
+            self._classes[name] = target
+        return target
+
+    def get(self, name):
+        """
+        Return the class registered under `name`, importing its module if needed.
+        """
+        if name not in self._classes:
+            if name not in self._paths:
+                self._load_plugins()
+            if name not in self._paths:
+                raise ValueError(
+                    f"Unknown {self.kind} '{name}'. Available: {', '.join(self.names())}."
+                )
+            self._classes[name] = import_from_path(self._paths[name])
+        return self._classes[name]
+
+    def build(self, name, *args, **kwargs):
+        """
+        Instantiate the class registered under `name`.
+        """
+        return self.get(name)(*args, **kwargs)
+
+    def names(self):
+        self._load_plugins()
+        return sorted(self._paths)
+
+    def is_loaded(self, name):
+        """
+        Whether the class registered under `name` has already been imported.
+        """
+        return name in self._classes
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def _load_plugins(self):
+        if self._plugins_loaded or self.entry_point_group is None:
+            return
+        self._plugins_loaded = True
+
+        from importlib.metadata import entry_points
+
+        try:
+            group = entry_points(group=self.entry_point_group)
+        except TypeError:
+            # Python 3.9: entry points are returned as a dict of groups
+            group = entry_points().get(self.entry_point_group, [])
+        for entry_point in group:
+            self._paths.setdefault(entry_point.name, entry_point.value)
+
+
+models = Registry(
+    "model",
+    {
+        "grad_delta": "corrclim.timeseries_model.grad_delta:GradDelta",
+        "gam": "corrclim.timeseries_model.gam:GAM",
+        "gam_std": "corrclim.timeseries_model.gam:GamStd",
+    },
+    entry_point_group="corrclim.models",
+)
+
+smoothers = Registry(
+    "smoother",
+    {
+        "exponential": "corrclim.smoother:ExponentialSmoother",
+        "dummy": "corrclim.smoother:DummySmoother",
+        "grid_search": "corrclim.smoother:GridSearchSmoother",
+        "bayesian": "corrclim.smoother:BayesianSmoother",
+        "multi": "corrclim.smoother:MultiSmoother",
+    },
+    entry_point_group="corrclim.smoothers",
+)
+
+operators = Registry(
+    "operator",
+    {
+        "target": "corrclim.operator:OperatorTarget",
+        "additive": "corrclim.operator:OperatorAdditive",
+        "multiplicative": "corrclim.operator:OperatorMultiplicative",
+        "2moments": "corrclim.operator:Operator2Moments",
+    },
+    entry_point_group="corrclim.operators",
+)
@@ -0,0 +1,219 @@
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+# Level each level is derived from: weeks straddle months, so they are built from days
+PARENT_LEVEL = {"day": "hour", "week": "day", "month": "day", "year": "month"}
+# Level and calendar code of the profiles of `TimeseriesDT.groupby`
+PROFILE_LEVEL = {"hour": "hour", "wday": "day", "week": "day", "month": "month", "year": "year"}
+
+_STATISTICS = ("sum", "count", "min", "max", "sumsq")
+
+FUNCTIONS = ("mean", "sum", "count", "min", "max", "std", "var")
+_FUNCTION_NAMES = {
+    np.mean: "mean",
+    np.sum: "sum",
+    np.min: "min",
+    np.max: "max",
+    len: "count",
+}
+
+
+def get_function_name(func):
+    """
+    Name of an aggregation function computed from the rollup statistics, None if it is not.
+    """
+    if isinstance(func, str):
+        return func if func in FUNCTIONS else None
+    try:
+        return _FUNCTION_NAMES.get(func)
+    except TypeError:
+        return None
+
+
+def _reduce(statistics, starts):
+    # Merge contiguous runs of periods into coarser ones
+    if len(starts) == 0:
+        return {name: statistics[name][:0] for name in _STATISTICS}
+    return {
+        "sum": np.add.reduceat(statistics["sum"], starts, axis=0),
+        "count": np.add.reduceat(statistics["count"], starts, axis=0),
+        "min": np.fmin.reduceat(statistics["min"], starts, axis=0),
+        "max": np.fmax.reduceat(statistics["max"], starts, axis=0),
+        "sumsq": np.add.reduceat(statistics["sumsq"], starts, axis=0),
+    }
+
+
+def _run_starts(keys):
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else keys[:0]
+
+
+class RollupPyramid:
+    """
+    Mergeable aggregates (sum, count, min, max and sum of squares, NaN being skipped) of the
+    variables of a timeseries, per hour, day, week, month and year.
+
+    Hours are aggregated from the rows, and each coarser level from the level below it, so that
+    each level costs time proportional to the level below. Levels are built on first use and
+    kept, as are the profiles merged from them; any aggregation function computed from these
+    statistics (mean, sum, count, min, max, std, var) is then derived without going back to the
+    rows.
+    """
+
+    def __init__(self, time, values, variables):
+        """
+        :param time: (Series) Sorted time column.
+        :param values: (array n x v) Values of the variables.
+        :param variables: (list of str) Names of the variables.
+        """
+        self.variables = list(variables)
+        index = pd.DatetimeIndex(time)
+        self.tz = index.tz
+        utc = index.as_unit("ns").asi8
+
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        starts = _run_starts(utc // NS_PER_HOUR)
+        hours = _reduce(
+            {
+                "sum": filled,
+                "count": valid.astype(np.int64),
+                "min": values,
+                "max": values,
+                "sumsq": filled**2,
+            },
+            starts,
+        )
+        # Hours are delimited in UTC (a repeated local hour is not merged), then labelled and
+        # rolled up in local time
+        start = utc[starts] // NS_PER_HOUR * NS_PER_HOUR if len(utc) else utc
+        hours["start"] = self._to_wall_time(start)
+        self._levels = {"hour": hours}
+        self._profiles = {}
+
+    def get_level(self, level):
+        """
+        Statistics of a level: dict of arrays, "start" (local period start, int64 ns) and
+        "sum", "count", "min", "max", "sumsq" (periods x variables).
+        """
+        if level not in self._levels:
+            if level not in PARENT_LEVEL:
+                raise ValueError("Unsupported granularity")
+            parent = self.get_level(PARENT_LEVEL[level])
+            keys = self._period_keys(parent["start"], level)
+            starts = _run_starts(keys)
+            statistics = _reduce(parent, starts)
+            statistics["start"] = self._period_start(keys[starts], level)
+            self._levels[level] = statistics
+        return self._levels[level]
+
+    def aggregate(self, level, funcs=("mean",)):
+        """
+        Aggregates of the variables per period.
+
+        :return: (DataFrame) "time" (period start) then one column per variable for a single
+            function, "<variable>_<function>" for several functions.
+        """
+        statistics = self.get_level(level)
+        return self._to_frame(self._from_wall_time(statistics["start"]), statistics, funcs)
+
+    def profile(self, key, funcs=("mean",)):
+        """
+        Aggregates of the variables per calendar code of the periods: hour of the day ("hour"),
+        weekday ("wday"), ISO week ("week"), month ("month") or year ("year").
+
+        :return: (DataFrame) "time" (calendar code) then the aggregated columns.
+        """
+        if key not in PROFILE_LEVEL:
+            raise ValueError("Unsupported granularity")
+        if key not in self._profiles:
+            statistics = self.get_level(PROFILE_LEVEL[key])
+            codes = self._calendar_codes(statistics["start"], key)
+
+            order = np.argsort(codes, kind="stable")
+            starts = _run_starts(codes[order])
+            grouped = _reduce({name: statistics[name][order] for name in _STATISTICS}, starts)
+            grouped["start"] = codes[order][starts].astype(np.int64)
+            self._profiles[key] = grouped
+        grouped = self._profiles[key]
+        return self._to_frame(grouped["start"], grouped, funcs)
+
+    def _to_frame(self, time, statistics, funcs):
+        columns = {"time": time}
+        for func in funcs:
+            values = self._compute(statistics, func)
+            for i, var in enumerate(self.variables):
+                columns[var if len(funcs) == 1 else f"{var}_{func}"] = values[:, i]
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def _compute(statistics, func):
+        count, total = statistics["count"], statistics["sum"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if func == "mean":
+                return np.where(count > 0, total / count, np.nan)
+            if func in ("var", "std"):
+                var = (statistics["sumsq"] - total**2 / count) / (count - 1)
+                var = np.where(count > 1, np.maximum(var, 0.0), np.nan)
+                return var if func == "var" else np.sqrt(var)
+        if func in ("sum", "min", "max"):
+            return statistics[func]
+        if func == "count":
+            return count.astype(np.int64)
+        raise ValueError(f"Unsupported aggregation function: {func}")
+
+    def _to_wall_time(self, utc):
+        if self.tz is None:
+            return utc
+        return pd.DatetimeIndex(utc).tz_localize("UTC").tz_convert(self.tz).tz_localize(None).asi8
+
+    def _from_wall_time(self, wall):
+        index = pd.DatetimeIndex(wall.astype("datetime64[ns]"))
+        if self.tz is None:
+            return index
+        return index.tz_localize(self.tz, ambiguous=True, nonexistent="shift_forward")
+
+    @staticmethod
+    def _period_keys(wall, level):
+        days = wall // NS_PER_DAY
+        if level == "day":
+            return days
+        if level == "week":
+            # Monday-starting weeks, 1970-01-01 being a Thursday
+            return (days + 3) // 7
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        if level == "month":
+            return months
+        return months // 12
+
+    @staticmethod
+    def _period_start(keys, level):
+        if level == "day":
+            days = keys
+        elif level == "week":
+            days = keys * 7 - 3
+        elif level == "month":
+            days = keys.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+        else:
+            days = keys.astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+        return days * NS_PER_DAY
+
+    @staticmethod
+    def _calendar_codes(wall, key):
+        days = wall // NS_PER_DAY
+        if key == "hour":
+            return (wall - days * NS_PER_DAY) // NS_PER_HOUR
+        if key == "wday":
+            return (days + 3) % 7
+        if key == "week":
+            return pd.DatetimeIndex(days.astype("datetime64[D]")).isocalendar().week.to_numpy()
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        if key == "month":
+            return months % 12 + 1
+        return months // 12 + 1970
@@ -0,0 +1,283 @@
+import importlib
+import json
+import os
+import threading
+
+import numpy as np
+
+FORMAT_NAME = "corrclim-model"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def get_class_path(cls):
+    """
+    Return the importable path of a class or function, as "module:qualname".
+    """
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def get_import_path(obj):
+    """
+    Return the "module:qualname" path of a class or function to be imported back on load.
+    Lambdas and classes or functions defined inside a function cannot be.
+    """
+    path = get_class_path(obj)
+    if "<" in path:
+        raise ValueError(
+            f"{path} cannot be imported back on load, please define it at module level to save it "
+            "in compact format."
+        )
+    return path
+
+
+def import_from_path(path):
+    """
+    Import a class or function from a "module:qualname" path.
+    """
+    module_name, _, qualname = path.partition(":")
+    obj = importlib.import_module(module_name)
+    for attribute in qualname.split("."):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def save_state(obj, path):
+    """
+    Save the fitted state of a corrclim object in the compact model format.
+
+    The model is written as a directory holding a JSON manifest (classes, parameters and formula
+    metadata) and one NPY file per numeric payload, so that arrays can be memory-mapped on load.
+
+    Objects referred to several times (e.g. a model shared by two models) are saved once and
+    loaded back as a single object.
+
+    :param obj: Object implementing `get_state()` (models, smoothers, operators, correctors).
+    :param path: (str) Directory where the model is written.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    tree, arrays = encode_state(obj)
+
+    for key, array in arrays.items():
+        # Replaced rather than overwritten: a model loaded from this directory may still map the
+        # previous file
+        tmp_path = os.path.join(path, f"{key}.npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(tmp_path, os.path.join(path, f"{key}.npy"))
+
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, "object": tree}
+    tmp_path = os.path.join(path, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    # The manifest is written last and atomically: a directory is a valid model once it exists
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+    # Payloads of a model previously saved in the directory
+    for entry in os.scandir(path):
+        if entry.name.endswith(".npy") and entry.name[: -len(".npy")] not in arrays:
+            os.remove(entry.path)
+
+
+def encode_state(obj):
+    """
+    Encode the state of an object as a JSON-serializable tree and the arrays it refers to.
+
+    :return: (tree, arrays)
+    """
+    arrays = {}
+    tree = _encode_object(obj, "", arrays, {})
+    return tree, arrays
+
+
+def read_manifest(path):
+    """
+    Read and validate the manifest of a model saved with `save_state`.
+
+    :param path: (str) Model directory.
+    :return: (dict) The manifest.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No corrclim model found in {path}")
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a corrclim model")
+    if manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(
+            f"Model format version {manifest['version']} is not supported "
+            f"(latest supported: {FORMAT_VERSION}). Please upgrade corrclim."
+        )
+    return manifest
+
+
+def load_state(path, mmap_mode="r"):
+    """
+    Load an object saved with `save_state`.
+
+    :param path: (str) Model directory.
+    :param mmap_mode: Memory-map mode passed to `numpy.load`. Use None to read arrays in memory.
+    :return: The rebuilt object.
+    """
+    manifest = read_manifest(path)
+
+    def load_array(key):
+        return np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+
+    return _decode_object(manifest["object"], load_array, {})
+
+
+def _encode_array(array, key):
+    array = np.asarray(array)
+    if array.dtype == object:
+        # e.g. an index of Python ints or strings: saved with the dtype of its values
+        array = np.array(array.tolist())
+        if array.dtype == object:
+            raise ValueError(f"Array '{key}' of Python objects cannot be saved in compact format.")
+    return array
+
+
+def _encode_object(obj, prefix, arrays, encoded):
+    if not hasattr(obj, "get_state"):
+        raise ValueError(f"Object of type {type(obj).__name__} cannot be saved in compact format.")
+
+    # Objects already saved are referred to by the prefix of their first occurrence
+    if id(obj) in encoded:
+        _, tree, first_prefix = encoded[id(obj)]
+        tree["ref"] = first_prefix
+        return {"__ref__": first_prefix}
+
+    tree = {"class": get_import_path(type(obj))}
+    # The object is kept alive so that its id is not reused while encoding
+    encoded[id(obj)] = (obj, tree, prefix)
+
+    params, obj_arrays = obj.get_state()
+
+    array_keys = {}
+    for name, array in obj_arrays.items():
+        key = f"{prefix}{name}"
+        arrays[key] = _encode_array(array, key)
+        array_keys[name] = key
+
+    tree["params"] = _encode_value(params, prefix, arrays, encoded)
+    tree["arrays"] = array_keys
+    return tree
+
+
+def _encode_value(value, prefix, arrays, encoded):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {
+            str(key): _encode_value(item, f"{prefix}{key}.", arrays, encoded)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [
+            _encode_value(item, f"{prefix}{i}.", arrays, encoded) for i, item in enumerate(value)
+        ]
+    if isinstance(value, type) or callable(value) and not hasattr(value, "get_state"):
+        return {"__import__": get_import_path(value)}
+    if hasattr(value, "get_state"):
+        tree = _encode_object(value, prefix, arrays, encoded)
+        return tree if "__ref__" in tree else {"__object__": tree}
+    raise ValueError(f"Value of type {type(value).__name__} cannot be saved in compact format.")
+
+
+def _decode_object(tree, load_array, decoded):
+    cls = import_from_path(tree["class"])
+    params = _decode_value(tree["params"], load_array, decoded)
+    arrays = {name: load_array(key) for name, key in tree["arrays"].items()}
+    obj = cls.from_state(params, arrays)
+    if "ref" in tree:
+        decoded[tree["ref"]] = obj
+    return obj
+
+
+def _decode_value(value, load_array, decoded):
+    if isinstance(value, dict):
+        if "__object__" in value:
+            return _decode_object(value["__object__"], load_array, decoded)
+        if "__ref__" in value:
+            return decoded[value["__ref__"]]
+        if "__import__" in value:
+            return import_from_path(value["__import__"])
+        return {key: _decode_value(item, load_array, decoded) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item, load_array, decoded) for item in value]
+    return value
+
+
+class ModelRegistry:
+    """
+    Directory of fitted models saved in the compact format, opened lazily.
+
+    Listing the registry only scans directory names, and a model is rebuilt (with memory-mapped
+    arrays) on first access only, then kept in cache.
+    """
+
+    def __init__(self, root, mmap_mode="r"):
+        """
+        :param root: (str) Directory holding one sub-directory per model.
+        :param mmap_mode: Memory-map mode used to load the model arrays.
+        """
+        self.root = root
+        self.mmap_mode = mmap_mode
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def keys(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            entry.name
+            for entry in os.scandir(self.root)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, MANIFEST_FILE))
+        )
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.root, name, MANIFEST_FILE))
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._cache:
+                if name not in self:
+                    raise KeyError(name)
+                self._cache[name] = load_state(os.path.join(self.root, name), self.mmap_mode)
+            return self._cache[name]
+
+    def get_manifest(self, name):
+        """
+        Read the manifest of a model without loading it.
+        """
+        return read_manifest(os.path.join(self.root, name))
+
+    def save(self, name, obj):
+        """
+        Save an object in the registry under `name`, replacing any cached version.
+        """
+        save_state(obj, os.path.join(self.root, name))
+        with self._lock:
+            self._cache.pop(name, None)
+
+    def evict(self, name=None):
+        """
+        Drop a model (or all models if `name` is None) from the in-memory cache.
+        """
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
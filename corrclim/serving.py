@@ -0,0 +1,136 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from corrclim._lazy import lazy_import
+
+logger = lazy_import("loguru", "logger")
+
+_STOP = object()
+
+
+class ScoringServer:
+    """
+    In-process scoring service of a fitted ClimaticCorrector, for long-lived processes handling
+    concurrent requests.
+
+    Requests submitted from any thread are queued, and a worker thread coalesces them into
+    batches corrected with `ClimaticCorrector.apply_batch`, so that the models are evaluated
+    once per batch rather than once per request. A batch is closed when it holds
+    `max_batch_size` requests, or `max_wait` seconds after its first request was taken.
+    If a batch fails, its requests are corrected one by one, so that an invalid request only
+    fails its own future.
+    """
+
+    def __init__(self, corrector, max_batch_size=32, max_wait=0.005):
+        """
+        :param corrector: (ClimaticCorrector) Fitted corrector, not modified while serving.
+        :param max_batch_size: (int) Maximum number of requests corrected at once.
+        :param max_wait: (float) Maximum time, in seconds, a request waits for others to join
+            its batch.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_wait < 0:
+            raise ValueError("max_wait must be positive")
+        self.corrector = corrector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.n_requests = 0
+        self.n_batches = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="corrclim-scoring", daemon=True
+                )
+                self._worker.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server once the requests already submitted are corrected.
+        """
+        with self._lock:
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._queue.put(_STOP)
+        if worker is not None:
+            worker.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, timeseries, weather_observed, weather_target):
+        """
+        Submit a correction request.
+
+        :return: (Future) Resolved with the climate-corrected TimeseriesDT.
+        """
+        future = Future()
+        with self._lock:
+            if self._worker is None:
+                raise ValueError("The scoring server is not running, call start() first.")
+            self._queue.put((future, (timeseries, weather_observed, weather_target)))
+        return future
+
+    def apply(self, timeseries, weather_observed, weather_target, timeout=None):
+        """
+        Correct a request, waiting for its batch to be processed.
+        """
+        return self.submit(timeseries, weather_observed, weather_target).result(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while batch[-1] is not _STOP and len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline, only requests already queued join the batch
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            requests = [request for request in batch if request is not _STOP]
+            # Cancelled requests are dropped
+            requests = [(f, request) for f, request in requests if f.set_running_or_notify_cancel()]
+            if requests:
+                self._process(requests)
+            if stop:
+                return
+
+    def _process(self, requests):
+        self.n_requests += len(requests)
+        self.n_batches += 1
+        try:
+            results = self.corrector.apply_batch([request for _, request in requests])
+        except Exception:
+            logger.exception(f"Batch of {len(requests)} requests failed, retrying one by one")
+            results = None
+
+        for i, (future, request) in enumerate(requests):
+            if results is not None:
+                future.set_result(results[i])
+                continue
+            try:
+                future.set_result(self.corrector.apply(*request))
+            except Exception as e:
+                # Only this request fails: the error is raised by its future
+                logger.exception("Request failed")
+                future.set_exception(e)
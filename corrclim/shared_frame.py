@@ -0,0 +1,101 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from corrclim._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+_ALIGNMENT = 64
+
+
+class SharedFrame:
+    """
+    DataFrame whose columns are held in a shared memory block, to be read by worker processes
+    without copying nor pickling the data.
+
+    The creating process owns the block and releases it with `unlink` (or by using the object as
+    a context manager). Pickling a SharedFrame only sends the layout of the columns: worker
+    processes then `attach` it to get a read-only DataFrame on the shared block.
+    """
+
+    def __init__(self, data):
+        """
+        :param data: (DataFrame) Data to share. Numeric, boolean and datetime columns are shared,
+            other columns are pickled with the layout.
+        """
+        self.columns = []
+        self.objects = {}
+        arrays = []
+        size = 0
+        for name in data.columns:
+            column = data[name]
+            meta = {"name": name, "dtype": str(column.dtype)}
+            if pd.api.types.is_datetime64_any_dtype(column):
+                tz = getattr(column.dtype, "tz", None)
+                meta["tz"] = str(tz) if tz is not None else None
+                values = pd.DatetimeIndex(column).as_unit("ns").asi8
+            elif pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+                values = column.to_numpy()
+            else:
+                self.objects[name] = column.to_numpy()
+                self.columns.append(meta)
+                continue
+            meta["offset"], meta["array_dtype"] = size, values.dtype.str
+            size += -(-values.nbytes // _ALIGNMENT) * _ALIGNMENT
+            self.columns.append(meta)
+            arrays.append((meta, values))
+
+        self.length = len(data)
+        self._shm = SharedMemory(create=True, size=max(size, 1))
+        self.name = self._shm.name
+        for meta, values in arrays:
+            self._view(self._shm, meta)[:] = values
+
+    def _view(self, shm, meta):
+        return np.ndarray(
+            self.length, dtype=meta["array_dtype"], buffer=shm.buf, offset=meta["offset"]
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shm"] = None
+        return state
+
+    def attach(self):
+        """
+        Read-only DataFrame on the shared block. The block stays mapped as long as this object
+        is alive.
+        """
+        if self._shm is None:
+            self._shm = SharedMemory(name=self.name)
+
+        columns = {}
+        for meta in self.columns:
+            name = meta["name"]
+            if name in self.objects:
+                columns[name] = self.objects[name]
+                continue
+            values = self._view(self._shm, meta)
+            values.flags.writeable = False
+            if "tz" in meta:
+                time = pd.to_datetime(values, unit="ns", utc=meta["tz"] is not None)
+                if meta["tz"] is not None:
+                    time = time.tz_convert(meta["tz"])
+                dtype = pd.api.types.pandas_dtype(meta["dtype"])
+                values = time.as_unit(getattr(dtype, "unit", None) or np.datetime_data(dtype)[0])
+            columns[name] = values
+        return pd.DataFrame(columns, copy=False)
+
+    def unlink(self):
+        """
+        Release the shared block (creating process only).
+        """
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
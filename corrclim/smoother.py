@@ -1,19 +1,38 @@
-from typing import Callable, Optional
+from __future__ import annotations
 
-import pandas as pd
-from loguru import logger
-from scipy.optimize import minimize
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import ParameterGrid
+from typing import Callable
+
+import numpy as np
+
+from corrclim import serialization
+from corrclim._lazy import lazy_import
+from corrclim.calendar import get_calendar_index
+
+pd = lazy_import("pandas")
+logger = lazy_import("loguru", "logger")
+
+
+def _default_score():
+    from sklearn.metrics import mean_squared_error
+
+    return mean_squared_error
 
 
 class Smoother:
-    def __init__(self, time_column: str = "time", value_column: str = None):
+    """
+    Base class of smoothers. Smoothing leaves both its input and the fitted smoother unchanged,
+    so that a fitted smoother can be shared by threads.
+    """
+
+    _state_attributes = ("time_column", "value_column", "status")
+    stateless = False  # Whether chunks of a timeseries can be smoothed independently
+
+    def __init__(self, time_column: str = "time", value_column: str | list[str] | None = None):
         self.time_column = time_column
         self.value_column = value_column
         self.status = 0
 
-    def fit(self, timeseries: pd.DataFrame, y: Optional[pd.DataFrame] = None):
+    def fit(self, timeseries: pd.DataFrame, y: pd.DataFrame | None = None):
         raise NotImplementedError("fit method must be implemented")
 
     def smooth(self, timeseries: pd.DataFrame):
@@ -21,10 +40,31 @@ class Smoother:
             raise ValueError("Please fit the smoother before applying it.")
         return self.smooth_fun(timeseries)
 
-    def fit_smooth(self, timeseries: pd.DataFrame, y: Optional[pd.DataFrame] = None):
+    def fit_smooth(self, timeseries: pd.DataFrame, y: pd.DataFrame | None = None):
         self.fit(timeseries, y)
         return self.smooth(timeseries)
 
+    def smooth_chunk(self, timeseries: pd.DataFrame, state=None):
+        """
+        Smooth a chunk of a longer timeseries, continuing from the state left by the previous
+        chunk. Smoothing consecutive chunks gives the same result as smoothing their
+        concatenation.
+
+        :param timeseries: Chunk following the previous one in time.
+        :param state: State returned by the previous call, None for the first chunk.
+        :return: Tuple (smoothed chunk, state).
+        """
+        if self.status < 1:
+            raise ValueError("Please fit the smoother before applying it.")
+        return self.smooth_chunk_fun(timeseries, state)
+
+    def smooth_chunk_fun(self, timeseries: pd.DataFrame, state=None):
+        if not self.stateless:
+            raise NotImplementedError(
+                f"{type(self).__name__} does not support smoothing by chunks."
+            )
+        return self.smooth_fun(timeseries), None
+
     def export(self, path: str):
         if not path.endswith(".pkl"):
             raise ValueError("File path should have extension .pkl")
@@ -32,8 +72,45 @@ class Smoother:
 
         joblib.dump(self, path)
 
+    def save(self, path: str):
+        """
+        Save the smoother in the compact model format.
+
+        :param path: (str) Directory where the smoother is written.
+        """
+        serialization.save_state(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode="r"):
+        smoother = serialization.load_state(path, mmap_mode)
+        if not isinstance(smoother, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return smoother
+
+    def get_state(self):
+        """
+        Return the smoother parameters as a tuple (params, arrays).
+        """
+        return {name: getattr(self, name, None) for name in self._state_attributes}, {}
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        smoother = cls.__new__(cls)
+        for name, value in params.items():
+            setattr(smoother, name, value)
+        return smoother
+
 
 class ExponentialSmoother(Smoother):
+    """
+    Exponential smoothing, either of consecutive steps ("step", smoothing factor `alpha`) or of
+    each time of day across days ("days", span of `N` days): the value at 08:00 is then smoothed
+    with the values at 08:00 of the previous days. In "days" mode, `value_column` may be a list
+    of columns, smoothed at once.
+    """
+
+    _state_attributes = Smoother._state_attributes + ("alpha", "N", "granularity")
+
     def __init__(self, alpha=0.2, N=20, granularity="step", **kwargs):
         super().__init__(**kwargs)
         if not (0 <= alpha <= 1):
@@ -44,28 +121,81 @@ class ExponentialSmoother(Smoother):
         self.N = N
         self.granularity = granularity
 
-    def fit(self, timeseries: pd.DataFrame, y: Optional[pd.DataFrame] = None):
-        self.value_column = timeseries.columns[1]  # Assuming the second column is the value column
+    def fit(self, timeseries: pd.DataFrame, y: pd.DataFrame | None = None):
+        if self.value_column is None:
+            # Assuming the second column is the value column
+            self.value_column = timeseries.columns[1]
         self.status = 1
 
     def smooth_fun(self, timeseries: pd.DataFrame):
         if self.granularity == "step":
-            timeseries[self.value_column] = (
-                timeseries[self.value_column].ewm(span=1 / self.alpha, adjust=False).mean()
-            )
-        elif self.granularity == "days":
-            # Assuming timeseries has a 'time' column in datetime format
-            timeseries["day"] = timeseries[self.time_column].dt.date
-            timeseries["shifted"] = timeseries.groupby("day")[self.value_column].shift(1)
-            timeseries["shifted"].fillna(timeseries[self.value_column], inplace=True)
-            timeseries["smoothed"] = (
-                timeseries[self.value_column].ewm(span=self.N, adjust=False).mean()
-            )
-        return timeseries
+            return self._smooth_steps(timeseries, None)[0]
+        return self._smooth_days(timeseries, None)[0]
+
+    def smooth_chunk_fun(self, timeseries: pd.DataFrame, state=None):
+        if self.granularity == "step":
+            return self._smooth_steps(timeseries, state)
+        return self._smooth_days(timeseries, state)
+
+    def _smooth_steps(self, timeseries, state):
+        values = timeseries[self.value_column]
+        if state is not None:
+            # The last smoothed value starts the recursion, as if the chunks were contiguous
+            values = pd.concat([pd.Series([state]), values], ignore_index=True)
+
+        smoothed = values.ewm(span=1 / self.alpha, adjust=False).mean().to_numpy()
+        if state is not None:
+            smoothed = smoothed[1:]
+
+        timeseries = timeseries.copy()
+        timeseries[self.value_column] = smoothed
+        return timeseries, smoothed[-1] if len(smoothed) else state
+
+    def _smooth_days(self, timeseries, state):
+        columns = (
+            [self.value_column] if isinstance(self.value_column, str) else list(self.value_column)
+        )
+        if not len(timeseries):
+            return timeseries.copy(), state
+
+        # Rows are laid out on a (days x times of day) grid, one grid per column side by side, so
+        # that the recursion from one day to the next runs on every time of day and column at once
+        calendar = get_calendar_index(timeseries[self.time_column])
+        slots, row_slot = np.unique(calendar.time_of_day, return_inverse=True)
+        row_slot = row_slot.ravel()
+        row_day = calendar.day.astype(np.int64)
+
+        n_previous = 0
+        if state is not None:
+            # The last smoothed values of each time of day start the recursion
+            n_previous = 1
+            previous_slots, previous = state
+            slots = np.union1d(previous_slots, slots)
+            row_slot = np.searchsorted(slots, calendar.time_of_day)
+
+        n_slots, n_columns = len(slots), len(columns)
+        grid = np.full((n_previous + len(calendar.days), n_slots, n_columns), np.nan)
+        if n_previous:
+            grid[0, np.searchsorted(slots, previous_slots)] = previous
+        grid[n_previous + row_day, row_slot] = timeseries[columns].to_numpy(dtype=float)
+
+        smoothed = (
+            pd.DataFrame(grid.reshape(len(grid), -1))
+            .ewm(span=self.N, adjust=False, ignore_na=True)
+            .mean()
+            .to_numpy()
+            .reshape(grid.shape)
+        )
+
+        timeseries = timeseries.copy()
+        timeseries[columns] = smoothed[n_previous + row_day, row_slot]
+        return timeseries, (slots, smoothed[-1])
 
 
 class DummySmoother(Smoother):
-    def fit(self, timeseries: pd.DataFrame, y: Optional[pd.DataFrame] = None):
+    stateless = True
+
+    def fit(self, timeseries: pd.DataFrame, y: pd.DataFrame | None = None):
         pass
 
     def smooth_fun(self, timeseries: pd.DataFrame):
@@ -73,17 +203,27 @@ class DummySmoother(Smoother):
 
 
 class GridSearchSmoother(Smoother):
+    _state_attributes = Smoother._state_attributes + (
+        "grid",
+        "smoother_class",
+        "score",
+        "best_params",
+        "best_smoother",
+    )
+
     def __init__(
-        self, grid: dict, smoother_class: Smoother, score: Callable = mean_squared_error, **kwargs
+        self, grid: dict, smoother_class: Smoother, score: Callable | None = None, **kwargs
     ):
         super().__init__(**kwargs)
         self.grid = grid
         self.smoother_class = smoother_class
-        self.score = score
+        self.score = score if score is not None else _default_score()
         self.best_params = None
         self.best_smoother = None
 
     def fit(self, timeseries: pd.DataFrame, y: pd.DataFrame):
+        from sklearn.model_selection import ParameterGrid
+
         best_score = float("inf")
         param_combinations = list(ParameterGrid(self.grid))
         for params in param_combinations:
@@ -101,13 +241,28 @@ class GridSearchSmoother(Smoother):
             raise ValueError("Smoother is not fitted yet.")
         return self.best_smoother.smooth(timeseries)
 
+    def smooth_chunk_fun(self, timeseries: pd.DataFrame, state=None):
+        if not self.best_smoother:
+            raise ValueError("Smoother is not fitted yet.")
+        return self.best_smoother.smooth_chunk(timeseries, state)
+
 
 class BayesianSmoother(Smoother):
+    _state_attributes = Smoother._state_attributes + (
+        "bounds",
+        "smoother_class",
+        "score",
+        "n_iter",
+        "init_points",
+        "best_params",
+        "best_smoother",
+    )
+
     def __init__(
         self,
         bounds: dict,
         smoother_class: Smoother,
-        score: Callable = mean_squared_error,
+        score: Callable | None = None,
         n_iter=20,
         init_points=5,
         **kwargs,
@@ -115,13 +270,15 @@ class BayesianSmoother(Smoother):
         super().__init__(**kwargs)
         self.bounds = bounds
         self.smoother_class = smoother_class
-        self.score = score
+        self.score = score if score is not None else _default_score()
         self.n_iter = n_iter
         self.init_points = init_points
         self.best_params = None
         self.best_smoother = None
 
     def fit(self, timeseries: pd.DataFrame, y: pd.DataFrame):
+        from scipy.optimize import minimize
+
         def objective(**params):
             smoother = self.smoother_class(**params)
             smoother.fit(timeseries, y)
@@ -138,8 +295,15 @@ class BayesianSmoother(Smoother):
             raise ValueError("Smoother is not fitted yet.")
         return self.best_smoother.smooth(timeseries)
 
+    def smooth_chunk_fun(self, timeseries: pd.DataFrame, state=None):
+        if not self.best_smoother:
+            raise ValueError("Smoother is not fitted yet.")
+        return self.best_smoother.smooth_chunk(timeseries, state)
+
 
 class MultiSmoother(Smoother):
+    _state_attributes = ("smoothers", "variables", "status")
+
     def __init__(self, smoothers, variables):
         """
         Initialize the MultiSmoother class.
@@ -161,9 +325,14 @@ class MultiSmoother(Smoother):
                 "Provide a Smoother for each variable, in the correct order."
             )
 
+        super().__init__()
         self.smoothers = smoothers
         self.variables = variables
 
+    def fit(self, timeseries, y=None):
+        self.fit_fun(timeseries, y)
+        self.status = 1
+
     def fit_fun(self, timeseries, y):
         """
         Fit the smoothers to the timeseries.
@@ -192,10 +361,27 @@ class MultiSmoother(Smoother):
             X = timeseries[["time", self.variables[i]]]
             smoothed_data = smoother.smooth(X)
 
-            smoothed_timeseries[self.variables[i]] = smoothed_data
+            smoothed_timeseries[self.variables[i]] = smoothed_data[self.variables[i]].to_numpy()
 
         return smoothed_timeseries
 
+    def smooth_chunk_fun(self, timeseries, state=None):
+        """
+        Smooth a chunk of the timeseries, with one state per smoother.
+        """
+        state = state or [None] * len(self.smoothers)
+        smoothed_timeseries = timeseries.copy()
+
+        new_state = []
+        for i, smoother in enumerate(self.smoothers):
+            X = timeseries[["time", self.variables[i]]]
+            smoothed_data, smoother_state = smoother.smooth_chunk(X, state[i])
+
+            smoothed_timeseries[self.variables[i]] = smoothed_data[self.variables[i]].to_numpy()
+            new_state.append(smoother_state)
+
+        return smoothed_timeseries, new_state
+
     def get_smoothers(self):
         """
         Get the list of smoothers.
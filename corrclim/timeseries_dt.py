@@ -1,22 +1,198 @@
 import pickle
+import threading
+from collections import Counter
+from contextlib import contextmanager
 
 import numpy as np
-import pandas as pd
+
+from corrclim._lazy import lazy_import
+from corrclim.calendar import get_calendar_index, group_offsets
+from corrclim.degree_days import degree_days_bank, search_threshold, search_thresholds_pair
+from corrclim.lags import LagFeatures
+from corrclim.rollup import RollupPyramid, get_function_name
+
+pd = lazy_import("pandas")
+
+
+_validation_counters = []
+_validation_lock = threading.Lock()
+
+
+def _count_validation(kind):
+    if _validation_counters:
+        with _validation_lock:
+            for counts in _validation_counters:
+                counts[kind] += 1
+
+
+@contextmanager
+def count_validations():
+    """
+    Count the validation work done by TimeseriesDT while the context is active (in any thread):
+
+    - "normalized": raw data normalized (time column renamed, parsed and localized, rows sorted),
+    - "schema": schema markers computed from already normalized data,
+    - "reused": TimeseriesDT wrapping validated data, without copy nor validation.
+
+    :return: (Counter) The counts, updated until the context exits.
+    """
+    counts = Counter()
+    with _validation_lock:
+        _validation_counters.append(counts)
+    try:
+        yield counts
+    finally:
+        with _validation_lock:
+            _validation_counters.remove(counts)
+
+
+def _time_buffer(timeseries):
+    # Identity of the memory holding the time column: frames sharing it (shallow copies, frames
+    # with columns added or dropped) have the same timestamps
+    if timeseries is None or "time" not in timeseries.columns:
+        return None
+    values = timeseries["time"].values
+    return (values.__array_interface__["data"][0], values.shape, values.strides, values.dtype)
+
+
+class TimeSchema:
+    """
+    Validated-schema marker of the time column of a TimeseriesDT: dtype, timezone, sort state and
+    time step. Computed once for some data, it travels with it: every TimeseriesDT holding the
+    same time column (wrapping it again, adding or dropping columns) shares the marker, and is
+    neither copied nor validated again.
+    """
+
+    def __init__(self, dtype, timezone, is_sorted, is_unique, step, buffer=None):
+        """
+        :param dtype: dtype of the time column.
+        :param timezone: (str) Timezone of timezone-aware times, None for naive times.
+        :param is_sorted: (bool) Whether timestamps are in increasing order.
+        :param is_unique: (bool) Whether timestamps are unique.
+        :param step: (int) Time step in nanoseconds if the timeseries is regular, None otherwise.
+        :param buffer: Identity of the memory of the time column the schema was computed on.
+        """
+        self.dtype = dtype
+        self.timezone = timezone
+        self.is_sorted = is_sorted
+        self.is_unique = is_unique
+        self.step = step
+        self.buffer = buffer
+
+    @classmethod
+    def from_timeseries(cls, timeseries):
+        """
+        Compute the schema of the time column of a DataFrame, in a single pass over its values.
+        """
+        time = timeseries["time"]
+        values = pd.DatetimeIndex(time).as_unit("ns").asi8
+        steps = np.diff(values)
+        is_sorted = bool(np.all(steps >= 0))
+        if is_sorted:
+            is_unique = bool(np.all(steps > 0))
+        else:
+            is_unique = len(np.unique(values)) == len(values)
+
+        step = None
+        if len(steps) and is_unique:
+            step = int(steps[0]) if np.all(steps == steps[0]) else None
+        tz = getattr(time.dtype, "tz", None)
+        timezone = str(tz) if tz is not None else None
+        return cls(time.dtype, timezone, is_sorted, is_unique, step, _time_buffer(timeseries))
+
+    def describes(self, timeseries):
+        """
+        Whether the schema holds for a DataFrame, i.e. it has the very same time column: O(1).
+        """
+        return self.buffer is not None and self.buffer == _time_buffer(timeseries)
+
+    def __repr__(self):
+        return (
+            f"TimeSchema(dtype={self.dtype}, timezone={self.timezone}, "
+            f"is_sorted={self.is_sorted}, is_unique={self.is_unique}, step={self.step})"
+        )
+
+
+def merge_join(left, right):
+    """
+    Linear merge-join of two sorted arrays of unique int64 timestamps.
+
+    :return: (left_idx, right_idx), positions of the common timestamps in each array.
+    """
+    values = np.concatenate([left, right])
+    # Stable sort of two sorted runs is a linear merge (timsort); equal timestamps end up
+    # adjacent, the left one first
+    order = np.argsort(values, kind="stable")
+    equal = values[order[1:]] == values[order[:-1]]
+    return order[:-1][equal], order[1:][equal] - len(left)
+
+
+def group_quantiles(codes, values, n_groups, probabilities):
+    """
+    Quantiles of values per group in one sort-based pass, linearly interpolated as pandas and
+    numpy do by default.
+
+    :param codes: (array n of int) Group of each value, in [0, n_groups).
+    :param values: (array n) Values, without NaN.
+    :param n_groups: (int) Number of groups.
+    :param probabilities: (list of float) Probabilities of the quantiles.
+    :return: (array n_groups x k) Quantiles, NaN for empty groups.
+    """
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+
+    quantiles = np.full((n_groups, len(probabilities)), np.nan)
+    filled = counts > 0
+    for j, q in enumerate(probabilities):
+        position = (counts[filled] - 1) * q
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, counts[filled] - 1)
+        low = sorted_values[starts[filled] + below]
+        high = sorted_values[starts[filled] + above]
+        t = position - below
+        # Same rounding as numpy's interpolation
+        quantiles[filled, j] = np.where(
+            t >= 0.5, high - (high - low) * (1 - t), low + (high - low) * t
+        )
+    return quantiles
 
 
 class TimeseriesDT:
+    """
+    Timeseries held in a DataFrame with a "time" column, normalized (parsed, localized and
+    sorted) once.
+
+    Wrapping a TimeseriesDT again (`TimeseriesDT(X)`) neither copies nor validates the data: both
+    wrappers share the column buffers and the schema marker. Methods never write into a frame
+    they did not create, so columns added or replaced on one wrapper (`assign`, `merge`,
+    `X.timeseries[name] = ...`) do not appear in the other. Values edited in place through the
+    frame (e.g. `X.timeseries["y"] += 1`) are written to the shared buffers though: without
+    pandas copy-on-write (the default before pandas 3), they show up in every wrapper sharing
+    them. Wrap `X.get_timeseries()` to get an independent copy.
+    """
+
     def __init__(
         self, timeseries, is_output=False, format_date="%Y-%m-%d %H:%M:%S", timezone="UTC"
     ):
         self.format_date = format_date
         self.timezone = timezone
+        # Time step (ns) of the series the rows belong to, kept by the chunks and subsets of
+        # this timeseries, whose own rows may be too few to tell it
+        self.time_step = None
         self.timeseries = None
 
         if isinstance(timeseries, TimeseriesDT):
-            # Handle initialization from an existing TimeseriesDT object
-            self.timeseries = timeseries.get_timeseries()
+            # Already validated: the data is shared rather than copied (columns are replaced,
+            # never written in place) together with its schema marker
+            self._schema = timeseries._schema
+            self.timeseries = timeseries.timeseries.copy(deep=False)
             self.format_date = timeseries.format_date
             self.timezone = timeseries.timezone
+            self.time_step = timeseries.time_step
+            self._calendar = timeseries._calendar
+            _count_validation("reused")
         else:
             try:
                 self.timeseries = pd.DataFrame(timeseries)
@@ -36,12 +212,66 @@ class TimeseriesDT:
             except Exception as e:
                 raise ValueError("Invalid 'time' column in TimeseriesDT") from e
 
+            # Keep the time index sorted: merges and alignments rely on it
+            schema = TimeSchema.from_timeseries(self.timeseries)
+            if not schema.is_sorted:
+                self.timeseries = self.timeseries.sort_values("time", kind="stable").reset_index(
+                    drop=True
+                )
+                schema = TimeSchema.from_timeseries(self.timeseries)
+            self._schema = schema
+            self.time_step = schema.step
+            _count_validation("normalized")
+
         if is_output:
             if len(self.timeseries.columns) > 2:
                 raise ValueError("If output, timeseries should have 2 columns")
             value_column = [col for col in self.timeseries.columns if col.lower() != "time"]
             self.timeseries.rename(columns={value_column[0]: "y"}, inplace=True)
 
+    @property
+    def timeseries(self):
+        # The frame handed out may be edited in place: the cached aggregates are not reused
+        self._version += 1
+        return self._timeseries
+
+    @timeseries.setter
+    def timeseries(self, timeseries):
+        # The schema marker and calendar index are kept as long as the time column is the same
+        schema = self.__dict__.get("_schema")
+        if schema is None or not schema.describes(timeseries):
+            self._schema = None
+            self._calendar = None
+        self._timeseries = timeseries
+        self._version = self.__dict__.get("_version", 0) + 1
+        self._rollup = None
+
+    def __getstate__(self):
+        # The calendar index is found again in the shared cache, or rebuilt, when needed
+        state = self.__dict__.copy()
+        state["_calendar"] = None
+        return state
+
+    def __setstate__(self, state):
+        # TimeseriesDT pickled before `timeseries` became a property
+        if "timeseries" in state:
+            state["_timeseries"] = state.pop("timeseries")
+        state.setdefault("_schema", None)
+        state.setdefault("_rollup", None)
+        state.setdefault("_version", 0)
+        state.setdefault("_calendar", None)
+        state.setdefault("time_step", None)
+        self.__dict__.update(state)
+
+    def _invalidate(self, time=False):
+        # To be called after modifying `self.timeseries` in place: drops the cached aggregates,
+        # and the schema marker if the time column changed
+        self._version += 1
+        self._rollup = None
+        if time:
+            self._schema = None
+            self._calendar = None
+
     def rename_time_column(self, df):
         time_patterns = ["TIME", "DATE"]
         for col in df.columns:
@@ -56,7 +286,7 @@ class TimeseriesDT:
             self.timeseries = dt
             return self
         else:
-            return TimeseriesDT(dt)
+            return self._with_timeseries(dt)
 
     def set_timeseries(self, timeseries):
         self.timeseries = timeseries
@@ -64,6 +294,103 @@ class TimeseriesDT:
     def get_timeseries(self):
         return self.timeseries.copy()
 
+    def get_variables_name(self):
+        return list(self.timeseries.columns)
+
+    def get_time_values(self):
+        """
+        Timestamps as int64 nanoseconds since epoch (UTC for timezone-aware times).
+        """
+        return pd.DatetimeIndex(self.timeseries["time"]).as_unit("ns").asi8
+
+    def get_time_zone(self):
+        """
+        Timezone of the timestamps: the one of the time column if timezone-aware, else the
+        timezone naive wall-clock times were normalized from.
+        """
+        tz = getattr(self.timeseries["time"].dtype, "tz", None)
+        return str(tz) if tz is not None else str(self.timezone)
+
+    def get_step(self):
+        """
+        Time step in nanoseconds if the timeseries is regular, None otherwise.
+        """
+        return self.get_schema().step
+
+    def is_time_sorted(self):
+        """
+        Whether timestamps are sorted and unique.
+        """
+        schema = self.get_schema()
+        return schema.is_sorted and schema.is_unique
+
+    def get_schema(self):
+        """
+        Validated-schema marker of the time column, computed at most once for the same data.
+        """
+        if self._schema is None:
+            self._schema = TimeSchema.from_timeseries(self.timeseries)
+            _count_validation("schema")
+        return self._schema
+
+    def check_time_compatibility(self, other, check_step=True):
+        """
+        Raise a ValueError if two timeseries have different timezones or time steps.
+        """
+        if self.get_time_zone() != other.get_time_zone():
+            raise ValueError(
+                f"Timeseries have different timezones: {self.get_time_zone()} and "
+                f"{other.get_time_zone()}."
+            )
+        if check_step:
+            step, other_step = self.get_step(), other.get_step()
+            if step is not None and other_step is not None and step != other_step:
+                raise ValueError(
+                    f"Timeseries have different time steps: {pd.Timedelta(step)} and "
+                    f"{pd.Timedelta(other_step)}."
+                )
+
+    def align(self, *others):
+        """
+        Align timeseries on the time axis of this one.
+
+        Timeseries already on the same time axis are returned as is. Otherwise their rows are
+        gathered through a merge-join on the sorted timestamps.
+
+        :param others: TimeseriesDT (or data convertible to TimeseriesDT) to align.
+        :return: (tuple of TimeseriesDT) The aligned timeseries, in the same order.
+        """
+        time = self.get_time_values()
+        aligned = []
+        for other in others:
+            if not isinstance(other, TimeseriesDT):
+                other = TimeseriesDT(other)
+            self.check_time_compatibility(other)
+
+            other_time = other.get_time_values()
+            if np.array_equal(time, other_time):
+                aligned.append(other)
+                continue
+
+            if not (self.is_time_sorted() and other.is_time_sorted()):
+                raise ValueError("Timeseries with duplicated timestamps cannot be aligned.")
+            left_idx, right_idx = merge_join(time, other_time)
+            if len(left_idx) != len(time):
+                raise ValueError(
+                    f"{len(time) - len(left_idx)} timestamps are missing to align the timeseries."
+                )
+            aligned.append(
+                other._with_timeseries(other.timeseries.iloc[right_idx].reset_index(drop=True))
+            )
+        return tuple(aligned)
+
+    def _with_timeseries(self, timeseries):
+        # New TimeseriesDT sharing the settings of this one, on already normalized data
+        new = TimeseriesDT.__new__(TimeseriesDT)
+        new.__dict__.update(self.__dict__)
+        new.timeseries = timeseries
+        return new
+
     def set_format_date(self, format_date=None):
         if format_date:
             self.format_date = format_date
@@ -73,12 +400,14 @@ class TimeseriesDT:
             .dt.strftime(self.format_date)
         )
         self.timeseries["time"] = pd.to_datetime(self.timeseries["time"], format=self.format_date)
+        self._invalidate(time=True)
 
     def set_timezone(self, timezone):
         self.timezone = timezone
         self.timeseries["time"] = pd.to_datetime(self.timeseries["time"]).dt.tz_localize(
             self.timezone
         )
+        self._invalidate(time=True)
 
     def sort(self, variable, inplace=True):
         sorted_df = self.timeseries.sort_values(by=variable)
@@ -91,7 +420,7 @@ class TimeseriesDT:
         timeseries = self.timeseries.copy()
 
         if granularity == "hour":
-            timeseries["period_start"] = timeseries["time"].dt.floor("H")
+            timeseries["period_start"] = timeseries["time"].dt.floor("h")
         elif granularity == "day":
             timeseries["period_start"] = timeseries["time"].dt.date
         elif granularity == "week":
@@ -112,73 +441,308 @@ class TimeseriesDT:
         if inplace:
             self.timeseries = timeseries
         else:
-            return TimeseriesDT(timeseries)
+            return self._with_timeseries(timeseries)
+
+    def get_rollup(self):
+        """
+        Rollup pyramid of the numeric variables, built on first use and kept until the timeseries
+        changes.
+
+        The pyramid is kept while the data version is unchanged, in O(1). The version changes
+        when the frame is replaced (inplace methods, `assign`), after `_invalidate`, and when the
+        frame is handed out by `timeseries`, as it may then be edited in place (e.g.
+        `X.timeseries["y"] += 1`).
+        """
+        version = self._version
+        if self._rollup is None or self._rollup[0] != version:
+            timeseries = self._timeseries
+            variables = [
+                var
+                for var in timeseries.columns
+                if var != "time" and pd.api.types.is_numeric_dtype(timeseries[var])
+            ]
+            values = timeseries[variables].to_numpy(float)
+            self._rollup = (version, RollupPyramid(timeseries["time"], values, variables))
+        return self._rollup[1]
+
+    def rollup(self, granularity, funcs=("mean",)):
+        """
+        Aggregate the numeric variables per hour, day, week, month or year, several functions
+        being computed in one pass over the cached rollup statistics.
+
+        :param granularity: (str) "hour", "day", "week", "month" or "year".
+        :param funcs: (list) Functions among "mean", "sum", "count", "min", "max", "std", "var"
+            (or np.mean, np.sum, np.min, np.max, len).
+        :return: (DataFrame) "time" (period start) then one column per variable for a single
+            function, "<variable>_<function>" for several functions.
+        """
+        return self.get_rollup().aggregate(granularity, self._function_names(funcs))
+
+    @staticmethod
+    def _function_names(funcs):
+        names = [get_function_name(func) for func in funcs]
+        if None in names:
+            raise ValueError(f"Unsupported aggregation functions: {funcs}")
+        return tuple(names)
 
     def aggregate(self, granularity, func=np.mean, inplace=True):
-        self.compute_period_start(granularity, inplace=True)
-        aggregated = self.timeseries.groupby("period_start").agg(func).reset_index()
-        aggregated.rename(columns={"period_start": "time"}, inplace=True)
+        if get_function_name(func) is not None:
+            aggregated = self.rollup(granularity, (func,))
+        else:
+            # Period starts are computed on a shallow copy, leaving this timeseries unchanged
+            period = self._with_timeseries(self.timeseries)
+            period.compute_period_start(granularity, inplace=True)
+            timeseries = period.timeseries
+            aggregated = (
+                timeseries.drop(columns="time")
+                .groupby("period_start")
+                .agg(func)
+                .reset_index()
+                .rename(columns={"period_start": "time"})
+            )
 
         if inplace:
             self.timeseries = aggregated
+            self.time_step = None
         else:
-            return TimeseriesDT(aggregated)
+            aggregated = self._with_timeseries(aggregated)
+            aggregated.time_step = None
+            return aggregated
 
     def groupby(self, granularity, func=np.mean):
-        timeseries = self.timeseries.copy()
+        if granularity not in ("hour", "wday", "week", "month", "year"):
+            raise ValueError("Unsupported granularity")
 
-        if granularity == "hour":
-            timeseries["time"] = timeseries["time"].dt.hour
-        elif granularity == "wday":
-            timeseries["time"] = timeseries["time"].dt.weekday
-        elif granularity == "week":
-            timeseries["time"] = timeseries["time"].dt.isocalendar().week
-        elif granularity == "month":
-            timeseries["time"] = timeseries["time"].dt.month
-        elif granularity == "year":
-            timeseries["time"] = timeseries["time"].dt.year
+        name = get_function_name(func)
+        if name is not None:
+            # Profiles are merged from the cached hourly, daily, monthly or yearly statistics
+            return self.get_rollup().profile(granularity, (name,))
+
+        # Rows of each group are contiguous once gathered in the precomputed group order
+        labels, order, offsets = self.get_calendar().get_groups(granularity)
+        data = self.timeseries.drop(columns="time").iloc[order]
+        grouped = pd.DataFrame(
+            [data.iloc[start:end].agg(func) for start, end in zip(offsets[:-1], offsets[1:])],
+            columns=data.columns,
+        )
+        grouped.insert(0, "time", labels.astype(np.int64))
+        return grouped
+
+    def get_groups(self, variable="instant"):
+        """
+        Groups of the rows by the values of a column, rows with a missing value being left out.
+
+        Instants added by `compute_instant` use the groups precomputed once by the calendar
+        index; other columns are grouped with a sort of their values.
+
+        :param variable: (str) Column of the groups.
+        :return: (labels, order, offsets): rows of group labels[g] are
+            order[offsets[g]:offsets[g + 1]], in time order.
+        """
+        codes = self.timeseries[variable].to_numpy()
+        if variable == "instant":
+            calendar = self.get_calendar()
+            for granularity in ("day", "week"):
+                if np.array_equal(codes, calendar.get_instant(granularity)):
+                    return calendar.get_groups(f"instant_{granularity}")
+
+        if codes.dtype.kind in "iub":
+            return group_offsets(codes)
+        rows = np.flatnonzero(pd.notna(codes))
+        labels, order, offsets = group_offsets(codes[rows])
+        return labels, rows[order], offsets
+
+    def get_calendar(self):
+        """
+        Calendar feature index of the time axis, computed once and shared by every TimeseriesDT
+        with the same timestamps and time step.
+
+        The positions within the day use `time_step`, the step of the whole series, so that
+        a chunk of a few rows gets the same instants as in the whole series.
+        """
+        calendar = self._calendar
+        if calendar is None or (self.time_step is not None and calendar.step != self.time_step):
+            # Held here: the shared cache only keeps the indexes still in use
+            calendar = get_calendar_index(self.timeseries["time"], self.time_step)
+            self._calendar = calendar
+        return calendar
+
+    def compute_instant(self, granularity="day", inplace=True):
+        """
+        Add the "instant" column: position of each row within its day ("day") or week ("week").
+        """
+        instant = self.get_calendar().get_instant(granularity or "day")
+        timeseries = self.timeseries.assign(instant=instant)
+
+        if inplace:
+            self.timeseries = timeseries
         else:
-            raise ValueError("Unsupported granularity")
+            return self._with_timeseries(timeseries)
 
-        return timeseries.groupby("time").agg(func).reset_index()
+    def add_calendar(self, inplace=True):
+        """
+        Add the calendar columns used by the models: jour_semaine (weekday), jour_ferie (French
+        public holiday), ponts (bridge day) and posan (position in the year, in [0, 1)).
+        """
+        timeseries = self.timeseries.assign(**self.get_calendar().get_features())
+
+        if inplace:
+            self.timeseries = timeseries
+        else:
+            return self._with_timeseries(timeseries)
 
     def select(self, variables, inplace=True):
         selected = self.timeseries[["time"] + variables]
         if inplace:
             self.timeseries = selected
         else:
-            return TimeseriesDT(selected)
+            return self._with_timeseries(selected)
 
     def remove_duplicated(self, variables=["time"], inplace=True):
         deduplicated = self.timeseries.drop_duplicates(subset=variables)
         if inplace:
             self.timeseries = deduplicated
         else:
-            return TimeseriesDT(deduplicated)
+            return self._with_timeseries(deduplicated)
 
     def assign(self, name, vector, inplace=True):
-        self.timeseries[name] = vector
         if inplace:
-            pass
+            self.timeseries[name] = vector
+            self._invalidate(time=name == "time")
         else:
-            return TimeseriesDT(self.timeseries)
+            timeseries = self.timeseries.copy(deep=False)
+            timeseries[name] = vector
+            return self._with_timeseries(timeseries)
 
     def merge(self, other, by="time", how="inner", suffixes=(".x", ".y"), inplace=True):
-        if isinstance(other, TimeseriesDT):
-            other = other.timeseries
-        merged = pd.merge(self.timeseries, other, on=by, how=how, suffixes=suffixes)
+        """
+        Join the columns of another timeseries, on equal values of `by`.
+
+        Inner and left joins on the time of timeseries with sorted, unique timestamps are
+        merge-joins on the sorted times; other joins fall back to `pandas.merge`. Unlike `align`,
+        time steps are not checked: timestamps are matched exactly, so timeseries of different
+        steps can be merged (e.g. daily values joined to the midnight rows of an hourly series),
+        and a single-row timeseries has no step to compare.
+
+        :param other: TimeseriesDT (or data convertible to TimeseriesDT) to join.
+        :param by: Column(s) to join on.
+        :param how: (str) Type of join, as in `pandas.merge`.
+        :param suffixes: Suffixes of columns present in both timeseries.
+        :param inplace: If True, modify the current instance. Otherwise, return a new instance.
+        """
+        if not isinstance(other, TimeseriesDT):
+            other = TimeseriesDT(other)
+        self.check_time_compatibility(other, check_step=False)
+
+        if (
+            by == "time"
+            and how in ("inner", "left")
+            and self.is_time_sorted()
+            and other.is_time_sorted()
+        ):
+            merged = self._sorted_merge(other, how, suffixes)
+        else:
+            merged = pd.merge(self.timeseries, other.timeseries, on=by, how=how, suffixes=suffixes)
+
+        if inplace:
+            self.timeseries = merged
+        else:
+            return self._with_timeseries(merged)
+
+    def merge_asof(
+        self, other, direction="backward", tolerance=None, suffixes=(".x", ".y"), inplace=True
+    ):
+        """
+        As-of join: match each row with the last (or next, or nearest) row of `other` in time.
+
+        :param other: TimeseriesDT (or data convertible to TimeseriesDT) to join.
+        :param direction: (str) "backward", "forward" or "nearest".
+        :param tolerance: Maximum time distance of a match (e.g. pd.Timedelta("1h")).
+        :param suffixes: Suffixes of columns present in both timeseries.
+        :param inplace: If True, modify the current instance. Otherwise, return a new instance.
+        """
+        if not isinstance(other, TimeseriesDT):
+            other = TimeseriesDT(other)
+        self.check_time_compatibility(other, check_step=False)
+        if direction not in ("backward", "forward", "nearest"):
+            raise ValueError("direction should be 'backward', 'forward' or 'nearest'")
+        if not other.is_time_sorted():
+            raise ValueError("As-of join needs unique timestamps in the joined timeseries.")
+
+        time, other_time = self.get_time_values(), other.get_time_values()
+        backward = np.searchsorted(other_time, time, side="right") - 1
+        forward = np.searchsorted(other_time, time, side="left")
+        if direction == "backward":
+            idx = backward
+        elif direction == "forward":
+            idx = np.where(forward < len(other_time), forward, -1)
+        else:
+            distance_backward = np.where(
+                backward >= 0, time - other_time[np.maximum(backward, 0)], np.iinfo(np.int64).max
+            )
+            distance_forward = np.where(
+                forward < len(other_time),
+                other_time[np.minimum(forward, len(other_time) - 1)] - time,
+                np.iinfo(np.int64).max,
+            )
+            idx = np.where(distance_forward < distance_backward, forward, backward)
+            idx = np.where(idx < len(other_time), idx, -1)
 
+        if tolerance is not None:
+            distance = np.abs(time - other_time[np.clip(idx, 0, max(len(other_time) - 1, 0))])
+            idx = np.where(distance <= pd.Timedelta(tolerance).value, idx, -1)
+
+        merged = self._join_rows(other, np.arange(len(time)), idx, suffixes)
         if inplace:
             self.timeseries = merged
         else:
-            return TimeseriesDT(merged)
+            return self._with_timeseries(merged)
+
+    def _sorted_merge(self, other, how, suffixes):
+        time, other_time = self.get_time_values(), other.get_time_values()
+        if np.array_equal(time, other_time):
+            # Already aligned: no reordering
+            left_idx = right_idx = None
+        else:
+            left_idx, right_idx = merge_join(time, other_time)
+            if how == "left":
+                full_right_idx = np.full(len(time), -1)
+                full_right_idx[left_idx] = right_idx
+                left_idx, right_idx = np.arange(len(time)), full_right_idx
+        return self._join_rows(other, left_idx, right_idx, suffixes)
+
+    def _join_rows(self, other, left_idx, right_idx, suffixes):
+        """
+        Join rows of this timeseries with rows of `other` (-1 for no match, None for all rows).
+        """
+        left = self.timeseries
+        right = other.timeseries.drop(columns="time")
+
+        common = set(left.columns) & set(right.columns)
+        left = left.rename(columns={col: f"{col}{suffixes[0]}" for col in common})
+        right = right.rename(columns={col: f"{col}{suffixes[1]}" for col in common})
+
+        if left_idx is not None:
+            left = left.iloc[left_idx]
+        if right_idx is not None:
+            missing = right_idx < 0
+            if not len(right):
+                return left.reset_index(drop=True).reindex(
+                    columns=list(left.columns) + list(right.columns)
+                )
+            right = right.iloc[np.where(missing, 0, right_idx)]
+            if missing.any():
+                right = right.reset_index(drop=True).where(
+                    np.broadcast_to(~missing[:, None], right.shape)
+                )
+        return pd.concat([left.reset_index(drop=True), right.reset_index(drop=True)], axis=1)
 
     def remove_variables(self, variables, inplace=True):
         filtered = self.timeseries.drop(columns=variables)
         if inplace:
             self.timeseries = filtered
         else:
-            return TimeseriesDT(filtered)
+            return self._with_timeseries(filtered)
 
     def compute_degree_days(
         self,
@@ -201,10 +765,67 @@ class TimeseriesDT:
         if inplace:
             self.timeseries = timeseries
         else:
-            return TimeseriesDT(timeseries)
+            return self._with_timeseries(timeseries)
+
+    def compute_degree_days_bank(
+        self, temperature_column, thresholds_heating=(), thresholds_cooling=(), inplace=True
+    ):
+        """
+        Add heating and cooling degree days for many thresholds at once, as columns
+        "HDD_<threshold>" and "CDD_<threshold>".
+
+        :param temperature_column: (str) Temperature column.
+        :param thresholds_heating: (list of float) Heating thresholds.
+        :param thresholds_cooling: (list of float) Cooling thresholds.
+        :param inplace: (bool) If True, modify the current instance. Otherwise, return a new one.
+        """
+        bank = degree_days_bank(
+            self.timeseries[temperature_column].to_numpy(dtype=float),
+            thresholds_heating,
+            thresholds_cooling,
+        )
+        timeseries = self.timeseries.assign(**bank)
+
+        if inplace:
+            self.timeseries = timeseries
+        else:
+            return self._with_timeseries(timeseries)
+
+    def search_degree_days_thresholds(
+        self, temperature_column, y="y", thresholds_heating=None, thresholds_cooling=None
+    ):
+        """
+        Evaluate the regression of `y` on degree days for every candidate threshold (or pair of
+        heating and cooling thresholds if both are given), without recomputing the features.
+
+        :param temperature_column: (str) Temperature column.
+        :param y: (str) Response column.
+        :param thresholds_heating: (list of float) Candidate heating thresholds.
+        :param thresholds_cooling: (list of float) Candidate cooling thresholds.
+        :return: (DataFrame) Fit of each candidate, best (lowest sse) first.
+        """
+        temperature = self.timeseries[temperature_column].to_numpy(dtype=float)
+        response = self.timeseries[y].to_numpy(dtype=float)
+
+        if thresholds_heating is not None and thresholds_cooling is not None:
+            results = search_thresholds_pair(
+                temperature, response, thresholds_heating, thresholds_cooling
+            )
+        elif thresholds_heating is not None:
+            results = search_threshold(temperature, response, thresholds_heating, "heating")
+        elif thresholds_cooling is not None:
+            results = search_threshold(temperature, response, thresholds_cooling, "cooling")
+        else:
+            raise ValueError("Please provide heating and/or cooling candidate thresholds.")
+
+        return results.sort_values("sse", kind="stable").reset_index(drop=True)
 
     def get_granularity(self, unit="hour"):
-        delta = self.timeseries["time"].diff().iloc[1]
+        if self.time_step is not None:
+            # Also known for chunks of a single row
+            delta = pd.Timedelta(self.time_step, unit="ns")
+        else:
+            delta = self.timeseries["time"].diff().iloc[1]
         if unit == "hour":
             return delta.total_seconds() / 3600
         elif unit == "minute":
@@ -214,6 +835,37 @@ class TimeseriesDT:
         else:
             raise ValueError("Unsupported unit")
 
+    def get_lags(self, variables, lags):
+        """
+        Lagged versions of variables, as views over padded copies of their columns.
+
+        :param variables: (list of str) Variables to lag.
+        :param lags: (int or list of int) Lags in rows; a lag of n rows is n time steps.
+        :return: (LagFeatures)
+        """
+        if len(self.timeseries) > 1 and self.get_step() is None:
+            raise ValueError(
+                "Shifted variables require a regular time step, so that a lag in rows is a "
+                "constant lag in time. Please resample the timeseries first."
+            )
+        return LagFeatures(self.timeseries, variables, lags)
+
+    def shift(self, variables, n, suffix="_shifted", inplace=True):
+        """
+        Add lagged variables: "<var><suffix>" for a single lag n, "<var><suffix>_<lag>" for
+        several lags. The new columns share the buffers of the lag features, the other columns
+        are not copied.
+
+        :param variables: (list of str) Variables to lag.
+        :param n: (int or list of int) Lags in rows.
+        """
+        timeseries = self.get_lags(variables, n).join(self.timeseries, suffix)
+
+        if inplace:
+            self.timeseries = timeseries
+        else:
+            return self._with_timeseries(timeseries)
+
     def rename(self, old_cols, new_cols, inplace=True):
         renamed = self.timeseries.rename(columns=dict(zip(old_cols, new_cols)))
         if inplace:
@@ -221,50 +873,84 @@ class TimeseriesDT:
         else:
             return TimeseriesDT(renamed)
 
-    def filter_dataset(
+    def filter_rows(
         self,
         y_shifted,
         var,
         var_shifted,
         threshold,
+        by=None,
         q_max=0.8,
         q_min=0.2,
         IC_width=1.5,
         inferior=True,
-        inplace=True,
+        as_mask=False,
     ):
-        timeseries = self.timeseries.copy()
+        """
+        Rows kept by `filter_dataset`, for all groups at once and without copying the data.
+
+        Rows are first selected with the threshold conditions on `var` and its increment, then
+        the rows whose `y_shifted` is outside the interquantile range of their group, widened by
+        `IC_width` times its width, are discarded. Quantiles of all groups are computed in one
+        sort-based pass.
+
+        :param y_shifted: (str) Column whose outliers are discarded.
+        :param var: (str) Column compared with the threshold.
+        :param var_shifted: (str) Shifted `var`, for the increment condition.
+        :param threshold: Threshold, or mapping (dict or Series) of the groups to their threshold.
+        :param by: Column (or array) of the groups, e.g. "instant". None for a single group.
+        :param inferior: (bool) If True, keep rows below the threshold, else above it.
+        :param as_mask: (bool) If True, return a boolean mask instead of row positions.
+        :return: (array) Positions of the kept rows, or boolean mask of the rows.
+        """
+        data = self.timeseries
+        y = data[y_shifted].to_numpy(dtype=float)
+        x = data[var].to_numpy(dtype=float)
+        increment = x - data[var_shifted].to_numpy(dtype=float)
 
-        # Filter non-NA values
-        filtered = timeseries.dropna(subset=[y_shifted, var])
+        if by is None:
+            codes, groups = np.zeros(len(data), dtype=np.int64), np.array([None])
+        else:
+            codes, groups = pd.factorize(data[by] if isinstance(by, str) else np.asarray(by))
+        if isinstance(threshold, (dict, pd.Series)):
+            threshold = pd.Series(threshold).reindex(groups).to_numpy(dtype=float)[codes]
 
-        # Apply threshold conditions
+        # Comparisons with NaN are false: rows with missing values are discarded
         if inferior:
-            filtered = filtered[
-                (filtered[var] <= threshold)
-                & ((filtered[var] - filtered[var_shifted]) <= threshold)
-            ]
+            mask = (x <= threshold) & (increment <= threshold)
         else:
-            filtered = filtered[
-                (filtered[var] >= threshold)
-                & ((filtered[var] - filtered[var_shifted]) >= threshold)
-            ]
+            mask = (x >= threshold) & (increment >= threshold)
+        mask &= ~np.isnan(y) & (codes >= 0)
 
-        # Apply quantile and confidence interval filtering
-        y_shifted_min = filtered[y_shifted].quantile(q_min)
-        y_shifted_max = filtered[y_shifted].quantile(q_max)
-        range_width = IC_width * (y_shifted_max - y_shifted_min)
+        quantiles = group_quantiles(codes[mask], y[mask], len(groups), [q_min, q_max])
+        y_min, y_max = quantiles[codes, 0], quantiles[codes, 1]
+        range_width = IC_width * (y_max - y_min)
+        mask &= (y > y_min - range_width) & (y < y_max + range_width)
+        return mask if as_mask else np.flatnonzero(mask)
 
-        filtered = filtered[
-            (filtered[y_shifted] > y_shifted_min - range_width)
-            & (filtered[y_shifted] < y_shifted_max + range_width)
-        ]
+    def filter_dataset(
+        self,
+        y_shifted,
+        var,
+        var_shifted,
+        threshold,
+        q_max=0.8,
+        q_min=0.2,
+        IC_width=1.5,
+        inferior=True,
+        inplace=True,
+        by=None,
+    ):
+        rows = self.filter_rows(
+            y_shifted, var, var_shifted, threshold, by, q_max, q_min, IC_width, inferior
+        )
+        filtered = self.timeseries.iloc[rows]
 
         if inplace:
             self.timeseries = filtered
             return self
         else:
-            return TimeseriesDT(filtered)
+            return self._with_timeseries(filtered)
 
     def export(self, path, as_data_table=True, file_format="csv"):
         file_format = file_format.lower()
@@ -294,6 +980,7 @@ class TimeseriesDT:
 
         if len(time_column_candidates) == 1:
             self.timeseries.rename(columns={time_column_candidates[0]: "time"}, inplace=True)
+            self._invalidate(time=True)
         elif len(time_column_candidates) > 1:
             # Do nothing
             pass
@@ -1,12 +1,21 @@
-import pandas as pd
-from patsy import dmatrices
-from pygam import LinearGAM, s
+import ast
 
+import numpy as np
+
+from corrclim._lazy import lazy_import
+from corrclim.formula import Formula
 from corrclim.timeseries_dt import TimeseriesDT
 from corrclim.timeseries_model.timeseries_model import TimeseriesModel
 
+pd = lazy_import("pandas")
+
 
 class GAM(TimeseriesModel):
+    """
+    Generalized additive model: `s(variable)` terms of the formula are penalized splines
+    ("s(temperature, n_splines=10)" passes options to the spline), other terms are linear.
+    """
+
     def __init__(
         self,
         formula="y ~ s(temperature) + s(posan) + jour_semaine + jour_ferie + ponts",
@@ -19,59 +28,202 @@ class GAM(TimeseriesModel):
         self.by_instant = by_instant
         self.granularity = granularity
         self.model = None
-        self._initialize_model()
+        # Range of the splines of the by-instant fits, the same for all instants
+        self.edge_knots = None
 
-    def _initialize_model(self):
-        if self.by_instant:
-            self.model = LinearGAM(
-                s(0) + s(1)
-            )  # Example: Implementing basis splines for continuous variables
-        else:
-            self.model = None
+    def _get_terms(self):
+        """
+        Return the (variable, spline options) of each term of the formula, the options being
+        None for linear terms.
+        """
+        terms = []
+        for term in Formula(self.formula).terms:
+            expression = ast.parse(term, mode="eval").body
+            if isinstance(expression, ast.Name):
+                terms.append((expression.id, None))
+            elif (
+                isinstance(expression, ast.Call)
+                and getattr(expression.func, "id", None) == "s"
+                and len(expression.args) == 1
+                and isinstance(expression.args[0], ast.Name)
+            ):
+                options = {kw.arg: ast.literal_eval(kw.value) for kw in expression.keywords}
+                terms.append((expression.args[0].id, options))
+            else:
+                raise ValueError(f"Unsupported term '{term}' in GAM formula.")
+        return terms
+
+    def _new_gam(self, edge_knots=None):
+        """
+        Unfitted GAM of the formula terms, followed by the intercept.
 
-    def fit_fun(self, X: TimeseriesDT):
+        :param edge_knots: (dict) Range of the splines of each variable, None to take it from
+            the fitted data.
+        """
+        from pygam import LinearGAM, intercept, l, s
+        from pygam.terms import TermList
+
+        terms = []
+        for i, (variable, options) in enumerate(self._get_terms()):
+            if options is None:
+                terms.append(l(i))
+            else:
+                if edge_knots is not None:
+                    options = dict(
+                        options, edge_knots=np.asarray(edge_knots[variable], dtype=float)
+                    )
+                terms.append(s(i, **options))
+        return LinearGAM(TermList(*terms, intercept), fit_intercept=False)
+
+    def _get_values(self, data):
+        variables = [variable for variable, _ in self._get_terms()]
+        return data[variables].to_numpy(dtype=float)
+
+    def fit_fun(self, model, X: TimeseriesDT):
         """
         Fit the model to the timeseries data.
 
-        :param X: DataFrame with the timeseries data
+        :param X: TimeseriesDT with the timeseries data
         :return: Fitted model
         """
+        X = X if isinstance(X, TimeseriesDT) else TimeseriesDT(X)
         if self.by_instant:
             # Fit by "instant"
-            X_grouped = X.groupby("instant").apply(self._fit_and_extract_coefs)
-            return X_grouped
-        else:
-            y, X = dmatrices(self.formula, data=X, return_type="dataframe")
-            self.model.fit(X, y)
-            return self.model
+            return self._fit_by_instant(X)
 
-    def _fit_and_extract_coefs(self, group):
-        """
-        Fit a model for a particular group and extract coefficients
-        """
-        y, X = dmatrices(self.formula, data=group, return_type="dataframe")
-        self.model.fit(X, y)
-        coefs = self.model.coef_
-        return pd.Series(coefs, index=self._get_explanatory_variables())
+        values, y = self._get_values(X.timeseries), X.timeseries["y"].to_numpy(dtype=float)
+        valid = ~np.isnan(values).any(axis=1) & ~np.isnan(y)
+        return self._new_gam().fit(values[valid], y[valid])
 
-    def _get_explanatory_variables(self):
-        """Extracts explanatory variables from the formula"""
-        return self.formula.split("~")[1].strip().split(" + ")
+    def _fit_by_instant(self, X):
+        """
+        Fit one GAM per "instant", on the rows of the precomputed calendar groups.
 
-    def predict_fun(self, X: TimeseriesDT):
+        The splines of all instants span the range of the whole data, so that the coefficients
+        of every instant are those of the same basis.
+        """
+        data = X.timeseries
+        values, y = self._get_values(data), data["y"].to_numpy(dtype=float)
+        valid = ~np.isnan(values).any(axis=1) & ~np.isnan(y)
+        self.edge_knots = {
+            variable: [float(values[valid, i].min()), float(values[valid, i].max())]
+            for i, (variable, options) in enumerate(self._get_terms())
+            if options is not None
+        }
+
+        labels, order, offsets = X.get_groups("instant")
+        coefficients = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            rows = order[start:end]
+            rows = rows[valid[rows]]
+            gam = self._new_gam(self.edge_knots).fit(values[rows], y[rows])
+            coefficients.append(gam.coef_)
+        return pd.DataFrame(
+            coefficients,
+            index=pd.Index(labels, name="instant"),
+            columns=self._get_coefficient_names(),
+        )
+
+    def _get_coefficient_names(self):
+        # "s(temperature)[0]", ... for the splines, the variable of linear terms, "intercept"
+        names = []
+        terms = self._get_terms() + [("intercept", None)]
+        for (variable, options), gam_term in zip(terms, self._new_gam(self.edge_knots).terms):
+            if options is None:
+                names.append(variable)
+            else:
+                names += [f"s({variable})[{j}]" for j in range(gam_term.n_coefs)]
+        return names
+
+    def predict_fun(self, model, X: TimeseriesDT):
         """
         Predict using the fitted model.
 
-        :param X: DataFrame with timeseries data
-        :return: Predictions (as a list or array)
+        :param X: TimeseriesDT with timeseries data
+        :return: Predictions, NaN for rows with missing values
         """
+        data = X.timeseries if isinstance(X, TimeseriesDT) else X
+        values = self._get_values(data)
+        valid = ~np.isnan(values).any(axis=1)
+        prediction = np.full(len(data), np.nan)
+        if not valid.any():
+            return prediction
+
         if self.by_instant:
-            return self.model.predict(X)
+            # Basis of the splines evaluated once, then combined with the coefficients of the
+            # instant of each row
+            basis = self._new_gam(self.edge_knots).terms.build_columns(values[valid])
+            position = model.index.get_indexer(data["instant"].to_numpy()[valid])
+            coefficients = np.vstack([model.to_numpy(dtype=float), np.full(model.shape[1], np.nan)])
+            prediction[valid] = np.asarray(basis.multiply(coefficients[position]).sum(axis=1))
         else:
-            return self.model.predict(X).tolist()
+            prediction[valid] = model.predict(values[valid])
+        return prediction
+
+    def get_state(self):
+        params = {
+            "formula": self.formula,
+            "by_instant": self.by_instant,
+            "granularity": self.granularity,
+            "time_step": getattr(self, "time_step", None),
+            "smoothers": getattr(self, "smoothers", None),
+            "status": getattr(self, "_status", 0),
+        }
+        arrays = {}
+
+        if isinstance(self.model, pd.DataFrame):
+            # Coefficients fitted by instant
+            params["fitted"] = "by_instant"
+            params["edge_knots"] = self.edge_knots
+            params["variables"] = [str(var) for var in self.model.columns]
+            params["coefficients_index"] = self.model.index.name
+            arrays["instants"] = self.model.index.to_numpy()
+            arrays["coefficients"] = self.model.to_numpy(dtype=float)
+        elif self.model is not None and self.model._is_fitted:
+            params["fitted"] = "gam"
+            # Range of every term but the intercept, set when the GAM was fitted
+            params["edge_knots"] = [
+                [float(knot) for knot in term.edge_knots_] if hasattr(term, "edge_knots_") else None
+                for term in self.model.terms
+            ]
+            params["m_features"] = self.model.statistics_["m_features"]
+            arrays["coef"] = self.model.coef_
+        return params, arrays
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        model = cls(
+            formula=params["formula"],
+            by_instant=params["by_instant"],
+            granularity=params["granularity"],
+        )
+        model.smoothers = params["smoothers"]
+        model.time_step = params.get("time_step")
+        model._status = params["status"]
+
+        if params.get("fitted") == "by_instant":
+            model.edge_knots = params["edge_knots"]
+            model.model = pd.DataFrame(
+                arrays["coefficients"],
+                index=pd.Index(arrays["instants"], name=params["coefficients_index"]),
+                columns=params["variables"],
+            )
+        elif params.get("fitted") == "gam":
+            model.model = model._new_gam()
+            model.model._validate_params()
+            for term, edge_knots in zip(model.model.terms, params["edge_knots"]):
+                if edge_knots is not None:
+                    term.edge_knots_ = np.asarray(edge_knots)
+            model.model.coef_ = np.asarray(arrays["coef"])
+            model.model.statistics_ = {"m_features": params["m_features"]}
+        return model
 
 
 class GamStd(GAM):
+    """
+    GAM fitted on all rows at once by default, e.g. to model the standard deviation.
+    """
+
     def __init__(
         self,
         formula="y ~ s(temperature) + s(posan) + jour_semaine + jour_ferie + ponts",
@@ -81,39 +233,3 @@ class GamStd(GAM):
         **kwargs,
     ):
         super().__init__(formula, by_instant, granularity, *args, **kwargs)
-
-    def fit_fun(self, X):
-        """
-        Fit the model for standard deviation estimation.
-
-        :param X: DataFrame with the timeseries data
-        :return: Fitted model
-        """
-        X = pd.DataFrame(X)  # Ensure that X is a DataFrame
-        if self.by_instant:
-            # Fit by "instant"
-            return self._fit_by_instant(X)
-        else:
-            # Use traditional fitting approach
-            y, X = dmatrices(self.formula, data=X, return_type="dataframe")
-            self.model.fit(X, y)
-            return self.model
-
-    def _fit_by_instant(self, X):
-        """
-        Fit the model by "instant", assuming a time granularity.
-        """
-        X_grouped = X.groupby("instant").apply(self._fit_and_extract_coefs)
-        return X_grouped
-
-    def predict_fun(self, X):
-        """
-        Predict the model for standard deviation estimation.
-
-        :param X: DataFrame with timeseries data
-        :return: Predictions (as a list or array)
-        """
-        if self.by_instant:
-            return self.model.predict(X)
-        else:
-            return self.model.predict(X).tolist()
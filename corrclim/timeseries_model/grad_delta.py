@@ -1,14 +1,26 @@
-import pandas as pd
-from sklearn.linear_model import Ridge
-from statsmodels.regression.glm import GLM
-from statsmodels.robust.robust_linear_model import RLM
-from statsmodels.tools import add_constant
+import numpy as np
 
+from corrclim._lazy import lazy_import
+from corrclim.lags import LagFeatures, as_row_lag
 from corrclim.timeseries_dt import TimeseriesDT
+from corrclim.timeseries_model.sufficient_statistics import (
+    MAD_NORMALIZATION,
+    SufficientStatistics,
+    huber_weights,
+    solve_normal_equations,
+    weighted_moments,
+)
 from corrclim.timeseries_model.timeseries_model import TimeseriesModel
 
+pd = lazy_import("pandas")
+
+NS_PER_HOUR = 3600 * 10**9
+
 
 class GradDelta(TimeseriesModel):
+    ridge_alpha = 1.0  # Same penalty as the default sklearn Ridge
+    robust_iterations = 5  # IRLS iterations of a robust partial_fit
+
     def __init__(
         self,
         formula="y ~ temperature",
@@ -17,50 +29,128 @@ class GradDelta(TimeseriesModel):
         granularity: str = "day",
         N_min: int = 30,
         weights=None,
+        forgetting: float = 1.0,
+        window=None,
+        smoothers=None,
+        row_filter=None,
     ):
+        """
+        :param forgetting: (float) Exponential forgetting factor per observation used by
+            `partial_fit`, in (0, 1]. 1 keeps the whole history.
+        :param window: (int) Number of most recent `partial_fit` calls kept in the online
+            statistics. None keeps them all.
+        :param row_filter: (dict) Keyword arguments of `TimeseriesDT.filter_rows` (y_shifted, var,
+            var_shifted, threshold, ...) selecting the fitted rows, with quantiles and thresholds
+            by instant when fitted by instant. None fits all rows. `partial_fit` does not filter.
+        """
         self.formula = formula
         self.N_min = N_min
         self.weights = weights
         self.lm = lm
         self.n_shift = n_shift
         self.granularity = granularity
+        self.by_instant = {"activate": granularity == "instant", "granularity": "day"}
+        self.smoothers = smoothers
+        self.forgetting = forgetting
+        self.window = window
+        self.row_filter = row_filter
         self.gradients = None
         self.model = None
+        self.online_statistics = None
+        self._online_seed = None
+        self._online_tail = None
+        self._online_tail_time = None
         self._initialize_linear_model()
 
     def _initialize_linear_model(self):
-        if self.lm == "robust":
-            self.lm_func = RLM
-        elif self.lm == "least squares":
-            self.lm_func = GLM
-        elif self.lm == "ridge":
-            self.lm_func = Ridge
-        else:
+        if self.lm not in ("robust", "least squares", "ridge"):
             raise ValueError(
                 "Linear model not supported. Choose 'robust', 'least squares', or 'ridge'."
             )
 
-    def fit_fun(self, X: TimeseriesDT):
-        X = X.get_timeseries()
+    @property
+    def lm_func(self):
+        # The fitting backend is only imported when a fit needs it
+        if self.lm == "robust":
+            from statsmodels.robust.robust_linear_model import RLM
+
+            return RLM
+        elif self.lm == "least squares":
+            from statsmodels.genmod.generalized_linear_model import GLM
+
+            return GLM
+        else:
+            from sklearn.linear_model import Ridge
+
+            return Ridge
+
+    def fit_fun(self, model, X: TimeseriesDT):
+        data = X.get_timeseries()
+        variables = self._get_explanatory_variables()
+        mask = self._get_row_filter(X)
 
         if self.granularity == "instant":
-            X = X.groupby("instant").apply(self._fit_and_extract_coefs)
+            # Rows of each instant from the precomputed calendar groups, without re-hashing
+            labels, order, offsets = X.get_groups("instant")
+            groups = [order[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            if mask is not None:
+                groups = [rows[mask[rows]] for rows in groups]
+            fits = [self._linear_model(data.iloc[rows]) for rows in groups]
+            gradients = pd.DataFrame(
+                [self._extract_coefs(fit) for fit in fits],
+                index=pd.Index(labels, name="instant"),
+                columns=variables,
+            )
         else:
-            X = self._fit_and_extract_coefs(X)
+            labels = [0]
+            fits = [self._linear_model(data if mask is None else data[mask])]
+            gradients = self._extract_coefs(fits[0])
 
-        self.gradients = X
+        # partial_fit continues from the batch fit: the online statistics of the fitted rows are
+        # only computed by the first call, and the last rows are kept for the shifted variables
+        self.online_statistics = None
+        columns = ["y"] + variables + (["instant"] if self.granularity == "instant" else [])
+        self._online_seed = {
+            "data": data[columns] if mask is None else data.loc[mask, columns],
+            "keys": np.asarray(labels),
+            "params": np.array([np.asarray(fit.params, dtype=float) for fit in fits]),
+            "scale": np.array([fit.scale for fit in fits]) if self.lm == "robust" else None,
+        }
+        self._online_tail = self._online_tail_time = None
+        base = self._get_online_shifted_base(data, variables)
+        if base:
+            _, n_rows = self._get_online_shift(X)
+            self._set_online_tail(X.get_time_values(), data[base].to_numpy(dtype=float), n_rows)
+
+        self.gradients = gradients
         return self.gradients
 
+    def _get_row_filter(self, X):
+        """
+        Mask of the rows selected by `row_filter`, None if all rows are fitted.
+        """
+        if getattr(self, "row_filter", None) is None:
+            return None
+        by = "instant" if self.granularity == "instant" else None
+        return X.filter_rows(**self.row_filter, by=by, as_mask=True)
+
     def _fit_and_extract_coefs(self, data):
-        model = self._linear_model(data)
+        return self._extract_coefs(self._linear_model(data))
+
+    def _extract_coefs(self, model):
         coefs = model.params[1:].values  # excluding the intercept
         return pd.Series(coefs, index=self._get_explanatory_variables())
 
     def _linear_model(self, dt):
+        from statsmodels.tools import add_constant
+
+        # Rows at the edges of shifted variables have no lagged value
+        variables = self._get_explanatory_variables()
+        dt = dt.dropna(subset=variables + ["y"])
         if len(dt) < self.N_min:
             raise ValueError("Not enough observations for fitting")
 
-        X = add_constant(dt[self._get_explanatory_variables()])
+        X = add_constant(dt[variables])
         y = dt["y"]
 
         if self.weights is not None:
@@ -71,19 +161,380 @@ class GradDelta(TimeseriesModel):
         return model
 
     def _get_explanatory_variables(self):
-        return self.formula.split("~")[1].strip().split()
+        return [var.strip() for var in self.formula.split("~")[1].split("+")]
+
+    def partial_fit(self, outputs, inputs):
+        """
+        Update the gradients with new observations only.
+
+        Least squares and ridge fits accumulate per-instant sufficient statistics (with optional
+        exponential forgetting or sliding window), robust fits run a few IRLS iterations on the
+        new rows, warm-started from the current coefficients. The cost is proportional to the
+        new data. After `fit`, the first call computes the statistics of the fitted rows, starting
+        from the fitted coefficients; otherwise it starts the online statistics from scratch. New observations must follow the
+        previous ones in time, and are not smoothed.
+
+        :param outputs: New observed outputs (DataFrame or TimeseriesDT, time and value columns).
+        :param inputs: New inputs over the same period.
+        :return: The updated model.
+        """
+        X = TimeseriesDT(outputs, is_output=True)
+        X.merge(TimeseriesDT(inputs))
+        if getattr(self, "time_step", None) is None:
+            self.time_step = X.time_step
+        elif X.time_step is None:
+            X.time_step = self.time_step
+        if self.granularity == "instant" and "instant" not in X.timeseries.columns:
+            X.compute_instant(granularity=self.by_instant["granularity"])
+        variables = self._get_explanatory_variables()
+        data = self._add_online_shifted_variables(X, variables)
+
+        self._update_online_statistics(data, variables)
+        self._set_gradients_from_statistics(variables)
+        self._set_status(1)
+        return self
+
+    def _update_online_statistics(self, data, variables):
+        data = data.dropna(subset=["y"] + variables)
+        if self.granularity == "instant":
+            keys = data["instant"].to_numpy()
+        else:
+            keys = np.zeros(len(data), dtype=np.int64)
+
+        statistics = self._get_online_statistics()
+        if statistics is None:
+            statistics = self.online_statistics = SufficientStatistics(
+                len(variables), forgetting=self.forgetting, window=self.window
+            )
+        groups = statistics.get_groups(keys)
+        Z = np.column_stack([np.ones(len(data)), data[variables].to_numpy(dtype=float)])
+        y = data["y"].to_numpy(dtype=float)
+
+        if self.lm == "robust":
+            self._robust_update(statistics, groups, Z, y)
+        else:
+            touched = statistics.update(groups, Z, y)
+            statistics.solve(touched, self.ridge_alpha if self.lm == "ridge" else 0.0)
+
+    def _get_online_statistics(self):
+        """
+        Return the online statistics, computing those of the fitted rows if `fit` was the last
+        update.
+        """
+        seed = getattr(self, "_online_seed", None)
+        if seed is None:
+            return self.online_statistics
+
+        # The coefficients are those of the batch fit, and robust fits weigh the fitted rows with
+        # their Huber weights, so that the next update continues from the batch solution
+        self._online_seed = None
+        variables = self._get_explanatory_variables()
+        data = seed["data"].dropna(subset=["y"] + variables)
+        if self.granularity == "instant":
+            keys = data["instant"].to_numpy()
+        else:
+            keys = np.zeros(len(data), dtype=np.int64)
+
+        statistics = SufficientStatistics(
+            len(variables), forgetting=self.forgetting, window=self.window
+        )
+        fitted = statistics.get_groups(seed["keys"])
+        groups = statistics.get_groups(keys)
+        Z = np.column_stack([np.ones(len(data)), data[variables].to_numpy(dtype=float)])
+        y = data["y"].to_numpy(dtype=float)
+
+        statistics.params[fitted] = seed["params"]
+        weights = None
+        if self.lm == "robust":
+            statistics.scale[fitted] = seed["scale"]
+            residuals = y - np.sum(Z * statistics.params[groups], axis=1)
+            weights = huber_weights(residuals, statistics.scale[groups])
+        statistics.update(groups, Z, y, weights)
+        self.online_statistics = statistics
+        return statistics
+
+    def _robust_update(self, statistics, groups, Z, y):
+        touched = np.unique(groups)
+
+        # New groups start from a least squares fit of their rows
+        new = touched[np.isnan(statistics.params[touched, 0])]
+        if len(new):
+            rows = np.isin(groups, new)
+            start = SufficientStatistics(statistics.n_features)
+            start_groups = start.get_groups(groups[rows])
+            start.update(start_groups, Z[rows], y[rows])
+            statistics.params[new] = start.solve(np.unique(start_groups))
+            residuals = y[rows] - np.sum(Z[rows] * statistics.params[groups[rows]], axis=1)
+            statistics.scale[new] = self._mad_by_group(residuals, groups[rows], new)
+
+        # Warm-started IRLS on the new rows only, the accumulated statistics being fixed
+        scale = statistics.scale[groups]
+        for _ in range(self.robust_iterations):
+            residuals = y - np.sum(Z * statistics.params[groups], axis=1)
+            weights = huber_weights(residuals, scale)
+            touched, params = statistics.candidate_params(groups, Z, y, weights)
+            statistics.params[touched] = params
+
+        # Commit the last weights
+        residuals = y - np.sum(Z * statistics.params[groups], axis=1)
+        touched = statistics.update(groups, Z, y, huber_weights(residuals, scale))
+        statistics.solve(touched)
+
+        # Blend the scale of the new residuals with the previous one, by weight of evidence
+        residuals = y - np.sum(Z * statistics.params[groups], axis=1)
+        batch_scale = self._mad_by_group(residuals, groups, touched)
+        n_new = np.bincount(groups, minlength=len(statistics.keys))[touched]
+        n_old = np.maximum(statistics.count[touched] - n_new, 0)
+        old_scale = statistics.scale[touched]
+        blended = np.sqrt(
+            (n_old * old_scale**2 + n_new * batch_scale**2) / np.maximum(n_old + n_new, 1)
+        )
+        statistics.scale[touched] = np.where(
+            np.isnan(old_scale), batch_scale, np.where(n_new > 0, blended, old_scale)
+        )
+        return touched
+
+    def fit_replicates(self, X: TimeseriesDT, weights):
+        """
+        Fit the gradients for many weightings of the rows at once (e.g. bootstrap replicates),
+        from weighted sufficient statistics: one pass over the rows per batch of replicates.
+
+        Robust fits reuse the Huber weights of the fit on all rows (one-step approximation).
+
+        :param X: (TimeseriesDT) Features, as returned by `get_features(..., is_fitting=True)`.
+        :param weights: (array r x n) Row weights, one row per replicate.
+        :return: Tuple (keys, gradients): the instants (a single key if not fitted by instant)
+            and the gradients, array r x instants x variables.
+        """
+        variables = self._get_explanatory_variables()
+        data = X.timeseries
+        valid = data[["y"] + variables].notna().all(axis=1).to_numpy()
+        mask = self._get_row_filter(X)
+        if mask is not None:
+            valid &= mask
+
+        if self.granularity == "instant":
+            keys, groups = np.unique(data["instant"].to_numpy()[valid], return_inverse=True)
+        else:
+            keys, groups = np.zeros(1, dtype=np.int64), np.zeros(valid.sum(), dtype=np.int64)
+        groups = groups.ravel()
+        Z = np.column_stack([np.ones(len(groups)), data[variables].to_numpy(dtype=float)[valid]])
+        y = data["y"].to_numpy(dtype=float)[valid]
+        W = np.asarray(weights, dtype=float)[:, valid]
+
+        n_rows = np.stack([np.bincount(groups, weights=w, minlength=len(keys)) for w in W])
+        if self.lm == "robust":
+            W = W * self._robust_row_weights(groups, len(keys), Z, y)
+
+        ZtZ, Zty, _ = weighted_moments(groups, len(keys), Z, y, W)
+        params = solve_normal_equations(ZtZ, Zty, self.ridge_alpha if self.lm == "ridge" else 0.0)
+        gradients = params[..., 1:]
+        gradients[n_rows < self.N_min] = np.nan
+        return keys, gradients
+
+    def predict_replicates(self, keys, gradients, X: TimeseriesDT):
+        """
+        Predict with the gradients of `fit_replicates`.
+
+        :param X: (TimeseriesDT) Features, as returned by `get_features`.
+        :return: (array r x n) One prediction per replicate.
+        """
+        data = X.timeseries
+        values = data[self._get_explanatory_variables()].to_numpy(dtype=float)
+        if self.granularity == "instant":
+            row_keys = data["instant"].to_numpy()
+        else:
+            row_keys = np.zeros(len(data), dtype=np.int64)
+
+        position = np.minimum(np.searchsorted(keys, row_keys), len(keys) - 1)
+        prediction = np.einsum("rnk,nk->rn", gradients[:, position], values)
+        prediction[:, keys[position] != row_keys] = np.nan
+        return prediction
+
+    def _robust_row_weights(self, groups, n_groups, Z, y):
+        # Huber weights of the robust fit on all rows, by IRLS from the least squares fit
+        weights = np.ones(len(y))
+        for _ in range(self.robust_iterations):
+            ZtZ, Zty, _ = weighted_moments(groups, n_groups, Z, y, weights)
+            residuals = y - np.sum(Z * solve_normal_equations(ZtZ, Zty)[groups], axis=1)
+            scale = self._mad_by_group(residuals, groups, np.arange(n_groups))[groups]
+            weights = huber_weights(residuals, scale)
+        return weights
+
+    @staticmethod
+    def _mad_by_group(residuals, groups, selected):
+        mad = pd.Series(np.abs(residuals)).groupby(groups).median()
+        return MAD_NORMALIZATION * mad.reindex(selected).to_numpy()
+
+    @staticmethod
+    def _get_online_shifted_base(data, variables):
+        # Variables whose values are kept across partial_fit calls to be shifted
+        shifted = [var for var in variables if var.endswith("_shifted")]
+        return [var[: -len("_shifted")] for var in shifted if var[: -len("_shifted")] in data]
+
+    def _get_online_shift(self, X):
+        """
+        Return (step, rows): the time step of the rows and the number of rows of the shift.
+        """
+        step = X.get_step() if len(X.timeseries) > 1 else X.time_step
+        if step is None:
+            raise ValueError(
+                "Shifted variables require a regular time step, so that a lag in rows is a "
+                "constant lag in time. Please resample the timeseries first."
+            )
+        return step, as_row_lag(self.n_shift * NS_PER_HOUR / step)
+
+    def _set_online_tail(self, time, values, n_rows):
+        # Rows less than n_shift hours before the next observations: none if n_shift is 0
+        start = len(values) - min(n_rows, len(values))
+        self._online_tail = values[start:]
+        self._online_tail_time = time[start:]
+
+    def _add_online_shifted_variables(self, X, variables):
+        data = X.timeseries
+        shifted = [var for var in variables if var.endswith("_shifted") and var not in data]
+        if not shifted:
+            return data
+
+        base = [var[: -len("_shifted")] for var in shifted]
+        step, n_rows = self._get_online_shift(X)
+        time = X.get_time_values()
+        tail_time = getattr(self, "_online_tail_time", None)
+        if tail_time is not None and len(tail_time) and len(time) and time[0] <= tail_time[-1]:
+            raise ValueError("New observations must follow the previous ones in time.")
+
+        # The n_shift hours before the first new row are taken from the rows of previous calls
+        # by timestamp, so that a gap between calls gives missing shifted values
+        previous_time = time[:1] - step * np.arange(n_rows, 0, -1, dtype=np.int64)
+        previous = np.full((n_rows, len(base)), np.nan)
+        if tail_time is not None and len(tail_time) and n_rows:
+            position = np.minimum(np.searchsorted(tail_time, previous_time), len(tail_time) - 1)
+            found = tail_time[position] == previous_time
+            previous[found] = self._online_tail[position[found]]
+
+        history = np.concatenate([previous, data[base].to_numpy(dtype=float)])
+        lagged = LagFeatures(pd.DataFrame(history, columns=base), base, n_rows)
+        data = data.assign(**{var: lagged.get(b, n_rows)[n_rows:] for var, b in zip(shifted, base)})
+        self._set_online_tail(np.concatenate([previous_time, time]), history, n_rows)
+        return data
+
+    def _set_gradients_from_statistics(self, variables):
+        statistics = self.online_statistics
+        params = statistics.params[:, 1:].copy()
+        params[statistics.count < self.N_min] = np.nan
+
+        if self.granularity == "instant":
+            self.gradients = pd.DataFrame(
+                params, index=pd.Index(statistics.keys, name="instant"), columns=variables
+            ).sort_index()
+        else:
+            self.gradients = pd.Series(params[0], index=variables)
+        self.model = self.gradients
 
     def predict_fun(self, model, X: TimeseriesDT):
-        X = X.get_timeseries()
+        X = X.timeseries
         vars_ = self._get_explanatory_variables()
-        X = X.merge(model, on="instant", suffixes=("", "_grad"))
 
-        X["result"] = 0
-        for var in vars_:
-            var_grad = f"{var}_grad"
-            X["result"] += X[var] * X[var_grad]
+        if isinstance(model, pd.DataFrame):
+            # Row of the gradients of each instant, gathered by index rather than merged
+            position = model.index.get_indexer(X["instant"])
+            gradients = np.vstack([model[vars_].to_numpy(dtype=float), np.full(len(vars_), np.nan)])
+        else:
+            position = np.zeros(len(X), dtype=np.int64)
+            gradients = model[vars_].to_numpy(dtype=float)[None, :]
+
+        result = np.zeros(len(X))
+        for i, var in enumerate(vars_):
+            result += X[var].to_numpy(dtype=float) * gradients[position, i]
 
-        return X["result"]
+        return result
 
     def get_gradients(self):
         return self.gradients.copy()
+
+    def __getstate__(self):
+        # Pickles hold the online statistics rather than the fitted rows they are computed from
+        self._get_online_statistics()
+        return self.__dict__
+
+    def get_state(self):
+        arrays = {}
+        params = {
+            "formula": self.formula,
+            "lm": self.lm,
+            "n_shift": self.n_shift,
+            "granularity": self.granularity,
+            "N_min": self.N_min,
+            "forgetting": self.forgetting,
+            "window": self.window,
+            "time_step": getattr(self, "time_step", None),
+            "smoothers": getattr(self, "smoothers", None),
+            "row_filter": self._get_row_filter_state(arrays),
+            "online_statistics": self._get_online_statistics(),
+            "status": getattr(self, "_status", 0),
+        }
+        if self.weights is not None:
+            arrays["weights"] = np.asarray(self.weights)
+        if self._online_tail is not None:
+            arrays["online_tail"] = self._online_tail
+            arrays["online_tail_time"] = self._online_tail_time
+
+        if self.gradients is not None:
+            if isinstance(self.gradients, pd.DataFrame):
+                # One row of gradients per instant
+                params["variables"] = [str(var) for var in self.gradients.columns]
+                params["gradients_index"] = self.gradients.index.name
+                arrays["instants"] = self.gradients.index.to_numpy()
+            else:
+                params["variables"] = [str(var) for var in self.gradients.index]
+            arrays["gradients"] = self.gradients.to_numpy(dtype=float)
+        return params, arrays
+
+    def _get_row_filter_state(self, arrays):
+        # Thresholds by instant are saved as arrays, JSON keys being strings
+        row_filter = getattr(self, "row_filter", None)
+        if row_filter is None or not isinstance(row_filter["threshold"], (dict, pd.Series)):
+            return row_filter
+        threshold = pd.Series(row_filter["threshold"])
+        arrays["row_filter_keys"] = threshold.index.to_numpy()
+        arrays["row_filter_thresholds"] = threshold.to_numpy(dtype=float)
+        return dict(row_filter, threshold=None)
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        row_filter = params.get("row_filter")
+        if "row_filter_keys" in arrays:
+            threshold = pd.Series(
+                np.array(arrays["row_filter_thresholds"]), index=np.array(arrays["row_filter_keys"])
+            )
+            row_filter = dict(row_filter, threshold=threshold)
+        model = cls(
+            formula=params["formula"],
+            lm=params["lm"],
+            n_shift=params["n_shift"],
+            granularity=params["granularity"],
+            N_min=params["N_min"],
+            weights=arrays.get("weights"),
+            forgetting=params["forgetting"],
+            window=params["window"],
+            smoothers=params["smoothers"],
+            row_filter=row_filter,
+        )
+        model.time_step = params.get("time_step")
+        model.online_statistics = params["online_statistics"]
+        if "online_tail" in arrays:
+            model._online_tail = np.array(arrays["online_tail"])
+            model._online_tail_time = np.array(arrays["online_tail_time"])
+        model._status = params["status"]
+
+        if "gradients" in arrays:
+            if "instants" in arrays:
+                model.gradients = pd.DataFrame(
+                    arrays["gradients"],
+                    index=pd.Index(arrays["instants"], name=params["gradients_index"]),
+                    columns=params["variables"],
+                )
+            else:
+                model.gradients = pd.Series(arrays["gradients"], index=params["variables"])
+            model.model = model.gradients
+        return model
@@ -0,0 +1,257 @@
+import numpy as np
+
+HUBER_T = 1.345  # Same tuning constant as statsmodels' HuberT norm
+MAD_NORMALIZATION = 1.4826
+
+
+def huber_weights(residuals, scale):
+    """
+    IRLS weights of the Huber norm for the given residuals and scale.
+    """
+    u = np.abs(residuals) / np.where(scale > 0, scale, 1.0)
+    return np.where(u <= HUBER_T, 1.0, HUBER_T / np.maximum(u, HUBER_T))
+
+
+def group_rows(groups, n_groups):
+    """
+    Sort rows by group once and return (order, offsets): rows of group g are
+    order[offsets[g]:offsets[g + 1]], in their original order.
+    """
+    order = np.argsort(groups, kind="stable")
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=n_groups), out=offsets[1:])
+    return order, offsets
+
+
+def weighted_moments(groups, n_groups, Z, y, weights=None):
+    """
+    Per-group weighted moments (Z'WZ, Z'Wy, sum of weights) of a design matrix Z.
+
+    :param groups: (array of int) Group index of each row.
+    :param n_groups: (int) Number of groups.
+    :param Z: (array n x d) Design matrix (intercept included).
+    :param y: (array n) Response.
+    :param weights: (array n, or r x n) Row weights, one row per replicate if 2D.
+    :return: Arrays of shape (g, d, d), (g, d), (g,), with a leading replicate axis if weights
+        is 2D.
+    """
+    n, d = Z.shape
+    # Row-wise products [vec(z z'), z y, 1]: every moment is a weighted sum of these columns
+    products = np.concatenate(
+        [(Z[:, :, None] * Z[:, None, :]).reshape(n, d * d), Z * y[:, None], np.ones((n, 1))],
+        axis=1,
+    )
+
+    if weights is None or np.ndim(weights) == 1:
+        w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+        moments = np.stack(
+            [
+                np.bincount(groups, weights=products[:, k] * w, minlength=n_groups)
+                for k in range(products.shape[1])
+            ],
+            axis=1,
+        )
+    else:
+        W = np.asarray(weights, dtype=float)
+        order, offsets = group_rows(groups, n_groups)
+        moments = np.empty((len(W), n_groups, products.shape[1]))
+        for g in range(n_groups):
+            rows = order[offsets[g] : offsets[g + 1]]
+            # One matmul per group covers every replicate
+            moments[:, g] = W[:, rows] @ products[rows]
+
+    ZtZ = moments[..., : d * d].reshape(moments.shape[:-1] + (d, d))
+    Zty = moments[..., d * d : d * d + d]
+    count = moments[..., -1]
+    return ZtZ, Zty, count
+
+
+def solve_normal_equations(ZtZ, Zty, ridge_alpha=0.0):
+    """
+    Solve (Z'WZ + alpha * D) beta = Z'Wy for every group, D penalizing all but the intercept.
+
+    Singular groups get NaN coefficients.
+    """
+    d = ZtZ.shape[-1]
+    penalty = ridge_alpha * np.diag(np.r_[0.0, np.ones(d - 1)])
+    A = ZtZ + penalty
+    params = np.full(Zty.shape, np.nan)
+    solvable = np.linalg.cond(A) < 1 / np.finfo(float).eps
+    if np.any(solvable):
+        params[solvable] = np.linalg.solve(A[solvable], Zty[solvable][..., None])[..., 0]
+    return params
+
+
+class SufficientStatistics:
+    """
+    Per-group sufficient statistics of a linear model with intercept, updated incrementally.
+
+    Least squares and ridge coefficients are solved from the accumulated (Z'WZ, Z'Wy), so
+    adding observations costs time proportional to the new rows only. Old observations can be
+    discounted with an exponential forgetting factor, or dropped after `window` updates.
+    """
+
+    def __init__(self, n_features, forgetting=1.0, window=None):
+        """
+        :param n_features: (int) Number of explanatory variables (intercept excluded).
+        :param forgetting: (float) Weight decay applied per new observation of a group, in (0, 1].
+        :param window: (int) Number of most recent updates kept in the statistics.
+        """
+        if not (0 < forgetting <= 1):
+            raise ValueError("forgetting must be in (0, 1]")
+        if window is not None and forgetting != 1:
+            raise ValueError("Please provide either a forgetting factor or a window, not both.")
+
+        self.n_features = n_features
+        self.forgetting = forgetting
+        self.window = window
+
+        d = n_features + 1
+        self.keys = []
+        self._key_index = {}
+        self.ZtZ = np.zeros((0, d, d))
+        self.Zty = np.zeros((0, d))
+        self.count = np.zeros(0)
+        self.params = np.zeros((0, d))
+        self.scale = np.zeros(0)
+        self.batches = []
+
+    def get_groups(self, keys):
+        """
+        Map group keys to group indices, creating the missing groups.
+        """
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        new_keys = [key for key in unique_keys.tolist() if key not in self._key_index]
+        if new_keys:
+            for key in new_keys:
+                self._key_index[key] = len(self.keys)
+                self.keys.append(key)
+            d = self.n_features + 1
+            n_new = len(new_keys)
+            self.ZtZ = np.concatenate([self.ZtZ, np.zeros((n_new, d, d))])
+            self.Zty = np.concatenate([self.Zty, np.zeros((n_new, d))])
+            self.count = np.concatenate([self.count, np.zeros(n_new)])
+            self.params = np.concatenate([self.params, np.full((n_new, d), np.nan)])
+            self.scale = np.concatenate([self.scale, np.full(n_new, np.nan)])
+
+        mapping = np.array([self._key_index[key] for key in unique_keys.tolist()], dtype=np.int64)
+        return mapping[inverse.ravel()]
+
+    def decay_weights(self, groups):
+        """
+        Forgetting weights of new rows: the last row of each group weighs 1, the one before
+        `forgetting`, etc. Also returns the decay to apply to the previous statistics.
+        """
+        n_groups = len(self.keys)
+        if self.forgetting == 1:
+            return np.ones(len(groups)), np.ones(n_groups)
+
+        order, offsets = group_rows(groups, n_groups)
+        sizes = np.diff(offsets)
+        rank = np.empty(len(groups), dtype=np.int64)
+        rank[order] = np.arange(len(groups)) - np.repeat(offsets[:-1], sizes)
+        age = sizes[groups] - 1 - rank
+        return self.forgetting**age, self.forgetting**sizes
+
+    def batch_moments(self, groups, Z, y, weights=None):
+        """
+        Moments of new rows, with forgetting weights, for the groups they touch.
+
+        :return: (touched, decay, ZtZ, Zty, count): the touched groups, the decay to apply to
+            their previous statistics and the moments of the new rows.
+        """
+        row_weights, decay = self.decay_weights(groups)
+        if weights is not None:
+            row_weights = row_weights * weights
+
+        touched = np.unique(groups)
+        compact = np.searchsorted(touched, groups)
+        ZtZ, Zty, count = weighted_moments(compact, len(touched), Z, y, row_weights)
+        return touched, decay[touched], ZtZ, Zty, count
+
+    def candidate_params(self, groups, Z, y, weights=None, ridge_alpha=0.0):
+        """
+        Coefficients of the touched groups if the new rows were added, without adding them.
+        """
+        touched, decay, ZtZ, Zty, _ = self.batch_moments(groups, Z, y, weights)
+        return touched, solve_normal_equations(
+            self.ZtZ[touched] * decay[:, None, None] + ZtZ,
+            self.Zty[touched] * decay[:, None] + Zty,
+            ridge_alpha,
+        )
+
+    def update(self, groups, Z, y, weights=None):
+        """
+        Add new rows to the statistics.
+
+        :param groups: (array of int) Group indices, as returned by `get_groups`.
+        :param Z: (array n x d) Design matrix with intercept.
+        :param y: (array n) Response.
+        :param weights: (array n) Optional row weights (e.g. robust weights).
+        :return: The groups whose statistics changed.
+        """
+        touched, decay, ZtZ, Zty, count = self.batch_moments(groups, Z, y, weights)
+
+        self.ZtZ[touched] = self.ZtZ[touched] * decay[:, None, None] + ZtZ
+        self.Zty[touched] = self.Zty[touched] * decay[:, None] + Zty
+        self.count[touched] = self.count[touched] * decay + count
+
+        if self.window is not None:
+            self.batches.append((touched, ZtZ, Zty, count))
+            if len(self.batches) > self.window:
+                old_touched, old_ZtZ, old_Zty, old_count = self.batches.pop(0)
+                self.ZtZ[old_touched] -= old_ZtZ
+                self.Zty[old_touched] -= old_Zty
+                self.count[old_touched] -= old_count
+                touched = np.union1d(touched, old_touched)
+        return touched
+
+    def solve(self, groups, ridge_alpha=0.0):
+        """
+        Update and return the coefficients of the given groups.
+        """
+        self.params[groups] = solve_normal_equations(
+            self.ZtZ[groups], self.Zty[groups], ridge_alpha
+        )
+        return self.params[groups]
+
+    def get_state(self):
+        params = {
+            "n_features": self.n_features,
+            "forgetting": self.forgetting,
+            "window": self.window,
+            "keys": list(self.keys),
+        }
+        arrays = {
+            "ZtZ": self.ZtZ,
+            "Zty": self.Zty,
+            "count": self.count,
+            "params": self.params,
+            "scale": self.scale,
+        }
+        if self.batches:
+            # Window batches are flattened, with offsets delimiting each batch
+            sizes = [len(batch[0]) for batch in self.batches]
+            arrays["batch_offsets"] = np.r_[0, np.cumsum(sizes)]
+            for i, name in enumerate(["groups", "ZtZ", "Zty", "count"]):
+                arrays[f"batch_{name}"] = np.concatenate([batch[i] for batch in self.batches])
+        return params, arrays
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        statistics = cls(params["n_features"], params["forgetting"], params["window"])
+        statistics.keys = list(params["keys"])
+        statistics._key_index = {key: i for i, key in enumerate(statistics.keys)}
+        for name in ["ZtZ", "Zty", "count", "params", "scale"]:
+            setattr(statistics, name, np.array(arrays[name]))
+
+        if "batch_offsets" in arrays:
+            offsets = arrays["batch_offsets"]
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                statistics.batches.append(
+                    tuple(
+                        np.array(arrays[f"batch_{name}"][start:end])
+                        for name in ["groups", "ZtZ", "Zty", "count"]
+                    )
+                )
+        return statistics
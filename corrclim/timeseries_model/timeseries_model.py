@@ -1,15 +1,76 @@
-from loguru import logger
+from __future__ import annotations
 
+import copy
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+
+from corrclim import serialization
+from corrclim._lazy import lazy_import
+from corrclim.formula import Formula
+from corrclim.shared_frame import SharedFrame
 from corrclim.smoother import MultiSmoother, Smoother
 from corrclim.timeseries_dt import TimeseriesDT
 
+logger = lazy_import("loguru", "logger")
+pd = lazy_import("pandas")
+
+FEATURES_COPIES = 4  # Working copies of the input rows while computing the features
+
+_CV_WORKER = {}
+
+
+def _init_cv_worker(model, template, data, fold_varname):
+    if isinstance(data, SharedFrame):
+        # Attached once per worker process, then shared by all its folds
+        _CV_WORKER["shared"] = data
+        data = data.attach()
+    _CV_WORKER.update(model=model, template=template, data=data, fold_varname=fold_varname)
+
+
+def _cv_task(held_out, seed):
+    return cv_fit_predict(held_out, seed, **_CV_WORKER)
+
+
+def cv_fit_predict(held_out, seed, model, template, data, fold_varname, shared=None):
+    """
+    Fit a copy of a model on the rows outside a fold and predict on the rows of the fold.
+
+    :param held_out: Value of the fold variable of the predicted rows, None to fit on all rows.
+    :param seed: (int) Seed of the random generators, for reproducible fits.
+    :param template: (TimeseriesDT) TimeseriesDT whose settings are given to the data.
+    :param data: (DataFrame) Outputs ("y") merged with the inputs, normalized.
+    :return: Tuple (held_out, prediction on the fold), or (None, fitted model).
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    model = copy.deepcopy(model)
+
+    if held_out is None:
+        train = data
+    else:
+        in_fold = (data[fold_varname] == held_out).to_numpy()
+        train = data[~in_fold].reset_index(drop=True)
+    model.fit(
+        template._with_timeseries(train[["time", "y"]]),
+        template._with_timeseries(train.drop(columns="y")),
+    )
+    if held_out is None:
+        return None, model
+
+    test = data[in_fold].drop(columns="y").reset_index(drop=True)
+    return held_out, np.asarray(model.predict(template._with_timeseries(test)), dtype=float)
+
 
 class TimeseriesModel:
     def __init__(
         self,
         formula,
         by_instant: bool = False,
-        granularity: str = None,
+        granularity: str | None = None,
         smoothers: Smoother | MultiSmoother = None,
         **kwargs,
     ):
@@ -22,21 +83,33 @@ class TimeseriesModel:
             setattr(self, key, value)
 
     def check_timeseries(self, X, is_fitting=True):
-        if not isinstance(X, TimeseriesDT):
-            X = TimeseriesDT(X)
+        # Features are added to a new TimeseriesDT sharing the data (O(1)): the caller's one is
+        # left unchanged, so that fitted models can be called from several threads
+        X = TimeseriesDT(X)
+        if X.time_step is None:
+            # Too few rows to tell the step: the instants are those of the training data
+            X.time_step = getattr(self, "time_step", None)
 
         missing_vars = self._get_missing_vars(X, is_fitting)
 
         if missing_vars:
-            if "instant" in missing_vars and self.by_instant["activate"]:
-                X.compute_instant(granularity=self.by_instant["granularity"])
+            by_instant, instant_granularity = self._get_by_instant()
+            if "instant" in missing_vars and by_instant:
+                X.compute_instant(granularity=instant_granularity)
 
             if any("shifted" in var for var in missing_vars):
-                granularity = X.get_granularity(unit="hour")
-                if is_fitting:
-                    X.shift(
-                        self.formula.get_all_variables_formula_base(), n=self.n_shift / granularity
-                    )
+                if X.time_step is None and len(X.timeseries) < 2:
+                    # A single row of unknown step has no previous row: any lag is missing
+                    n_rows = 1 if self.n_shift else 0
+                else:
+                    n_rows = self.n_shift / X.get_granularity(unit="hour")
+                # When predicting, the response is not available to be shifted
+                base_vars = [
+                    var
+                    for var in self._get_formula().get_all_variables_formula_base()
+                    if var in X.get_variables_name()
+                ]
+                X.shift(base_vars, n=n_rows)
             else:
                 X.add_calendar()
 
@@ -54,29 +127,260 @@ class TimeseriesModel:
         outputs = TimeseriesDT(outputs, is_output=True)
         inputs = TimeseriesDT(inputs)
 
-        X = outputs.merge(inputs)
-        X = self.check_timeseries(X, is_fitting=True)
+        outputs.merge(inputs)
+        self.time_step = outputs.time_step
+        X = self.check_timeseries(outputs, is_fitting=True)
 
-        if self.smoothers:
-            X = self.smoothers.fit_smooth(X)
+        if self._get_smoothers():
+            X.set_timeseries(self.smoothers.fit_smooth(X.timeseries))
 
         self.model = self.fit_fun(self.model, X)
         self._set_status(1)
 
         logger.info("Model fitted!")
 
-    def predict(self, X):
-        if self._status < 1:
-            raise ValueError("Please fit the model first using the fit() method.")
+    def cv_predict(self, outputs, inputs, fold_varname, n_jobs=None, seed=0, fit=False):
+        """
+        Cross-validated prediction: the rows of each fold are predicted by a copy of the model
+        fitted on the other folds.
+
+        Folds are fitted in parallel in a process pool. The data is put once in shared memory,
+        where every worker reads it, and each fold is fitted with its own seed derived from
+        `seed`, so that the prediction does not depend on the scheduling nor on `n_jobs`.
+
+        :param outputs: Observed outputs (DataFrame or TimeseriesDT).
+        :param inputs: Inputs, with the fold variable.
+        :param fold_varname: (str) Variable of the inputs defining the folds, e.g. the year.
+        :param n_jobs: (int) Number of processes, defaults to the number of CPUs. 1 fits the
+            folds in the current process.
+        :param seed: Seed of the fits.
+        :param fit: (bool) If True, also fit this model on all rows, in the same pool as the
+            folds.
+        :return: (array) Prediction of each row of the outputs merged with the inputs.
+        """
+        outputs = TimeseriesDT(outputs, is_output=True)
+        inputs = TimeseriesDT(inputs)
+        if fold_varname not in inputs.get_variables_name():
+            raise ValueError(f"Fold variable {fold_varname} not found in the inputs.")
+
+        merged = outputs.merge(inputs, inplace=False)
+        data = merged.timeseries
+        template = merged._with_timeseries(data.iloc[:0])
+        folds = data[fold_varname].to_numpy()
+        held_out = list(pd.unique(folds[~pd.isna(folds)]))
+        if fit:
+            held_out.append(None)
+        seeds = [int(s) for s in np.random.SeedSequence(seed).generate_state(len(held_out))]
+
+        n_jobs = min(n_jobs or os.cpu_count(), len(held_out))
+        if n_jobs == 1:
+            results = [
+                cv_fit_predict(fold, fold_seed, self, template, data, fold_varname)
+                for fold, fold_seed in zip(held_out, seeds)
+            ]
+        else:
+            logger.info(f"Cross-validating {len(held_out)} folds on {n_jobs} processes")
+            # The pool is shut down before the shared block is released
+            with ExitStack() as stack:
+                shared = stack.enter_context(SharedFrame(data))
+                pool = stack.enter_context(
+                    ProcessPoolExecutor(
+                        n_jobs,
+                        initializer=_init_cv_worker,
+                        initargs=(self, template, shared, fold_varname),
+                    )
+                )
+                results = list(pool.map(_cv_task, held_out, seeds))
+
+        prediction = np.full(len(data), np.nan)
+        for fold, result in results:
+            if fold is None:
+                self.__dict__.update(result.__dict__)
+            else:
+                prediction[folds == fold] = result
+        return prediction
+
+    def predict(self, X, chunk_size=None, max_bytes=None):
+        """
+        Predict on the inputs X.
+
+        Long inputs can be predicted by chunks of rows to bound memory. Smoothers and shifted
+        variables continue from one chunk to the next, so the result is identical to the
+        prediction on the whole input.
+
+        :param X: Inputs (DataFrame or TimeseriesDT).
+        :param chunk_size: (int) Number of rows predicted at once. None predicts all rows at once
+            unless `max_bytes` is given.
+        :param max_bytes: (int) Memory budget of a chunk, used to choose the chunk size.
+        :return: (array) The prediction.
+        """
+        self._check_fitted()
         logger.info(f"Predicting using the model {type(self).__name__} ...")
 
         X = TimeseriesDT(X)
+        chunk_size = self._get_chunk_size(X, chunk_size, max_bytes)
+        if chunk_size is None or chunk_size >= len(X.timeseries):
+            X = self.get_features(X)
+            return self.predict_fun(self.model, X)
+
+        timeseries = X.timeseries
+        prediction = np.empty(len(timeseries))
+        state = None
+        for start in range(0, len(timeseries), chunk_size):
+            chunk = X._with_timeseries(timeseries.iloc[start : start + chunk_size])
+            chunk_prediction, state = self.predict_chunk(chunk, state)
+            prediction[start : start + chunk_size] = np.asarray(chunk_prediction, dtype=float)
+        return prediction
+
+    def get_features(self, X, is_fitting=False):
+        """
+        Features the model is fitted on or predicts from: checked and completed variables
+        (instants, calendar and shifted variables), with the inputs smoothed by the fitted
+        smoothers.
+
+        If the model has a `feature_cache` (FeatureCache), the features of inputs already seen
+        with the same smoothers and settings are read from the cache instead of recomputed.
+
+        :param X: (TimeseriesDT) Inputs, merged with the outputs if `is_fitting`.
+        """
+        cache = getattr(self, "feature_cache", None)
+        if cache is None:
+            return self._compute_features(X, is_fitting)
+
+        X = TimeseriesDT(X)
+        features = cache.get_or_compute(
+            X.timeseries,
+            self._get_smoothers() or "features",
+            lambda data: self._compute_features(X, is_fitting).timeseries,
+            model=type(self).__name__,
+            formula=self._get_formula().formula,
+            n_shift=getattr(self, "n_shift", None),
+            by_instant=self._get_by_instant(),
+            is_fitting=is_fitting,
+            timezone=X.timezone,
+            time_step=X.time_step or getattr(self, "time_step", None),
+        )
+        return X._with_timeseries(features)
+
+    def _compute_features(self, X, is_fitting):
+        X = self.check_timeseries(X, is_fitting=is_fitting)
+
+        if self._get_smoothers():
+            X.set_timeseries(self.smoothers.smooth(X.timeseries))
+        return X
+
+    def predict_batch(self, inputs):
+        """
+        Predict on several independent inputs at once.
+
+        Features are computed for each input (smoothers and shifted variables do not cross
+        inputs), then the model is evaluated once on the rows of all inputs.
+
+        :param inputs: (list) Inputs (DataFrame or TimeseriesDT).
+        :return: (list of array) The prediction of each input.
+        """
+        self._check_fitted()
+        if not inputs:
+            return []
+        features = [self.get_features(TimeseriesDT(X)) for X in inputs]
+        lengths = [len(X.timeseries) for X in features]
+        batch = features[0]._with_timeseries(
+            pd.concat([X.timeseries for X in features], ignore_index=True)
+        )
+        prediction = np.asarray(self.predict_fun(self.model, batch), dtype=float)
+        return np.split(prediction, np.cumsum(lengths)[:-1])
+
+    def predict_chunk(self, X, state=None):
+        """
+        Predict on a chunk of a longer timeseries, carrying the state needed across chunks.
+
+        Predicting consecutive chunks, each with the state returned by the previous call, gives
+        the same result as `predict` on the concatenated data: smoothers continue from their
+        last values and the rows needed by shifted variables are kept from previous chunks.
+
+        :param X: Chunk of inputs, following the previous chunk in time.
+        :param state: (dict) State returned by the previous call, None for the first chunk.
+        :return: Tuple (prediction, state).
+        """
+        self._check_fitted()
+        state = state or {"context": None, "smoothers": None, "time_step": None}
+
+        X = TimeseriesDT(X)
+        if X.time_step is None:
+            # Too few rows to tell the step: the one of the previous chunks or training data
+            X.time_step = state["time_step"] or getattr(self, "time_step", None)
+        chunk = X.timeseries
+        n_context = 0
+        if state["context"] is not None:
+            n_context = len(state["context"])
+            X.set_timeseries(pd.concat([state["context"], chunk], ignore_index=True))
+
+        lookback = self._get_lookback_rows(X)
+        if lookback is None:
+            context = X.timeseries
+        elif lookback:
+            context = X.timeseries.iloc[max(len(X.timeseries) - lookback, 0) :]
+        else:
+            context = None
+
         X = self.check_timeseries(X, is_fitting=False)
+        if n_context:
+            X.set_timeseries(X.timeseries.iloc[n_context:].reset_index(drop=True))
 
-        if self.smoothers:
-            X = self.smoothers.smooth(X)
+        smoothers_state = None
+        if self._get_smoothers():
+            smoothed, smoothers_state = self.smoothers.smooth_chunk(
+                X.timeseries, state["smoothers"]
+            )
+            X.set_timeseries(smoothed)
+
+        prediction = self.predict_fun(self.model, X)
+        state = {"context": context, "smoothers": smoothers_state, "time_step": X.time_step}
+        return prediction, state
+
+    @staticmethod
+    def _get_chunk_size(X, chunk_size=None, max_bytes=None):
+        if chunk_size is not None:
+            if chunk_size < 1:
+                raise ValueError("chunk_size must be a positive number of rows.")
+            return int(chunk_size)
+        if max_bytes is None or len(X.timeseries) == 0:
+            return None
+
+        # The features of a chunk (checked, shifted and smoothed variables) take a few copies of
+        # its input rows
+        row_bytes = X.timeseries.memory_usage(index=True, deep=True).sum() / len(X.timeseries)
+        return max(int(max_bytes // (FEATURES_COPIES * row_bytes)), 1)
+
+    def _get_lookback_rows(self, X):
+        """
+        Number of previous rows needed to compute the shifted variables of a new row, None if
+        the time step is not known yet: all rows are then kept.
+        """
+        if not self._get_formula().get_shifted_variables():
+            return 0
+        if X.time_step is None and len(X.timeseries) < 2:
+            return None
+        return round(getattr(self, "n_shift", 0) / X.get_granularity(unit="hour"))
+
+    def _check_fitted(self):
+        if getattr(self, "_status", 0) < 1:
+            raise ValueError("Please fit the model first using the fit() method.")
+
+    def _get_formula(self):
+        return Formula(self.formula)
 
-        return self.predict_fun(self.model, X)
+    def _get_smoothers(self):
+        return getattr(self, "smoothers", None)
+
+    def _get_by_instant(self):
+        """
+        Return (activate, granularity) of the by-instant fitting of the model.
+        """
+        by_instant = getattr(self, "by_instant", False)
+        if isinstance(by_instant, dict):
+            return by_instant["activate"], by_instant["granularity"]
+        return bool(by_instant), getattr(self, "granularity", None)
 
     def export(self, path):
         if not path.lower().endswith(".pkl"):
@@ -86,20 +390,51 @@ class TimeseriesModel:
 
             pickle.dump(self, f)
 
+    def save(self, path):
+        """
+        Save the fitted model in the compact, memory-mappable model format.
+
+        :param path: (str) Directory where the model is written.
+        """
+        serialization.save_state(self, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a model saved with `save`.
+
+        :param path: (str) Model directory.
+        :param mmap_mode: Memory-map mode of the numeric payloads (None to load them in memory).
+        """
+        model = serialization.load_state(path, mmap_mode)
+        if not isinstance(model, cls):
+            raise TypeError(f"{path} does not contain a {cls.__name__}.")
+        return model
+
+    def get_state(self):
+        """
+        Return the fitted state as a tuple (params, arrays) of JSON-compatible parameters and
+        numpy arrays. Subclasses implement it to support the compact model format.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support the compact model format."
+        )
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        raise NotImplementedError(f"{cls.__name__} does not support the compact model format.")
+
     def _set_status(self, value):
         if value not in {0, 1, 2}:
             raise ValueError("Status must be 0, 1, or 2.")
         self._status = value
 
     def _get_missing_vars(self, X, is_fitting):
+        formula = self._get_formula()
         if is_fitting:
-            missing_vars = set(self.formula.get_all_variables()) - set(X.get_variables_name())
-            if self.by_instant["activate"]:
-                missing_vars.add("instant")
+            required_vars = set(formula.get_all_variables())
         else:
-            missing_vars = set(self.formula.get_explanatory_variables()) - set(
-                X.get_variables_name()
-            )
-            if self.by_instant["activate"]:
-                missing_vars.add("instant")
-        return missing_vars
+            required_vars = set(formula.get_explanatory_variables())
+        if self._get_by_instant()[0]:
+            required_vars.add("instant")
+        return required_vars - set(X.get_variables_name())
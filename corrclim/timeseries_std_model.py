@@ -1,8 +1,13 @@
 import numpy as np
-from loguru import logger
 
+from corrclim._lazy import lazy_import
+from corrclim.formula import Formula
+from corrclim.timeseries_dt import TimeseriesDT
 from corrclim.timeseries_model.timeseries_model import TimeseriesModel
 
+pd = lazy_import("pandas")
+logger = lazy_import("loguru", "logger")
+
 
 class TimeseriesStdModel(TimeseriesModel):
     def __init__(
@@ -25,18 +30,23 @@ class TimeseriesStdModel(TimeseriesModel):
 
         self.conditional_expectation_model = conditional_expectation_model
 
-    def fit(self, outputs, inputs, fold_varname):
+    def fit(self, outputs, inputs, fold_varname, n_jobs=None, seed=0, fit_expectation=False):
         """
         Fit the conditional variance model based on the conditional expectation one.
 
         :param outputs: The output/response data (pandas DataFrame or custom TimeseriesDT)
         :param inputs: The input data with data for both conditional expectation and conditional variance models
         :param fold_varname: The name of the variable in `inputs` to define CV folds
+        :param n_jobs: Number of processes of the cross-validation (see `TimeseriesModel.cv_predict`)
+        :param seed: Seed of the cross-validation fits
+        :param fit_expectation: If True, also fit the conditional expectation model on all the
+            data, together with the cross-validation folds
         """
         logger.info("Fitting the TimeseriesStd Model.")
 
-        # Assuming TimeseriesDT is a custom class, we will use pandas for this example
-        if fold_varname not in inputs.columns:
+        outputs = TimeseriesDT(outputs, is_output=True)
+        inputs = TimeseriesDT(inputs)
+        if fold_varname not in inputs.get_variables_name():
             raise ValueError(
                 "You need to provide the variable defining CV folds inside the input timeseries"
             )
@@ -45,24 +55,111 @@ class TimeseriesStdModel(TimeseriesModel):
 
         # Using the cv_predict method of the conditional expectation model
         output_cv_pred = self.conditional_expectation_model.cv_predict(
-            outputs, inputs, fold_varname
+            outputs, inputs, fold_varname, n_jobs=n_jobs, seed=seed, fit=fit_expectation
         )
-        output_cv_residual_sqrd = (outputs["y"] - output_cv_pred) ** 2
 
-        outputs["y"] = output_cv_residual_sqrd
+        # Predictions are on the rows of the outputs merged with the inputs
+        merged = outputs.merge(inputs, inplace=False).timeseries
+        output_cv_residual_sqrd = (merged["y"].to_numpy(dtype=float) - output_cv_pred) ** 2
+        residuals = outputs._with_timeseries(
+            pd.DataFrame({"time": merged["time"], "y": output_cv_residual_sqrd})
+        )
 
         logger.info("Fitting now using the residuals squared")
-        super().fit(outputs, inputs)
+        super().fit(residuals, inputs)
 
-    def predict(self, inputs):
+    def predict(self, inputs, chunk_size=None, max_bytes=None):
         """
         Predict the conditional standard deviation.
 
         :param inputs: The timeseries data to make predictions on (pandas DataFrame or custom TimeseriesDT)
+        :param chunk_size: Number of rows predicted at once (see `TimeseriesModel.predict`)
+        :param max_bytes: Memory budget of a chunk, used to choose the chunk size
 
         :return: The output timeseries as a vector from the model prediction
         """
-        conditional_variance = super().predict(inputs)
+        conditional_variance = super().predict(inputs, chunk_size, max_bytes)
         conditional_variance = np.maximum(0, conditional_variance)
 
         return np.sqrt(conditional_variance)
+
+    def predict_batch(self, inputs):
+        """
+        Predict the conditional standard deviation on several independent inputs at once.
+
+        :param inputs: (list) Inputs (DataFrame or TimeseriesDT).
+        :return: (list of array) The standard deviation of each input.
+        """
+        return [
+            np.sqrt(np.maximum(0, conditional_variance))
+            for conditional_variance in super().predict_batch(inputs)
+        ]
+
+    def predict_chunk(self, inputs, state=None):
+        """
+        Predict the conditional standard deviation on a chunk of a longer timeseries.
+
+        :param inputs: Chunk of inputs, following the previous chunk in time.
+        :param state: State returned by the previous call, None for the first chunk.
+        :return: Tuple (standard deviation, state).
+        """
+        conditional_variance, state = super().predict_chunk(inputs, state)
+        conditional_variance = np.maximum(0, conditional_variance)
+
+        return np.sqrt(conditional_variance), state
+
+    def get_state(self):
+        """
+        Return the fitted state, with the conditional expectation model as a nested model (saved
+        once if it is also the timeseries model of a ClimaticCorrector).
+
+        The fitted model is saved by the model class mixed in after TimeseriesStdModel (e.g.
+        GradDelta). Without one, the settings are saved, with the fitted `model` if it supports
+        the compact model format.
+        """
+        base = self._get_state_base()
+        if base is None:
+            params = {
+                "formula": str(self.formula),
+                "by_instant": self.by_instant,
+                "time_step": getattr(self, "time_step", None),
+                "smoothers": getattr(self, "smoothers", None),
+                "model": self.model,
+                "status": getattr(self, "_status", 0),
+            }
+            arrays = {}
+        else:
+            params, arrays = base.get_state(self)
+        params = dict(params, conditional_expectation_model=self.conditional_expectation_model)
+        return params, arrays
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        params = dict(params)
+        conditional_expectation_model = params.pop("conditional_expectation_model")
+
+        # Rebuilt without calling __init__, whose arguments depend on the subclass
+        model = cls.__new__(cls)
+        base = cls._get_state_base()
+        if base is None:
+            model.formula = Formula(params["formula"])
+            model.by_instant = params["by_instant"]
+            model.time_step = params["time_step"]
+            model.smoothers = params["smoothers"]
+            model.model = params["model"]
+            model._status = params["status"]
+        else:
+            model.__dict__.update(base.from_state(params, arrays).__dict__)
+        model.conditional_expectation_model = conditional_expectation_model
+        return model
+
+    @classmethod
+    def _get_state_base(cls):
+        # First class mixed in after TimeseriesStdModel implementing the compact model format
+        mro = cls.__mro__
+        for base in mro[mro.index(TimeseriesStdModel) + 1 :]:
+            if base is TimeseriesModel:
+                return None
+            if "get_state" in vars(base):
+                return base
+        return None
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.climatic_corrector import ClimaticCorrector
+from corrclim.smoother import ExponentialSmoother, MultiSmoother
+from corrclim.timeseries_model.grad_delta import GradDelta
+
+N_DAYS = 40
+
+
+@pytest.fixture
+def hourly_data():
+    """
+    Hourly load depending on the temperature with a gradient varying with the hour of the day:
+    (outputs, observed weather, target weather).
+    """
+    rng = np.random.default_rng(0)
+    n = 24 * N_DAYS
+    time = pd.date_range("2020-01-01", periods=n, freq="h")
+    temperature = rng.normal(10, 5, n)
+    hour = np.arange(n) % 24
+    load = 100 - 3 * temperature * (1 + hour / 24) + rng.normal(0, 3, n)
+
+    outputs = pd.DataFrame({"time": time, "load": load})
+    weather = pd.DataFrame({"time": time, "temperature": temperature})
+    target = weather.assign(temperature=temperature + 2)
+    return outputs, weather, target
+
+
+@pytest.fixture
+def make_model():
+    """
+    Factory of gradient models fitted by hour of the day, with smoothed temperatures.
+    """
+
+    def make(**kwargs):
+        kwargs.setdefault("lm", "least squares")
+        kwargs.setdefault("granularity", "instant")
+        kwargs.setdefault(
+            "smoothers", MultiSmoother([ExponentialSmoother(alpha=0.3)], ["temperature"])
+        )
+        return GradDelta(**kwargs)
+
+    return make
+
+
+@pytest.fixture
+def corrector(hourly_data, make_model):
+    """
+    Climatic corrector fitted on the hourly data.
+    """
+    outputs, weather, _ = hourly_data
+    corrector = ClimaticCorrector(make_model(), None)
+    corrector.fit(outputs, weather)
+    return corrector
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from corrclim.bootstrap import (
+    P2Quantiles,
+    block_bootstrap_weights,
+    fit_predict_replicate,
+    get_blocks,
+)
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+def test_p2_quantiles_converge_to_numpy():
+    rng = np.random.default_rng(0)
+    observations = rng.normal(0, 1, (5000, 20))
+    probabilities = [0.05, 0.5, 0.95]
+    sketch = P2Quantiles(probabilities, 20)
+
+    # Exact while fewer than five observations were added
+    sketch.update(observations[:3])
+    np.testing.assert_allclose(
+        sketch.quantiles(), np.quantile(observations[:3], probabilities, axis=0).T
+    )
+
+    sketch.update(observations[3:])
+    expected = np.quantile(observations, probabilities, axis=0).T
+    np.testing.assert_allclose(sketch.quantiles(), expected, atol=0.05)
+
+
+def test_block_bootstrap_weights_are_reproducible():
+    blocks = np.repeat(np.arange(10), 24)
+    weights = block_bootstrap_weights(blocks, 5, np.random.default_rng(1))
+
+    np.testing.assert_array_equal(
+        weights, block_bootstrap_weights(blocks, 5, np.random.default_rng(1))
+    )
+    assert not np.array_equal(weights, block_bootstrap_weights(blocks, 5, np.random.default_rng(2)))
+    # Whole blocks are drawn, as many as there are blocks
+    assert np.all(weights.reshape(5, 10, 24) == weights.reshape(5, 10, 24)[..., :1])
+    np.testing.assert_array_equal(weights.sum(axis=1), len(blocks))
+
+
+def test_replicate_fits_match_explicit_resamples(hourly_data, make_model):
+    outputs, weather, target = hourly_data
+    model = make_model(N_min=5)
+    model.fit(outputs, weather)
+
+    X_fit = TimeseriesDT(outputs, is_output=True)
+    X_fit.merge(TimeseriesDT(weather))
+    X_fit = model.get_features(X_fit, is_fitting=True)
+    X_observed = model.get_features(TimeseriesDT(weather))
+    X_target = model.get_features(TimeseriesDT(target))
+
+    weights = block_bootstrap_weights(get_blocks(X_fit), 3, np.random.default_rng(0))
+    keys, gradients = model.fit_replicates(X_fit, weights)
+    for replicate, row_weights in enumerate(weights):
+        observed, predicted = fit_predict_replicate(row_weights, model, X_fit, X_observed, X_target)
+        np.testing.assert_allclose(
+            model.predict_replicates(keys, gradients, X_observed)[replicate], observed, rtol=1e-8
+        )
+        np.testing.assert_allclose(
+            model.predict_replicates(keys, gradients, X_target)[replicate], predicted, rtol=1e-8
+        )
+
+
+def test_p2_quantiles_reject_invalid_probabilities():
+    with pytest.raises(ValueError):
+        P2Quantiles([0.5, 1.0], 3)
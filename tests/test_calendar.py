@@ -0,0 +1,39 @@
+import gc
+
+import numpy as np
+import pandas as pd
+
+from corrclim.calendar import get_calendar_index
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+def test_instant_of_single_row_uses_series_step():
+    time = pd.date_range("2020-01-01", periods=48, freq="h")
+    X = TimeseriesDT(pd.DataFrame({"time": time, "a": np.arange(48.0)}))
+    chunk = X._with_timeseries(X.timeseries.iloc[[29]])
+
+    assert chunk.get_calendar().get_instant("day")[0] == 5
+    np.testing.assert_array_equal(
+        chunk.get_calendar().get_instant("week"), X.get_calendar().get_instant("week")[[29]]
+    )
+
+
+def test_instants_do_not_overflow_short_steps():
+    time = pd.Series(pd.date_range("2020-01-05 23:59:55", periods=2, freq="5s"))
+    instant = get_calendar_index(time).get_instant("week")
+
+    assert instant.dtype == np.int32
+    # Sunday 23:59:55 is the last of the 7 * 17280 five-second steps of the week
+    assert instant[0] == 7 * 17280 - 1
+    assert instant[1] == 0
+
+
+def test_calendar_is_kept_by_timeseries():
+    time = pd.date_range("2020-01-01", periods=24, freq="h")
+    X = TimeseriesDT(pd.DataFrame({"time": time, "a": np.arange(24.0)}))
+    calendar_id = id(X.get_calendar())
+    gc.collect()
+
+    assert id(X.get_calendar()) == calendar_id
+    X.timeseries = X.timeseries.assign(time=X.timeseries["time"] + pd.Timedelta("1h"))
+    assert X.get_calendar().get_instant("day")[0] == 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.climatic_corrector import ClimaticCorrector
+from corrclim.timeseries_dt import count_validations
+
+
+def _chunks(data, sizes):
+    start = 0
+    for size in sizes:
+        yield tuple(frame.iloc[start : start + size] for frame in data)
+        start += size
+
+
+@pytest.mark.parametrize("first_chunk", [1, 24])
+def test_stream_matches_apply(hourly_data, corrector, first_chunk):
+    outputs, weather, target = hourly_data
+    sizes = [first_chunk] + [1] * 30 + [len(outputs) - first_chunk - 30]
+
+    streamed = corrector.apply_stream(_chunks((outputs, weather, target), sizes))
+    streamed = pd.concat([chunk.timeseries for chunk in streamed], ignore_index=True)
+    applied = corrector.apply(outputs, weather, target).timeseries
+    pd.testing.assert_frame_equal(streamed, applied, rtol=1e-12)
+
+
+def test_stream_carries_step_without_fitted_step(hourly_data, corrector):
+    outputs, weather, target = hourly_data
+    # Models saved before the training step was recorded
+    del corrector.timeseries_model.time_step
+    sizes = [24] + [1] * (len(outputs) - 24)
+
+    streamed = corrector.apply_stream(_chunks((outputs, weather, target), sizes))
+    streamed = np.concatenate(
+        [chunk.timeseries["y_climate_corrected"].to_numpy() for chunk in streamed]
+    )
+    applied = corrector.apply(outputs, weather, target).timeseries["y_climate_corrected"].to_numpy()
+    np.testing.assert_allclose(streamed, applied, rtol=1e-12)
+
+
+@pytest.mark.parametrize("fitted_step", [True, False])
+def test_stream_with_shifted_variables_matches_apply(hourly_data, make_model, fitted_step):
+    outputs, weather, target = hourly_data
+    model = make_model(formula="y ~ temperature + temperature_shifted", n_shift=24, N_min=10)
+    corrector = ClimaticCorrector(model, None)
+    corrector.fit(outputs, weather)
+    if not fitted_step:
+        # The step is only known from the second row: the first rows are kept as context
+        del corrector.timeseries_model.time_step
+    sizes = [1] * 48 + [len(outputs) - 48]
+
+    streamed = corrector.apply_stream(_chunks((outputs, weather, target), sizes))
+    streamed = pd.concat([chunk.timeseries for chunk in streamed], ignore_index=True)
+    applied = corrector.apply(outputs, weather, target).timeseries
+    pd.testing.assert_frame_equal(streamed, applied, rtol=1e-12)
+
+
+def test_inputs_are_validated_once(hourly_data, make_model):
+    outputs, weather, target = hourly_data
+    corrector = ClimaticCorrector(make_model(), None)
+
+    with count_validations() as counts:
+        corrector.fit(outputs, weather)
+    assert counts["normalized"] == 2
+    assert counts["schema"] == 0
+
+    with count_validations() as counts:
+        corrector.apply(outputs, weather, target)
+    assert counts["normalized"] == 3
+    assert counts["schema"] == 0
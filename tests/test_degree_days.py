@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.degree_days import degree_days_bank, search_threshold, search_thresholds_pair
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+@pytest.fixture
+def daily_load():
+    rng = np.random.default_rng(0)
+    temperature = rng.uniform(-5, 30, 400)
+    y = (
+        50
+        + 4 * np.maximum(0, 14 - temperature)
+        + 2 * np.maximum(0, temperature - 21)
+        + rng.normal(0, 1, 400)
+    )
+    temperature[:3] = np.nan
+    return temperature, y
+
+
+def _brute_force_fit(columns, y):
+    # Least squares fit of y ~ 1 + columns on the rows without missing values
+    Z = np.column_stack([np.ones(len(y))] + columns)
+    valid = ~np.isnan(Z).any(axis=1)
+    coefs = np.linalg.lstsq(Z[valid], y[valid], rcond=None)[0]
+    residuals = y[valid] - Z[valid] @ coefs
+    return coefs, residuals @ residuals, np.linalg.matrix_rank(Z[valid]) == Z.shape[1]
+
+
+@pytest.mark.parametrize("kind", ["heating", "cooling"])
+def test_search_threshold_matches_brute_force(daily_load, kind):
+    temperature, y = daily_load
+    thresholds = np.arange(-10.0, 36.0, 0.5)
+    results = search_threshold(temperature, y, thresholds, kind)
+
+    for threshold, row in zip(thresholds, results.itertuples()):
+        if kind == "heating":
+            degree_days = degree_days_bank(temperature, thresholds_heating=[threshold])
+        else:
+            degree_days = degree_days_bank(temperature, thresholds_cooling=[threshold])
+        (degree_days,) = degree_days.values()
+        coefs, sse, _ = _brute_force_fit([degree_days], y)
+        if np.nanmax(degree_days) == 0:
+            # No degree days: the fit is the mean
+            coefs = [np.nanmean(y[~np.isnan(temperature)]), 0.0]
+        assert row.sse == pytest.approx(sse, rel=1e-8, abs=1e-6)
+        assert [row.intercept, row.slope] == pytest.approx(coefs, rel=1e-8, abs=1e-8)
+
+
+def test_search_thresholds_pair_matches_brute_force(daily_load):
+    temperature, y = daily_load
+    thresholds_heating = np.arange(-6.0, 32.0, 1.0)
+    thresholds_cooling = np.arange(-6.0, 32.0, 1.0)
+    results = search_thresholds_pair(temperature, y, thresholds_heating, thresholds_cooling)
+
+    for row in results.itertuples():
+        bank = degree_days_bank(temperature, [row.threshold_heating], [row.threshold_cooling])
+        coefs, sse, full_rank = _brute_force_fit(list(bank.values()), y)
+        assert row.sse == pytest.approx(sse, rel=1e-6, abs=1e-6)
+        if full_rank:
+            assert [row.intercept, row.slope_heating, row.slope_cooling] == pytest.approx(
+                coefs, rel=1e-6, abs=1e-6
+            )
+
+    # The best pair is the one of the brute-force search, near the simulated thresholds
+    data = pd.DataFrame(
+        {
+            "time": pd.date_range("2020-01-01", periods=len(y), freq="D"),
+            "temperature": temperature,
+            "y": y,
+        }
+    )
+    best = TimeseriesDT(data).search_degree_days_thresholds(
+        "temperature", "y", thresholds_heating, thresholds_cooling
+    )
+    assert best["sse"].iloc[0] == results["sse"].min()
+    assert (best["threshold_heating"].iloc[0], best["threshold_cooling"].iloc[0]) == (14.0, 21.0)
+
+
+def test_degree_days_bank_matches_compute_degree_days(daily_load):
+    temperature, _ = daily_load
+    data = pd.DataFrame(
+        {"time": pd.date_range("2020-01-01", periods=len(temperature), freq="D"), "t": temperature}
+    )
+    bank = TimeseriesDT(data).compute_degree_days_bank("t", [15, 16.5], [18], inplace=False)
+    single = TimeseriesDT(data).compute_degree_days("t", threshold_heating=16.5, inplace=False)
+    np.testing.assert_array_equal(bank.timeseries["HDD_16.5"], single.timeseries["HDD"])
+    np.testing.assert_array_equal(bank.timeseries["CDD_18"], single.timeseries["CDD"])
@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim import feature_cache
+from corrclim.feature_cache import FeatureCache
+from corrclim.smoother import ExponentialSmoother, MultiSmoother
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+def _frame(values):
+    time = pd.date_range("2020-01-01", periods=len(values), freq="h")
+    return pd.DataFrame({"time": time, "value": np.asarray(values, dtype=float)})
+
+
+def test_entries_are_addressed_by_content(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    data = _frame([1, 2, 3])
+    key = cache.make_key(data, "double", factor=2)
+
+    assert cache.make_key(data.copy(), "double", factor=2) == key
+    assert cache.make_key(_frame([1, 2, 4]), "double", factor=2) != key
+    assert cache.make_key(data, "double", factor=3) != key
+    assert cache.make_key(data, "triple", factor=2) != key
+
+    calls = []
+
+    def double(frame):
+        calls.append(len(frame))
+        return frame.assign(value=2 * frame["value"])
+
+    first = cache.get_or_compute(data, "double", double, factor=2)
+    second = cache.get_or_compute(data.copy(), "double", double, factor=2)
+    assert calls == [3]
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(second, data.assign(value=[2.0, 4.0, 6.0]))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, _frame(np.arange(100) + i))
+        os.utime(os.path.join(cache.root, key, feature_cache.META_FILE), (i, i))
+    size = max(size for _, size, _ in cache.entries())
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    cache.evict(max_bytes=2 * size)
+    assert [key for key, _, _ in cache.entries()] == ["c", "a"]
+    assert cache.get("b") is None
+
+
+def test_entries_are_published_by_rename(tmp_path, monkeypatch):
+    cache = FeatureCache(str(tmp_path))
+    data = _frame([1, 2, 3]).assign(label=["x", "y", "z"])
+
+    # A failed write leaves neither the entry nor its temporary directory
+    with pytest.raises(ValueError):
+        cache.put("key", data)
+    assert "key" not in cache
+    assert os.listdir(cache.root) == []
+
+    # Another process publishing the same entry first wins the rename
+    rename = os.rename
+
+    def publish_first(source, destination):
+        monkeypatch.setattr(feature_cache.os, "rename", rename)
+        FeatureCache(str(tmp_path)).put("key", _frame([4, 5, 6]))
+        rename(source, destination)
+
+    monkeypatch.setattr(feature_cache.os, "rename", publish_first)
+    cache.put("key", _frame([1, 2, 3]))
+    pd.testing.assert_frame_equal(cache.get("key"), _frame([4, 5, 6]))
+    assert os.listdir(cache.root) == ["key"]
+
+
+def test_model_features_are_cached(tmp_path, hourly_data, make_model, monkeypatch):
+    outputs, weather, target = hourly_data
+    model = make_model(formula="y ~ temperature + temperature_shifted", n_shift=24)
+    model.fit(outputs, weather)
+    expected = model.predict(TimeseriesDT(target))
+
+    model.feature_cache = FeatureCache(str(tmp_path))
+    np.testing.assert_allclose(model.predict(TimeseriesDT(target)), expected)
+    assert len(model.feature_cache.entries()) == 1
+
+    # The second prediction reads the smoothed, shifted and instant features from the cache
+    def fail(*args):
+        raise AssertionError("Features recomputed")
+
+    monkeypatch.setattr(model, "_compute_features", fail)
+    np.testing.assert_allclose(model.predict(TimeseriesDT(target)), expected)
+    monkeypatch.undo()
+
+    # Other smoothers give other features
+    other = make_model(
+        formula="y ~ temperature + temperature_shifted",
+        n_shift=24,
+        smoothers=MultiSmoother([ExponentialSmoother(alpha=0.5)], ["temperature"]),
+    )
+    other.fit(outputs, weather)
+    other_expected = other.predict(TimeseriesDT(target))
+    other.feature_cache = model.feature_cache
+    np.testing.assert_allclose(other.predict(TimeseriesDT(target)), other_expected)
+    assert len(model.feature_cache.entries()) == 2
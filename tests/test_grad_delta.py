@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+N_DAYS = 40
+FORMULA = "y ~ temperature + temperature_shifted"
+
+
+def _split(data, n):
+    return data.iloc[:n], data.iloc[n:]
+
+
+@pytest.mark.parametrize("formula, n_shift", [(FORMULA, 24), ("y ~ temperature_shifted", 0)])
+def test_partial_fit_after_fit_matches_refit(hourly_data, make_model, formula, n_shift):
+    outputs, weather, _ = hourly_data
+    split = 24 * 25
+    out_a, out_b = _split(outputs, split)
+    weather_a, weather_b = _split(weather, split)
+
+    refit = make_model(formula=formula, n_shift=n_shift, N_min=10, smoothers=None)
+    refit.fit(outputs, weather)
+    updated = make_model(formula=formula, n_shift=n_shift, N_min=10, smoothers=None)
+    updated.fit(out_a, weather_a)
+    updated.partial_fit(out_b, weather_b)
+
+    pd.testing.assert_frame_equal(
+        updated.gradients, refit.gradients, rtol=1e-8, check_index_type=False
+    )
+
+
+def test_partial_fit_aligns_shifted_values_by_time(hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    split = 24 * 25
+    out_a, out_b = _split(outputs, split)
+    weather_a, weather_b = _split(weather, split)
+
+    with_gap = make_model(formula=FORMULA, n_shift=24, N_min=10, smoothers=None)
+    with_gap.fit(out_a, weather_a)
+    with_gap.partial_fit(out_b.iloc[5:], weather_b.iloc[5:])
+
+    # Same as observations received without gap, but missing over the gap
+    missing = weather_b.copy()
+    missing.iloc[:5, 1] = np.nan
+    without_gap = make_model(formula=FORMULA, n_shift=24, N_min=10, smoothers=None)
+    without_gap.fit(out_a, weather_a)
+    without_gap.partial_fit(out_b, missing)
+
+    pd.testing.assert_frame_equal(with_gap.gradients, without_gap.gradients, rtol=1e-12)
+    with pytest.raises(ValueError):
+        with_gap.partial_fit(out_b, weather_b)
+
+
+def test_fit_by_instant_matches_fits_on_each_instant(hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    model = make_model(smoothers=None, N_min=10)
+    model.fit(outputs, weather)
+
+    data = outputs.rename(columns={"load": "y"}).merge(weather, on="time")
+    data["instant"] = data["time"].dt.hour
+    expected = data.groupby("instant")[["y", "temperature"]].apply(model._fit_and_extract_coefs)
+    pd.testing.assert_frame_equal(model.gradients, expected, rtol=1e-10, check_index_type=False)
+
+
+def test_robust_partial_fit_continues_from_the_fit(hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    split = 24 * 30
+    out_a, out_b = _split(outputs, split)
+    weather_a, weather_b = _split(weather, split)
+
+    model = make_model(lm="robust", N_min=10, smoothers=None)
+    model.fit(out_a, weather_a)
+    fitted = model.gradients.copy()
+    assert model.online_statistics is None
+
+    # New rows of the first hours only: the other instants keep their batch gradients
+    model.partial_fit(out_b.iloc[:3], weather_b.iloc[:3])
+    pd.testing.assert_frame_equal(model.gradients.iloc[3:], fitted.iloc[3:], check_index_type=False)
+    np.testing.assert_allclose(model.gradients.iloc[:3], fitted.iloc[:3], rtol=0.05)
+
+
+def test_partial_fit_with_forgetting_matches_weighted_fit(hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    split = 24 * 25
+    forgetting = 0.9
+    model = make_model(N_min=5, smoothers=None, forgetting=forgetting)
+    model.fit(outputs.iloc[:split], weather.iloc[:split])
+    model.partial_fit(outputs.iloc[split:], weather.iloc[split:])
+
+    # Each observation weighs forgetting ** (number of later observations of its instant)
+    hour = np.arange(len(outputs)) % 24
+    age = (len(outputs) - 1 - np.arange(len(outputs))) // 24
+    Z = np.column_stack([np.ones(len(outputs)), weather["temperature"]])
+    y = outputs["load"].to_numpy()
+    for instant in range(24):
+        rows = hour == instant
+        sqrt_weights = np.sqrt(forgetting ** age[rows])[:, None]
+        coefs = np.linalg.lstsq(Z[rows] * sqrt_weights, y[rows] * sqrt_weights[:, 0], rcond=None)[0]
+        assert model.gradients.loc[instant, "temperature"] == pytest.approx(coefs[1], rel=1e-8)
+
+
+def test_partial_fit_window_keeps_the_last_updates(hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    a, b, c = 24 * 20, 24 * 30, 24 * N_DAYS
+    model = make_model(N_min=5, smoothers=None, window=2)
+    model.fit(outputs.iloc[:a], weather.iloc[:a])
+    model.partial_fit(outputs.iloc[a:b], weather.iloc[a:b])
+    model.partial_fit(outputs.iloc[b:c], weather.iloc[b:c])
+
+    # The fitted rows were the oldest of three updates
+    refit = make_model(N_min=5, smoothers=None)
+    refit.fit(outputs.iloc[a:c], weather.iloc[a:c])
+    pd.testing.assert_frame_equal(
+        model.gradients, refit.gradients, rtol=1e-8, check_index_type=False
+    )
+
+
+def _filter_instant(data, threshold, q_min, q_max, IC_width):
+    # Filter of a single instant: thresholds, then outliers of the quantile range
+    kept = data[
+        (data["temperature"] <= threshold)
+        & (data["temperature"] - data["temperature_shifted"] <= threshold)
+    ]
+    y_min, y_max = kept["y"].quantile(q_min), kept["y"].quantile(q_max)
+    width = IC_width * (y_max - y_min)
+    return kept[(kept["y"] > y_min - width) & (kept["y"] < y_max + width)]
+
+
+def test_fit_with_row_filter_matches_fits_on_filtered_instants(hourly_data, make_model, tmp_path):
+    outputs, weather, _ = hourly_data
+    thresholds = {hour: 10.0 + hour % 4 for hour in range(24)}
+    row_filter = {
+        "y_shifted": "y",
+        "var": "temperature",
+        "var_shifted": "temperature_shifted",
+        "threshold": thresholds,
+        "q_min": 0.1,
+        "q_max": 0.9,
+        "IC_width": 0.2,
+    }
+    model = make_model(formula=FORMULA, n_shift=24, N_min=5, smoothers=None, row_filter=row_filter)
+    model.fit(outputs, weather)
+
+    data = outputs.rename(columns={"load": "y"}).merge(weather, on="time")
+    data["instant"] = data["time"].dt.hour
+    data["temperature_shifted"] = data["temperature"].shift(24)
+    filtered = {
+        hour: _filter_instant(group, thresholds[hour], 0.1, 0.9, 0.2)
+        for hour, group in data.groupby("instant")
+    }
+    assert sum(len(rows) for rows in filtered.values()) < data["temperature_shifted"].count()
+    expected = pd.DataFrame(
+        {hour: model._fit_and_extract_coefs(rows) for hour, rows in filtered.items()}
+    ).T
+    np.testing.assert_allclose(model.gradients.to_numpy(), expected.to_numpy(), rtol=1e-10)
+
+    # Thresholds by instant are saved with the model
+    model.save(str(tmp_path / "model"))
+    loaded = type(model).load(str(tmp_path / "model"))
+    assert loaded.row_filter["threshold"].to_dict() == thresholds
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from corrclim.lags import LagFeatures
+
+
+def _buffer(column):
+    # Values of the column without copy, also for timezone-aware times
+    if isinstance(column.dtype, pd.DatetimeTZDtype):
+        return column.array.view("i8")
+    return column.to_numpy()
+
+
+def test_join_shares_memory():
+    n = 100
+    data = pd.DataFrame(
+        {
+            "time": pd.date_range("2020-01-01", periods=n, freq="h", tz="Europe/Paris"),
+            "a": np.arange(n, dtype=float),
+            "b": np.arange(n, dtype=float) * 2,
+            "label": ["x"] * n,
+        }
+    )
+    lags = LagFeatures(data, ["a", "b"], [1, 24])
+    joined = lags.join(data)
+
+    pd.testing.assert_frame_equal(joined[data.columns], data)
+    for (var, lag), name in lags.names().items():
+        assert np.shares_memory(joined[name].to_numpy(), lags.get(var, lag))
+        pd.testing.assert_series_equal(joined[name], data[var].shift(lag), check_names=False)
+    for name in ["time", "a", "b"]:
+        assert np.shares_memory(_buffer(joined[name]), _buffer(data[name]))
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.operator import Operator
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+class OperatorRatio(Operator):
+    # Third-party operator implementing `apply_fun` only
+    def apply_fun(
+        self, timeseries, y_pred_observed, y_pred_target, y_std_observed=None, y_std_target=None
+    ):
+        timeseries_df = timeseries.get_timeseries()
+        timeseries_df["y_climate_corrected"] = timeseries_df["y"] * y_pred_target / y_pred_observed
+        return TimeseriesDT(timeseries_df)
+
+
+def test_operator_implementing_apply_fun_only():
+    time = pd.date_range("2020-01-01", periods=3, freq="h")
+    timeseries = TimeseriesDT(pd.DataFrame({"time": time, "y": [1.0, 2.0, 3.0]}))
+    operator = OperatorRatio()
+
+    corrected = operator.apply(timeseries, np.ones(3), np.full(3, 2.0))
+    np.testing.assert_allclose(corrected.timeseries["y_climate_corrected"], [2.0, 4.0, 6.0])
+    with pytest.raises(NotImplementedError):
+        operator.correct(np.ones(3), np.ones(3), np.ones(3))
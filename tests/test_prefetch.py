@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.prefetch import ScenarioPrefetcher, _memory_usage
+from corrclim.timeseries_dt import TimeseriesDT
+
+
+def _scenario(i, n=48):
+    time = pd.date_range("2020-01-01", periods=n, freq="h")
+    return pd.DataFrame({"time": time, "temperature": np.full(n, float(i))})
+
+
+class Sources:
+    # Scenario numbers, counting how many were taken by the prefetcher
+    def __init__(self, n):
+        self.n = n
+        self.taken = 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            self.taken += 1
+            yield i
+
+
+def _slow_loader(i):
+    # Later scenarios are read faster, so that loads finish out of order
+    time.sleep(0.02 * (5 - i % 5))
+    return TimeseriesDT(_scenario(i))
+
+
+def test_scenarios_are_yielded_in_order():
+    prefetcher = ScenarioPrefetcher(range(10), loader=_slow_loader, n_prefetch=4)
+    for expected, (source, weather) in enumerate(prefetcher):
+        assert source == expected
+        assert (weather.timeseries["temperature"] == expected).all()
+
+
+@pytest.mark.parametrize("budget, ahead", [(1.5, 1), (10, 4)])
+def test_memory_budget_bounds_scenarios_loaded_ahead(budget, ahead):
+    size = _memory_usage(TimeseriesDT(_scenario(0)))
+    sources = Sources(10)
+
+    def loader(i):
+        # Loads still running when the next ones are submitted, their size unknown
+        time.sleep(0.01)
+        return TimeseriesDT(_scenario(i))
+
+    prefetcher = ScenarioPrefetcher(sources, loader=loader, n_prefetch=4, max_bytes=budget * size)
+
+    loaded_ahead = []
+    for consumed, _ in enumerate(prefetcher, start=1):
+        loaded_ahead.append(sources.taken - consumed)
+    assert max(loaded_ahead) == ahead
+
+
+def test_loading_errors_reach_the_caller():
+    def loader(i):
+        if i == 2:
+            raise ValueError("Unreadable scenario 2")
+        return TimeseriesDT(_scenario(i))
+
+    yielded = []
+    with pytest.raises(ValueError, match="scenario 2"):
+        for source, _ in ScenarioPrefetcher(range(5), loader=loader):
+            yielded.append(source)
+    assert yielded == [0, 1]
+
+
+def test_apply_scenarios_matches_apply(hourly_data, corrector):
+    outputs, weather, target = hourly_data
+    scenarios = [target.assign(temperature=target["temperature"] + shift) for shift in range(3)]
+
+    results = list(corrector.apply_scenarios(outputs, weather, scenarios, loader=TimeseriesDT))
+    assert len(results) == len(scenarios)
+    for (scenario, corrected), expected in zip(results, scenarios):
+        assert scenario is expected
+        pd.testing.assert_frame_equal(
+            corrected.timeseries, corrector.apply(outputs, weather, scenario).timeseries
+        )
+
+    def fail(scenario):
+        raise OSError("Scenario not found")
+
+    with pytest.raises(OSError, match="not found"):
+        list(corrector.apply_scenarios(outputs, weather, scenarios, loader=fail))
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim import serialization
+from corrclim.climatic_corrector import ClimaticCorrector
+from corrclim.timeseries_model.gam import GAM
+from corrclim.timeseries_model.grad_delta import GradDelta
+from corrclim.timeseries_model.timeseries_model import TimeseriesModel
+from corrclim.timeseries_std_model import TimeseriesStdModel
+
+
+class GradDeltaStd(TimeseriesStdModel, GradDelta):
+    def __init__(self, conditional_expectation_model, **kwargs):
+        GradDelta.__init__(self, **kwargs)
+        self.conditional_expectation_model = conditional_expectation_model
+
+
+class Transformation:
+    def __init__(self, function):
+        self.function = function
+
+    def get_state(self):
+        return {"function": self.function}, {}
+
+    @classmethod
+    def from_state(cls, params, arrays):
+        return cls(params["function"])
+
+
+def test_corrector_round_trip(tmp_path, hourly_data, make_model):
+    outputs, weather, target = hourly_data
+    weather = weather.assign(fold=np.arange(len(weather)) // (24 * 10))
+    target = target.assign(fold=weather["fold"])
+    model = make_model()
+    corrector = ClimaticCorrector(model, GradDeltaStd(model, lm="least squares", N_min=10))
+    corrector.fit(outputs, weather, fold_varname="fold")
+
+    corrector.save(str(tmp_path))
+    loaded = ClimaticCorrector.load(str(tmp_path))
+
+    assert type(loaded.timeseries_std_model) is GradDeltaStd
+    assert loaded.timeseries_std_model.conditional_expectation_model is loaded.timeseries_model
+    pd.testing.assert_frame_equal(
+        loaded.apply(outputs, weather, target).timeseries,
+        corrector.apply(outputs, weather, target).timeseries,
+    )
+
+
+def test_std_model_round_trip_without_mixed_in_model(tmp_path):
+    model = TimeseriesStdModel("y ~ temperature", False, None, GradDelta(lm="least squares"))
+    serialization.save_state(model, str(tmp_path))
+    loaded = serialization.load_state(str(tmp_path))
+
+    assert str(loaded.formula) == "y ~ temperature"
+    assert isinstance(loaded.conditional_expectation_model, GradDelta)
+
+
+def test_save_removes_previous_payloads(tmp_path, hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    model = make_model(smoothers=None)
+    model.fit(outputs, weather)
+    model.save(str(tmp_path))
+    assert os.path.exists(tmp_path / "gradients.npy")
+
+    GradDelta().save(str(tmp_path))
+    assert not any(name.endswith(".npy") for name in os.listdir(tmp_path))
+    assert TimeseriesModel.load(str(tmp_path)).gradients is None
+
+
+def test_object_index_round_trip(tmp_path, hourly_data, make_model):
+    outputs, weather, _ = hourly_data
+    model = make_model(smoothers=None)
+    model.fit(outputs, weather)
+    model.gradients.index = model.gradients.index.astype(object)
+    model.save(str(tmp_path))
+
+    loaded = TimeseriesModel.load(str(tmp_path))
+    np.testing.assert_array_equal(loaded.gradients.index, model.gradients.index)
+    np.testing.assert_array_equal(loaded.gradients, model.gradients)
+
+
+def test_lambda_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="module level"):
+        serialization.save_state(Transformation(lambda x: x), str(tmp_path))
+    serialization.save_state(Transformation(np.log1p), str(tmp_path))
+    assert serialization.load_state(str(tmp_path)).function is np.log1p
+
+
+@pytest.mark.parametrize("by_instant", [True, False])
+def test_gam_round_trip(tmp_path, hourly_data, by_instant):
+    outputs, weather, target = hourly_data
+    model = GAM(
+        "y ~ s(temperature, n_splines=8) + s(posan, n_splines=5) + jour_semaine",
+        by_instant=by_instant,
+    )
+    model.fit(outputs, weather)
+    model.save(str(tmp_path))
+    loaded = TimeseriesModel.load(str(tmp_path))
+
+    assert type(loaded) is GAM
+    prediction = model.predict(target)
+    assert not np.isnan(prediction).any()
+    np.testing.assert_array_equal(loaded.predict(target), prediction)
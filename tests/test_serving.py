@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from loguru import logger
+
+from corrclim.serving import ScoringServer
+
+
+class RecordingCorrector:
+    # Corrector recording the number of requests of each batch
+    def __init__(self, corrector):
+        self.corrector = corrector
+        self.batches = []
+
+    def apply_batch(self, requests):
+        self.batches.append(len(requests))
+        return self.corrector.apply_batch(requests)
+
+    def apply(self, *request):
+        return self.corrector.apply(*request)
+
+
+def _requests(data, n_requests):
+    size = len(data[0]) // n_requests
+    return [
+        tuple(frame.iloc[i * size : (i + 1) * size] for frame in data) for i in range(n_requests)
+    ]
+
+
+def _assert_corrected(result, corrector, request):
+    np.testing.assert_allclose(
+        result.timeseries["y_climate_corrected"],
+        corrector.apply(*request).timeseries["y_climate_corrected"],
+        rtol=1e-12,
+    )
+
+
+def test_concurrent_requests_match_apply(hourly_data, corrector):
+    requests = _requests(hourly_data, 20)
+
+    server = ScoringServer(corrector, max_batch_size=8, max_wait=0.01)
+    with server, ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda request: server.apply(*request, timeout=60), requests))
+
+    assert server.n_requests == len(requests)
+    for request, result in zip(requests, results):
+        _assert_corrected(result, corrector, request)
+
+
+def test_requests_are_coalesced_in_batches(hourly_data, corrector):
+    recording = RecordingCorrector(corrector)
+    requests = _requests(hourly_data, 10)
+
+    # A batch is closed when full, the last one when its first request has waited max_wait
+    with ScoringServer(recording, max_batch_size=4, max_wait=1) as server:
+        futures = [server.submit(*request) for request in requests]
+        results = [future.result(timeout=60) for future in futures]
+
+    assert recording.batches == [4, 4, 2]
+    for request, result in zip(requests, results):
+        _assert_corrected(result, corrector, request)
+
+
+def test_partial_batch_is_flushed_after_max_wait(hourly_data, corrector):
+    recording = RecordingCorrector(corrector)
+    request = _requests(hourly_data, 10)[0]
+
+    with ScoringServer(recording, max_batch_size=100, max_wait=0.05) as server:
+        start = time.monotonic()
+        result = server.apply(*request, timeout=60)
+        elapsed = time.monotonic() - start
+
+    assert recording.batches == [1]
+    assert elapsed >= 0.05
+    _assert_corrected(result, corrector, request)
+
+
+def test_failed_batch_is_retried_one_by_one(hourly_data, corrector):
+    recording = RecordingCorrector(corrector)
+    requests = _requests(hourly_data, 4)
+    timeseries, observed, target = requests[2]
+    requests[2] = (timeseries, observed, target.rename(columns={"temperature": "t"}))
+
+    errors = []
+    sink = logger.add(errors.append, level="ERROR")
+    try:
+        with ScoringServer(recording, max_batch_size=4, max_wait=1) as server:
+            futures = [server.submit(*request) for request in requests]
+            for future in futures:
+                future.exception(timeout=60)
+    finally:
+        logger.remove(sink)
+
+    assert recording.batches == [4]
+    with pytest.raises(ValueError, match="temperature"):
+        futures[2].result()
+    for i in (0, 1, 3):
+        _assert_corrected(futures[i].result(), corrector, requests[i])
+    # The failure of the batch, then the one of the invalid request
+    assert len(errors) == 2
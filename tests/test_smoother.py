@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.smoother import ExponentialSmoother
+
+
+@pytest.fixture
+def hourly_values():
+    rng = np.random.default_rng(0)
+    time = pd.date_range("2020-01-01", periods=24 * 30, freq="h")
+    data = pd.DataFrame({"time": time, "a": rng.normal(size=len(time)), "b": np.arange(len(time))})
+    data.loc[rng.choice(len(data), 40, replace=False), "a"] = np.nan
+    # Missing days, and a time of day missing for some days
+    day, hour = data["time"].dt.day, data["time"].dt.hour
+    missing = day.isin([5, 6]) | ((hour == 3) & (day < 10))
+    return data[~missing].reset_index(drop=True)
+
+
+def _smoother(data):
+    smoother = ExponentialSmoother(N=5, granularity="days", value_column=["a", "b"])
+    smoother.fit(data)
+    return smoother
+
+
+def test_days_mode_matches_ewm_by_time_of_day(hourly_values):
+    smoothed = _smoother(hourly_values).smooth(hourly_values)
+
+    expected = hourly_values.copy()
+    for column in ["a", "b"]:
+        expected[column] = hourly_values.groupby(hourly_values["time"].dt.time)[column].transform(
+            lambda values: values.ewm(span=5, adjust=False, ignore_na=True).mean()
+        )
+    pd.testing.assert_frame_equal(smoothed, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 24, 50, 1000])
+def test_days_mode_chunks_match_whole_series(hourly_values, chunk_size):
+    smoother = _smoother(hourly_values)
+    expected = smoother.smooth(hourly_values)
+
+    chunks, state = [], None
+    for start in range(0, len(hourly_values), chunk_size):
+        chunk, state = smoother.smooth_chunk(hourly_values.iloc[start : start + chunk_size], state)
+        chunks.append(chunk)
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from corrclim.timeseries_dt import TimeseriesDT
+
+# Always on from pandas 3
+COPY_ON_WRITE = (
+    int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+)
+
+
+@pytest.fixture
+def timeseries():
+    rng = np.random.default_rng(0)
+    time = pd.date_range("2020-01-01", periods=24 * 70, freq="h")
+    return TimeseriesDT(
+        pd.DataFrame({"time": time, "y": rng.normal(size=len(time)), "x": np.arange(len(time))})
+    )
+
+
+def _aggregate_by_groupby(X, granularity):
+    # Aggregation function unknown to the rollup: computed by grouping the rows
+    return X.aggregate(granularity, func=lambda values: values.mean(), inplace=False).timeseries
+
+
+@pytest.mark.parametrize("granularity", ["hour", "day", "week", "month", "year"])
+def test_rollup_matches_aggregate(timeseries, granularity):
+    rollup = timeseries.rollup(granularity)
+    expected = _aggregate_by_groupby(timeseries, granularity)
+
+    np.testing.assert_allclose(rollup[["y", "x"]].to_numpy(), expected[["y", "x"]].to_numpy())
+    assert (pd.DatetimeIndex(rollup["time"]) == pd.DatetimeIndex(expected["time"])).all()
+
+
+def test_rollup_follows_in_place_edits(timeseries):
+    before = timeseries.rollup("day")
+    timeseries.timeseries["y"] += 1000
+    np.testing.assert_allclose(timeseries.rollup("day")["y"], before["y"] + 1000)
+
+    timeseries.timeseries.loc[0, "x"] = -24.0
+    np.testing.assert_allclose(
+        timeseries.rollup("day")["x"], _aggregate_by_groupby(timeseries, "day")["x"]
+    )
+    assert timeseries.rollup("day")["x"].iloc[0] == before["x"].iloc[0] - 1
+
+
+def test_wrapping_shares_data(timeseries):
+    wrapper = TimeseriesDT(timeseries)
+    assert wrapper.timeseries is not timeseries.timeseries
+    assert np.shares_memory(
+        wrapper.timeseries["y"].to_numpy(), timeseries.timeseries["y"].to_numpy()
+    )
+
+    # Columns added or replaced on a wrapper stay on it
+    wrapper.assign("z", 1.0)
+    wrapper.timeseries["x"] = 0
+    assert list(timeseries.timeseries.columns) == ["time", "y", "x"]
+    assert timeseries.timeseries["x"].iloc[1] == 1
+
+
+def test_in_place_edits_reach_wrappers_without_copy_on_write(timeseries):
+    wrapper = TimeseriesDT(timeseries)
+    independent = TimeseriesDT(timeseries.get_timeseries())
+    y = timeseries.timeseries["y"].to_numpy().copy()
+
+    timeseries.timeseries["y"] += 1
+    np.testing.assert_array_equal(wrapper.timeseries["y"], y if COPY_ON_WRITE else y + 1)
+    np.testing.assert_array_equal(independent.timeseries["y"], y)
+
+
+@pytest.mark.parametrize("granularity", ["hour", "wday", "week", "month"])
+def test_groupby_matches_pandas(timeseries, granularity):
+    time = timeseries.timeseries["time"].dt
+    keys = {
+        "hour": time.hour,
+        "wday": time.weekday,
+        "week": time.isocalendar().week,
+        "month": time.month,
+    }[granularity]
+    expected = timeseries.timeseries[["y", "x"]].groupby(keys.to_numpy()).median()
+
+    grouped = timeseries.groupby(granularity, func=lambda values: values.median())
+    np.testing.assert_array_equal(grouped["time"], expected.index)
+    np.testing.assert_allclose(grouped[["y", "x"]], expected)
+
+
+def test_groups_of_instants_are_precomputed(timeseries):
+    timeseries.compute_instant("week")
+    labels, order, offsets = timeseries.get_groups("instant")
+
+    assert labels is timeseries.get_calendar().get_groups("instant_week")[0]
+    instant = timeseries.timeseries["instant"].to_numpy()
+    np.testing.assert_array_equal(labels, np.unique(instant))
+    for label, start, end in zip(labels, offsets[:-1], offsets[1:]):
+        np.testing.assert_array_equal(order[start:end], np.flatnonzero(instant == label))
+
+
+def test_rollup_computes_several_functions_at_once(timeseries):
+    funcs = ["mean", "sum", "count", "min", "max", "std", "var"]
+    rollup = timeseries.rollup("week", funcs)
+
+    data = timeseries.timeseries
+    week = data["time"].dt.to_period("W").dt.start_time.to_numpy()
+    expected = data[["y", "x"]].groupby(week).agg(funcs)
+    np.testing.assert_array_equal(rollup["time"], expected.index)
+    for var in ["y", "x"]:
+        for func in funcs:
+            np.testing.assert_allclose(rollup[f"{var}_{func}"], expected[(var, func)], rtol=1e-9)
+
+
+@pytest.mark.parametrize(
+    "granularity, func, name", [("wday", np.mean, "mean"), ("month", np.max, "max")]
+)
+def test_profiles_match_pandas(timeseries, granularity, func, name):
+    time = timeseries.timeseries["time"].dt
+    keys = time.weekday if granularity == "wday" else time.month
+    expected = timeseries.timeseries[["y", "x"]].groupby(keys.to_numpy()).agg(name)
+
+    grouped = timeseries.groupby(granularity, func)
+    np.testing.assert_array_equal(grouped["time"], expected.index)
+    np.testing.assert_allclose(grouped[["y", "x"]], expected)
+
+
+def test_rollup_is_reused_until_the_data_changes(timeseries):
+    pyramid = timeseries.get_rollup()
+    timeseries.rollup("day")
+    timeseries.groupby("hour")
+    timeseries.aggregate("month", inplace=False)
+    assert timeseries.get_rollup() is pyramid
+
+    timeseries.assign("z", 1.0)
+    assert timeseries.get_rollup() is not pyramid
+    pyramid = timeseries.get_rollup()
+
+    # Handed out frames may be edited in place
+    timeseries.timeseries.head()
+    assert timeseries.get_rollup() is not pyramid
+
+
+def test_filter_by_group_matches_filters_of_each_group():
+    rng = np.random.default_rng(0)
+    n = 24 * 60
+    data = pd.DataFrame(
+        {
+            "time": pd.date_range("2020-01-01", periods=n, freq="h"),
+            "y": rng.normal(0, 1, n),
+            "x": rng.normal(10, 5, n),
+            "x_shifted": rng.normal(10, 5, n),
+            "group": np.arange(n) % 3,
+        }
+    )
+    thresholds = {0: 8.0, 1: 10.0, 2: 12.0}
+    X = TimeseriesDT(data)
+    filtered = X.filter_dataset(
+        "y", "x", "x_shifted", thresholds, IC_width=0.1, inplace=False, by="group"
+    )
+
+    expected = pd.concat(
+        [
+            TimeseriesDT(group)
+            .filter_dataset("y", "x", "x_shifted", thresholds[key], IC_width=0.1, inplace=False)
+            .timeseries
+            for key, group in data.groupby("group")
+        ]
+    ).sort_index()
+    assert 0 < len(expected) < n
+    pd.testing.assert_frame_equal(filtered.timeseries, expected)
+
+    mask = X.filter_rows("y", "x", "x_shifted", thresholds, by="group", IC_width=0.1, as_mask=True)
+    np.testing.assert_array_equal(np.flatnonzero(mask), data.index.get_indexer(expected.index))
+
+
+def _frames():
+    rng = np.random.default_rng(0)
+    time = pd.date_range("2020-01-01", periods=100, freq="h")
+    left = pd.DataFrame({"time": time, "x": rng.normal(size=100), "y": np.arange(100)})
+    # Gaps, extra timestamps and a column in common
+    right_time = time[5:120:2].append(pd.date_range("2020-01-06", periods=10, freq="h"))
+    right = pd.DataFrame(
+        {"time": right_time, "x": rng.normal(size=len(right_time)), "z": np.arange(len(right_time))}
+    )
+    return left, right
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "outer"])
+def test_merge_matches_pandas(how):
+    left, right = _frames()
+    merged = TimeseriesDT(left).merge(TimeseriesDT(right), how=how, inplace=False)
+    expected = pd.merge(left, right, on="time", how=how, suffixes=(".x", ".y"))
+    pd.testing.assert_frame_equal(merged.timeseries, expected)
+
+
+def test_merge_with_duplicated_timestamps_matches_pandas():
+    left, right = _frames()
+    right = pd.concat([right, right.iloc[:5]]).sort_values("time", kind="stable")
+    merged = TimeseriesDT(left).merge(TimeseriesDT(right), inplace=False)
+    expected = pd.merge(left, right, on="time", suffixes=(".x", ".y"))
+    pd.testing.assert_frame_equal(merged.timeseries, expected)
+
+
+def test_merge_of_different_time_steps():
+    left, _ = _frames()
+    daily = pd.DataFrame({"time": pd.date_range("2020-01-01", periods=5, freq="D"), "d": 1.0})
+    merged = TimeseriesDT(left).merge(TimeseriesDT(daily), how="left", inplace=False)
+    pd.testing.assert_frame_equal(merged.timeseries, pd.merge(left, daily, on="time", how="left"))
+    with pytest.raises(ValueError, match="time steps"):
+        TimeseriesDT(left).align(TimeseriesDT(daily))
+
+
+def test_align_gathers_rows_by_time():
+    left, right = _frames()
+    other = pd.concat(
+        [left.iloc[::-1], left.iloc[:3].assign(time=left["time"].iloc[:3] - pd.Timedelta("1D"))]
+    )
+    other = other.sort_values("time").assign(w=lambda data: data["y"] * 2.0)
+
+    (aligned,) = TimeseriesDT(left).align(TimeseriesDT(other))
+    pd.testing.assert_frame_equal(aligned.timeseries, left.assign(w=left["y"] * 2.0))
+    with pytest.raises(ValueError, match="missing"):
+        TimeseriesDT(left).align(TimeseriesDT(right))
+
+
+@pytest.mark.parametrize("direction", ["backward", "forward", "nearest"])
+@pytest.mark.parametrize("tolerance", [None, "40min"])
+def test_merge_asof_matches_pandas(direction, tolerance):
+    left, _ = _frames()
+    time = pd.date_range("2019-12-31 23:00", periods=70, freq="100min")
+    right = pd.DataFrame({"time": time, "x": np.arange(70.0), "z": np.arange(70)})
+
+    merged = TimeseriesDT(left).merge_asof(
+        TimeseriesDT(right), direction=direction, tolerance=tolerance, inplace=False
+    )
+    expected = pd.merge_asof(
+        left,
+        right,
+        on="time",
+        direction=direction,
+        tolerance=None if tolerance is None else pd.Timedelta(tolerance),
+        suffixes=(".x", ".y"),
+    )
+    pd.testing.assert_frame_equal(merged.timeseries, expected)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from corrclim.timeseries_model.gam import GAM
+from corrclim.timeseries_model.timeseries_model import FEATURES_COPIES
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 24 * 40 - 1])
+def test_chunked_predict_matches_predict(hourly_data, make_model, chunk_size):
+    outputs, weather, target = hourly_data
+    model = make_model()
+    model.fit(outputs, weather)
+
+    # 24 * 40 - 1 rows per chunk leaves a single-row last chunk
+    np.testing.assert_allclose(
+        model.predict(target, chunk_size=chunk_size), model.predict(target), rtol=1e-12
+    )
+
+
+def test_memory_budget_sets_the_chunk_size(hourly_data, make_model, monkeypatch):
+    outputs, weather, target = hourly_data
+    model = make_model()
+    model.fit(outputs, weather)
+    expected = model.predict(target)
+
+    row_bytes = target.memory_usage(index=True, deep=True).sum() / len(target)
+    chunks = []
+    predict_chunk = model.predict_chunk
+
+    def record(X, state=None):
+        chunks.append(len(X.timeseries))
+        return predict_chunk(X, state)
+
+    monkeypatch.setattr(model, "predict_chunk", record)
+    budget = 100 * FEATURES_COPIES * row_bytes
+    np.testing.assert_allclose(model.predict(target, max_bytes=budget), expected, rtol=1e-12)
+    assert chunks[:-1] == [100] * (len(chunks) - 1) and 0 < chunks[-1] <= 100
+
+    # At least one row per chunk, and no chunks when the input fits in the budget
+    chunks.clear()
+    np.testing.assert_allclose(model.predict(target.iloc[:5], max_bytes=1), expected[:5])
+    assert chunks == [1] * 5
+    chunks.clear()
+    model.predict(target, max_bytes=10 * budget * len(target))
+    assert chunks == []
+    with pytest.raises(ValueError):
+        model.predict(target, chunk_size=0)
+
+
+def test_predict_single_row_uses_training_step(hourly_data, make_model):
+    outputs, weather, target = hourly_data
+    model = make_model(smoothers=None)
+    model.fit(outputs, weather)
+
+    row = target.iloc[[30]]
+    np.testing.assert_allclose(model.predict(row), model.predict(target)[[30]], rtol=1e-12)
+
+
+@pytest.fixture(params=["grad_delta", "gam"])
+def make_cv_model(request, make_model):
+    if request.param == "gam":
+        return lambda: GAM("y ~ s(temperature, n_splines=8) + jour_semaine", by_instant=False)
+    return make_model
+
+
+def test_cv_predict_does_not_depend_on_n_jobs(hourly_data, make_cv_model):
+    outputs, weather, _ = hourly_data
+    weather = weather.assign(fold=np.arange(len(weather)) // (24 * 10))
+    sequential, parallel = make_cv_model(), make_cv_model()
+
+    expected = sequential.cv_predict(outputs, weather, "fold", n_jobs=1, fit=True)
+    prediction = parallel.cv_predict(outputs, weather, "fold", n_jobs=3, fit=True)
+    np.testing.assert_array_equal(prediction, expected)
+
+    # Rows of a fold are predicted by a model fitted on the other folds
+    in_fold = (weather["fold"] == 1).to_numpy()
+    fold_model = make_cv_model()
+    fold_model.fit(outputs[~in_fold], weather[~in_fold])
+    np.testing.assert_allclose(expected[in_fold], fold_model.predict(weather[in_fold]), rtol=1e-10)
+
+    # With fit=True, the model is also fitted on all rows
+    full_model = make_cv_model()
+    full_model.fit(outputs, weather)
+    for model in (sequential, parallel):
+        np.testing.assert_allclose(model.predict(weather), full_model.predict(weather), rtol=1e-10)